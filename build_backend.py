@@ -22,6 +22,10 @@ def build():
 import uvicorn
 import sys
 import os
+import multiprocessing
+
+# Necessaire pour le pool de workers dans l'exe PyInstaller
+multiprocessing.freeze_support()
 
 # Ajouter le dossier parent au path pour les imports
 if getattr(sys, 'frozen', False):
@@ -72,6 +76,8 @@ if __name__ == "__main__":
         "--hidden-import", "pydantic",
         "--hidden-import", "sqlalchemy",
         "--hidden-import", "PyPDF2",
+        "--hidden-import", "numpy",
+        "--hidden-import", "psutil",
         # Ajouter les fichiers source
         "--add-data", f"src;src",
         # Fichier d'entrée
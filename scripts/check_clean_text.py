@@ -0,0 +1,73 @@
+"""
+Verifie que clean_text produit exactement le texte de la suite de re.sub d'origine,
+sur des textes tires au hasard (tous les blancs Unicode, ponctuation, casse), et
+que clean_pages donne le meme resultat que l'ancienne concatenation page a page
+sur les PDF d'un dossier (optionnel).
+Usage: python scripts/check_clean_text.py [--iterations N] [--seed S] [--pdf-folder DOSSIER]
+"""
+import argparse
+import random
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.cv_analyzer import clean_pages, clean_text  # noqa: E402
+from src.services.pdf_extraction import extract_pages  # noqa: E402
+
+# Tous les caracteres reconnus par \s (str.split doit reconnaitre exactement les memes)
+WHITESPACE = [chr(code) for code in range(sys.maxunicode + 1) if re.match(r'\s', chr(code))]
+
+ALPHABET = list('aBzZ ,.\n\tÉé_1;:') + WHITESPACE + ['\u200b', 'İ', 'ß']
+
+
+def clean_text_with_regex(text):
+    """Nettoyage d'origine: quatre substitutions successives"""
+    text = text.replace('\n', ' ')
+    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([,.])\s*', r'\1 ', text)
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--pdf-folder", help="Dossier de PDF dont l'extraction est comparee")
+    args = parser.parse_args()
+
+    split_whitespace = [chr(code) for code in range(sys.maxunicode + 1) if chr(code).isspace()]
+    if split_whitespace != WHITESPACE:
+        print("str.split et \\s ne reconnaissent pas les memes blancs")
+        return 1
+
+    rng = random.Random(args.seed)
+    for _ in range(args.iterations):
+        text = ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 25)))
+        if clean_text(text) != clean_text_with_regex(text):
+            print(f"Difference pour {text!r}:")
+            print(f"  regex:      {clean_text_with_regex(text)!r}")
+            print(f"  clean_text: {clean_text(text)!r}")
+            return 1
+    print(f"OK: {args.iterations} textes identiques")
+
+    if args.pdf_folder:
+        checked = 0
+        for pdf_path in sorted(Path(args.pdf_folder).glob('*.pdf')):
+            try:
+                pages = extract_pages(pdf_path)
+            except Exception as e:
+                print(f"  {pdf_path.name} ignore: {e}")
+                continue
+            if clean_pages(pages) != clean_text_with_regex(''.join(pages)):
+                print(f"Difference pour {pdf_path.name}")
+                return 1
+            checked += 1
+        print(f"OK: {checked} PDF identiques")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Verifie que embed_cvs (morceaux de plusieurs CVs envoyes ensemble, par groupes)
+stocke pour chaque CV le meme vecteur que embed_document sur son seul texte.
+Un faux serveur Ollama local renvoie des vecteurs deterministes (sacs de mots
+hashes); cache de texte et vecteurs sont ecrits dans un dossier temporaire.
+Usage: python scripts/check_embeddings.py [--cvs N] [--group-size G] [--seed S]
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services import embeddings, text_cache  # noqa: E402
+from src.services.cv_analyzer import CLEANING_VERSION  # noqa: E402
+from src.services.llm_adapters import OllamaAdapter  # noqa: E402
+from src.services.pdf_extraction import EXTRACTOR_VERSION  # noqa: E402
+from src.services.vector_store import VectorStore  # noqa: E402
+
+DIMENSIONS = 64
+
+
+def fake_embedding(text):
+    """Vecteur deterministe d'un texte: occurrences de ses mots, hashes sur DIMENSIONS"""
+    vector = [0.0] * DIMENSIONS
+    for word in text.split():
+        vector[zlib.crc32(word.encode()) % DIMENSIONS] += 1.0
+    return vector
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Repond a /api/embed comme Ollama"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        response = json.dumps({'model': body['model'],
+                               'embeddings': [fake_embedding(text) for text in body['input']]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+
+def random_cv(rng):
+    """Texte de CV factice, de vide a plus long que MAX_CHUNKS morceaux"""
+    words = rng.choice([0, 5, 100, 300, 1000, embeddings.CHUNK_WORDS * (embeddings.MAX_CHUNKS + 2)])
+    return " ".join(f"mot{rng.randrange(500)}" for _ in range(words))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cvs", type=int, default=60)
+    parser.add_argument("--group-size", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllamaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    adapter = OllamaAdapter(model="fake-embed", ollama_url=f"http://127.0.0.1:{server.server_address[1]}")
+
+    rng = random.Random(args.seed)
+    texts = {f"{index:064x}": random_cv(rng) for index in range(args.cvs)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Cache de texte temporaire: la base de l'application n'est pas touchee
+        cache = text_cache._text_cache = text_cache.TextCache(Path(directory) / "text_cache.db")
+        for content_hash, text in texts.items():
+            cache.put_pages(content_hash, EXTRACTOR_VERSION, [text])
+            cache.put_cleaned(content_hash, EXTRACTOR_VERSION, CLEANING_VERSION, text)
+        store = VectorStore(Path(directory) / "vectors")
+        embeddings.EMBED_GROUP_SIZE = args.group_size
+
+        embedded = asyncio.run(embeddings.embed_cvs(adapter, store, list(texts)))
+        expected_count = sum(1 for text in texts.values() if text.split())
+        if embedded != expected_count or len(store) != expected_count:
+            print(f"{embedded} CVs embarques ({len(store)} stockes), {expected_count} attendus")
+            return 1
+
+        for content_hash, text in texts.items():
+            if not text.split():
+                continue
+            expected = asyncio.run(embeddings.embed_document(adapter, text))
+            expected = expected / np.linalg.norm(expected)
+            stored = store.vectors([content_hash])[0]
+            if not np.allclose(stored, expected, atol=1e-6):
+                print(f"Vecteur different pour le CV {content_hash}")
+                return 1
+
+    server.shutdown()
+    print(f"OK: {expected_count} vecteurs identiques (groupes de {args.group_size})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+Verifie que KeywordMatcher compte exactement comme le comptage d'origine
+(un re.findall(r'\\bmot\\b', texte, re.IGNORECASE) par mot-cle), sur des
+mots-cles et des textes tires au hasard dans un alphabet piege (casse Unicode,
+ponctuation, caracteres de mot, sauts de ligne).
+Usage: python scripts/check_keyword_matcher.py [--iterations N] [--seed S]
+"""
+import argparse
+import random
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.keyword_matcher import KeywordMatcher  # noqa: E402
+
+# Caracteres dont le comportement avec re.IGNORECASE ou \b est delicat
+ALPHABET = list("abAB _.+,-éÉ\nİıiIsſΣσς0")
+
+
+def count_with_regex(keywords, text):
+    """Comptage d'origine: une recherche regex par mot-cle"""
+    return {keyword: len(re.findall(f"\\b{re.escape(keyword)}\\b", text, re.IGNORECASE))
+            for keyword in keywords}
+
+
+def random_string(rng, min_length, max_length):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(min_length, max_length)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for _ in range(args.iterations):
+        keywords = list(dict.fromkeys(random_string(rng, 1, 4) for _ in range(rng.randint(1, 6))))
+        text = random_string(rng, 0, 60)
+        expected = count_with_regex(keywords, text)
+        counted = KeywordMatcher(keywords).count(text)
+        if counted != expected:
+            print(f"Difference pour {keywords!r} dans {text!r}:")
+            print(f"  regex:   {expected}")
+            print(f"  matcher: {counted}")
+            return 1
+    print(f"OK: {args.iterations} cas identiques")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
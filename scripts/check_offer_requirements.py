@@ -0,0 +1,87 @@
+"""
+Verifie que JobOfferParser.parse_requirements (une seule passe du matcher) donne
+les memes poids que l'extraction d'origine (une recherche regex par mot-cle de la
+taxonomie integree), sur des offres generees au hasard a partir des mots-cles.
+Usage: python scripts/check_offer_requirements.py [--iterations N] [--seed S]
+"""
+import argparse
+import random
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.job_offer_parser import JobOfferParser  # noqa: E402
+from src.services.skills_taxonomy import TECH_KEYWORDS, normalize_skill  # noqa: E402
+
+FILLER = ("we are looking for a developer with experience in team project the and of to "
+          "à é ü İ ı ſ K _ - . , / + # ( ) \n Python React.js NODE C++ c#. .NET asp.net ci/cd").split(' ')
+
+SEPARATORS = [' ', ' ', ' ', '\n', ', ', '.', '-', '/', '']
+
+
+def parse_requirements_with_regex(text):
+    """Extraction d'origine: une recherche par mot-cle, bonus de position, total a 100%"""
+    if not text:
+        return {}
+    text_lower = text.lower()
+    first_third = len(text_lower) // 3
+
+    keyword_scores = {}
+    # Meme ordre que la taxonomie integree (il departage les egalites)
+    for keyword in sorted(TECH_KEYWORDS):
+        matches = list(re.finditer(r'\b' + re.escape(keyword) + r'\b', text_lower))
+        if matches:
+            normalized = normalize_skill(keyword)
+            early_matches = sum(1 for m in matches if m.start() < first_third)
+            keyword_scores[normalized] = keyword_scores.get(normalized, 0) + len(matches) + early_matches * 0.5
+    if not keyword_scores:
+        return {}
+
+    total_score = sum(keyword_scores.values())
+    requirements = {keyword: round(score / total_score * 100, 1) for keyword, score in keyword_scores.items()}
+    total = sum(requirements.values())
+    if total != 100:
+        max_keyword = max(requirements, key=requirements.get)
+        requirements[max_keyword] = round(requirements[max_keyword] + (100 - total), 1)
+    return requirements
+
+
+def random_offer(rng, keywords, size):
+    """Offre factice: mots-cles et mots de remplissage, casse et separateurs varies"""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(keywords) if rng.random() < 0.3 else rng.choice(FILLER)
+        if rng.random() < 0.2:
+            word = word.upper()
+        separator = rng.choice(SEPARATORS)
+        words.append(word + separator)
+        length += len(word) + len(separator)
+    return ''.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    keywords = sorted(TECH_KEYWORDS)
+    for _ in range(args.iterations):
+        text = random_offer(rng, keywords, rng.choice([50, 300, 2000]))
+        expected = parse_requirements_with_regex(text)
+        parsed = JobOfferParser.parse_requirements(text)
+        if parsed != expected:
+            print(f"Difference pour {text!r}:")
+            print(f"  regex:   {expected}")
+            print(f"  matcher: {parsed}")
+            return 1
+    print(f"OK: {args.iterations} offres identiques")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
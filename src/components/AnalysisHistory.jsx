@@ -72,12 +72,23 @@ const AnalysisHistory = ({ projectId, onAnalysisSelect }) => {
     return new Date(dateString).toLocaleDateString('fr-FR', options);
   };
 
-  const handleAnalysisChange = (event) => {
+  const handleAnalysisChange = async (event) => {
     const analysisId = event.target.value;
     setSelectedAnalysis(analysisId);
     const analysis = analyses.find(a => a.id === analysisId);
-    if (analysis && onAnalysisSelect) {
-      onAnalysisSelect(analysis.report, analysisId);
+    if (!analysis || !onAnalysisSelect) return;
+
+    // Le rapport n'est pas dans la liste: il est rendu à la demande
+    try {
+      const response = await fetch(apiUrl(analysis.report_url));
+      if (!response.ok) {
+        throw new Error('Erreur lors du chargement du rapport');
+      }
+      const data = await response.json();
+      onAnalysisSelect(data.report, analysisId);
+      setError('');
+    } catch (error) {
+      setError('Erreur lors du chargement du rapport');
     }
   };
 
@@ -12,7 +12,7 @@ class Project(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     name = Column(String, nullable=False)
     description = Column(String, default="")
-    mode = Column(String, default="simple")  # 'simple' ou 'llm'
+    mode = Column(String, default="simple")  # 'simple', 'bm25', 'tfidf', 'embedding' ou 'llm'
     keywords = Column(JSON, default={})  # {"keyword": weight, ...}
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
@@ -5,16 +5,28 @@ from sqlalchemy.orm import Session
 from .models import Project
 from datetime import datetime
 
+# Modes d'analyse d'un projet:
+#   simple: score binaire par mots-cles (poids des mots-cles trouves)
+#   bm25: score BM25 des mots-cles (frequence saturee, longueur du CV)
+#   tfidf: similarite TF-IDF entre le texte du CV et celui de l'offre
+#   embedding: similarite cosinus des embeddings Ollama du CV et de l'offre
+#   llm: analyse IA du CV par rapport a l'offre
+PROJECT_MODES = ('simple', 'bm25', 'tfidf', 'embedding', 'llm')
+
 
 class ProjectManager:
     """Classe statique pour gérer les opérations CRUD sur les projets"""
 
     @staticmethod
-    def create_project(db: Session, name: str, description: str = "", keywords: dict = None) -> Project:
+    def create_project(db: Session, name: str, description: str = "", keywords: dict = None,
+                       mode: str = None) -> Project:
         """Crée un nouveau projet"""
+        if mode is not None and mode not in PROJECT_MODES:
+            raise ValueError(f"Mode de projet inconnu: {mode}")
         project = Project(
             name=name,
             description=description,
+            mode=mode or "simple",
             keywords=keywords or {}
         )
         db.add(project)
@@ -34,8 +46,10 @@ class ProjectManager:
 
     @staticmethod
     def update_project(db: Session, project_id: str, name: str = None,
-                       description: str = None, keywords: dict = None) -> Project:
+                       description: str = None, keywords: dict = None, mode: str = None) -> Project:
         """Met à jour un projet"""
+        if mode is not None and mode not in PROJECT_MODES:
+            raise ValueError(f"Mode de projet inconnu: {mode}")
         project = db.query(Project).filter(Project.id == project_id).first()
         if not project:
             return None
@@ -46,6 +60,8 @@ class ProjectManager:
             project.description = description
         if keywords is not None:
             project.keywords = keywords
+        if mode is not None:
+            project.mode = mode
 
         project.updated_at = datetime.now()
         db.commit()
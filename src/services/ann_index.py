@@ -0,0 +1,173 @@
+"""
+Recherche approchee des CVs les plus proches d'un vecteur (embeddings, voir vector_store).
+Index IVF: les vecteurs sont repartis entre des centroides (k-means spherique); une
+recherche ne compare le vecteur qu'aux CVs des `nprobe` listes les plus proches.
+L'index suit la matrice de vecteurs en ajout seul: les nouvelles lignes sont affectees
+a leur centroide a la recherche suivante, les centroides sont re-appris quand la matrice
+a quadruple depuis le dernier apprentissage. Persiste a cote de cv_analyzer.db.
+Les petites archives sont parcourues entierement (resultat exact).
+"""
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..database.database import data_dir
+from .vector_store import VectorStore
+
+ANN_INDEX_DIR = data_dir / "ann_index"
+
+# En dessous, recherche exacte sur toute la matrice
+ANN_MIN_ROWS = 4096
+
+# Listes parcourues par recherche
+DEFAULT_NPROBE = 16
+
+# Vecteurs par centroide pour l'apprentissage et nombre d'iterations du k-means
+_TRAIN_POINTS_PER_LIST = 40
+_KMEANS_ITERATIONS = 10
+_ASSIGN_BLOCK_ROWS = 16384
+
+
+def list_count(rows: int) -> int:
+    """Nombre de listes pour une matrice de `rows` vecteurs (~racine carree)"""
+    return max(1, int(np.sqrt(rows)))
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Centroide le plus proche (produit scalaire) de chaque vecteur, par blocs"""
+    result = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_BLOCK_ROWS):
+        block = vectors[start:start + _ASSIGN_BLOCK_ROWS]
+        result[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return result
+
+
+def train_centroids(vectors: np.ndarray, lists: int, seed: int = 0) -> np.ndarray:
+    """k-means spherique (vecteurs et centroides normalises)"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=lists, replace=False)].copy()
+    for _ in range(_KMEANS_ITERATIONS):
+        labels = assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Liste vide: centroide remplace par un vecteur tire au hasard
+        empty = norms[:, 0] == 0
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+        norms[empty] = np.linalg.norm(sums[empty], axis=1, keepdims=True)
+        centroids = sums / np.where(norms > 0, norms, 1)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """Index IVF d'une matrice de vecteurs (centroides et liste de chaque ligne)"""
+
+    def __init__(self, store: VectorStore, path):
+        self.store = store
+        self.path = path
+        self._lock = threading.Lock()
+        self.centroids: Optional[np.ndarray] = None
+        self.labels = np.zeros(0, dtype=np.int32)
+        self.trained_rows = 0
+        self._order: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._loaded = False
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path.exists():
+            with np.load(self.path) as data:
+                self.centroids = data['centroids']
+                self.labels = data['labels']
+                self.trained_rows = int(data['trained_rows'])
+            # Index d'une autre matrice (recreee): re-appris
+            if self.labels.shape[0] > len(self.store) or self.centroids.shape[1] != self.store.dim:
+                self.centroids = None
+                self.labels = np.zeros(0, dtype=np.int32)
+                self.trained_rows = 0
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix('.tmp.npz')
+        np.savez(temporary, centroids=self.centroids, labels=self.labels,
+                 trained_rows=np.int64(self.trained_rows))
+        os.replace(temporary, self.path)
+
+    def update(self) -> None:
+        """Affecte les lignes ajoutees depuis la derniere mise a jour (re-apprend si besoin)"""
+        with self._lock:
+            self._load()
+            rows = len(self.store)
+            if rows < ANN_MIN_ROWS or rows == len(self.labels):
+                return
+            if self.centroids is None or rows >= 4 * self.trained_rows:
+                lists = list_count(rows)
+                sample = np.random.default_rng(rows).choice(
+                    rows, size=min(rows, lists * _TRAIN_POINTS_PER_LIST), replace=False)
+                self.centroids = train_centroids(self.store.read_rows(np.sort(sample)), lists)
+                self.trained_rows = rows
+                start = 0
+                self.labels = np.empty(rows, dtype=np.int32)
+            else:
+                start = len(self.labels)
+                self.labels = np.concatenate([self.labels, np.empty(rows - start, dtype=np.int32)])
+            for block in range(start, rows, _ASSIGN_BLOCK_ROWS):
+                end = min(rows, block + _ASSIGN_BLOCK_ROWS)
+                self.labels[block:end] = assign(self.store.read_rows(slice(block, end)), self.centroids)
+            self._order = None
+            self._save()
+
+    def _lists(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Lignes triees par liste et debut de chaque liste"""
+        if self._order is None:
+            self._order = np.argsort(self.labels, kind='stable').astype(np.int64)
+            counts = np.bincount(self.labels, minlength=len(self.centroids))
+            self._offsets = np.concatenate([[0], np.cumsum(counts)])
+        return self._order, self._offsets
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = DEFAULT_NPROBE,
+               exclude: Tuple[str, ...] = ()) -> List[Tuple[str, float]]:
+        """Les k empreintes les plus proches du vecteur (cosinus decroissant)"""
+        self.update()
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0 or len(self.store) == 0:
+            return []
+        query = query / norm
+        with self._lock:
+            if self.centroids is None:
+                candidates = None
+            else:
+                order, offsets = self._lists()
+                probed = np.argsort(-(self.centroids @ query))[:nprobe]
+                candidates = np.sort(np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probed]))
+        if candidates is None:
+            scores = self.store.similarities(query)
+            candidates = np.arange(len(scores))
+        else:
+            scores = self.store.read_rows(candidates) @ query
+
+        # Quelques lignes de plus pour compenser les exclusions
+        take = min(len(scores), k + len(exclude))
+        best = np.argpartition(-scores, take - 1)[:take] if take else np.zeros(0, dtype=np.int64)
+        best = best[np.argsort(-scores[best], kind='stable')]
+        keys = self.store.keys_at(candidates[best].tolist())
+        excluded = set(exclude)
+        return [(key, float(scores[i])) for key, i in zip(keys, best) if key not in excluded][:k]
+
+
+_ann_indexes: Dict[str, IVFIndex] = {}
+_ann_indexes_lock = threading.Lock()
+
+
+def get_ann_index(store: VectorStore) -> IVFIndex:
+    """Retourne l'index de recherche approchee d'une matrice de vecteurs"""
+    with _ann_indexes_lock:
+        name = store.directory.name
+        if name not in _ann_indexes:
+            _ann_indexes[name] = IVFIndex(store, ANN_INDEX_DIR / f"{name}.npz")
+        return _ann_indexes[name]
@@ -7,10 +7,33 @@ from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from ..database.database import get_db
 from ..database.models import Analysis, Project, JobOffer, LLMSettings
-from ..database.project_manager import ProjectManager
+from ..database.project_manager import PROJECT_MODES, ProjectManager
 from ..database.job_offer_manager import JobOfferManager
-from .cv_analyzer import CVAnalyzer
+from .cv_analyzer import CLEANING_VERSION, CVAnalyzer, REPORT_SECTIONS, bm25_corpus_statistics, clean_text
+from .text_normalization import normalize_text
 from .job_offer_parser import JobOfferParser
+from .skills_taxonomy import get_taxonomy
+from .process_pool import DEFAULT_WORKERS, get_process_pool, shutdown_process_pool
+from .pdf_extraction import (
+    EXTRACTOR_VERSION, QUARANTINE_REASONS, extract_pages, failure_message, failure_reason
+)
+from .score_matrix import (
+    SCORING_MODES, KeywordCountMatrix, save_count_matrix, load_count_matrix, delete_count_matrix
+)
+from .text_cache import file_content_hash, get_text_cache
+from .cv_index import get_cv_index
+from .cv_query import QuerySyntaxError, compile_query
+from .match_explain import DEFAULT_CONTEXT_CHARS, explain_keyword
+from .tfidf import cv_term_vectors, similarity_scores
+from .embeddings import EMBEDDING_MODEL, embed_cvs, embed_document
+from .vector_store import get_vector_store
+from .ann_index import get_ann_index
+from .llm_adapters import OllamaAdapter
+from .dedup import minhash_signature, near_duplicate_clusters
+from .corpus_discovery import CorpusDiscovery
+from .upload_ingest import (
+    UploadReceiver, UploadTooLarge, is_upload_dir, iter_uploaded_files, new_upload_dir, remove_upload_dir
+)
 from ..utils.error_handling import (
     handle_application_error,
     validate_keywords,
@@ -21,9 +44,22 @@ from ..utils.error_handling import (
 )
 import os
 import re
+import json
+from pathlib import Path
+import asyncio
+import base64
+import threading
+import numpy as np
 
 app = FastAPI()
 
+# Nombre de CVs détaillés dans le rapport et la réponse d'analyse (la suite est paginée)
+DEFAULT_TOP_K = 100
+# Taille maximale d'une page de résultats
+MAX_PAGE_SIZE = 500
+# Méthodes de classement par similarité avec le texte d'une offre (mode de l'analyse)
+SIMILARITY_METHODS = ('tfidf', 'embedding')
+
 # Configuration CORS
 app.add_middleware(
     CORSMiddleware,
@@ -37,6 +73,13 @@ class ProjectRequest(BaseModel):
     name: str
     description: str = ""
     keywords: Dict[str, float] = {}
+    mode: Optional[str] = None  # 'simple', 'bm25' ou 'llm' (inchangé si absent)
+
+    @validator('mode')
+    def validate_mode(cls, v):
+        if v is not None and v not in PROJECT_MODES:
+            raise ValueError(f"Mode inconnu: {v} ({', '.join(PROJECT_MODES)})")
+        return v
 
 class ProjectResponse(BaseModel):
     id: str
@@ -60,10 +103,23 @@ class AnalysisResponse(BaseModel):
         from_attributes = True
 
 
+class RescoreRequest(BaseModel):
+    weights: Dict[str, float]
+    limit: Optional[int] = None
+
+
 class JobOfferRequest(BaseModel):
     file_path: str
 
 
+class JobOfferFolderRequest(BaseModel):
+    folder_path: str
+    max_depth: Optional[int] = 0  # -1 = tous les sous-dossiers
+    include: Optional[List[str]] = None
+    exclude: Optional[List[str]] = None
+    max_file_size_mb: Optional[float] = None
+
+
 class JobOfferUpdateRequest(BaseModel):
     requirements: Dict[str, float]
 
@@ -83,6 +139,17 @@ class JobOfferResponse(BaseModel):
 async def global_exception_handler(request: Request, exc: Exception):
     return handle_application_error(exc)
 
+@app.on_event("startup")
+async def warm_up_process_pool():
+    """Démarre le pool de workers en arrière-plan pour que la première analyse soit rapide"""
+    if DEFAULT_WORKERS > 1:
+        threading.Thread(target=get_process_pool, daemon=True).start()
+
+@app.on_event("shutdown")
+async def stop_process_pool():
+    """Arrête proprement les workers"""
+    shutdown_process_pool()
+
 # ===== PROJECT ENDPOINTS =====
 
 @app.get("/api/projects", response_model=List[ProjectResponse])
@@ -105,7 +172,8 @@ async def create_project(request: ProjectRequest, db: Session = Depends(get_db))
             db,
             name=request.name,
             description=request.description,
-            keywords=request.keywords
+            keywords=request.keywords,
+            mode=request.mode
         )
         return ProjectManager.project_to_dict(project)
     except Exception as e:
@@ -133,7 +201,8 @@ async def update_project(project_id: str, request: ProjectRequest, db: Session =
             project_id,
             name=request.name,
             description=request.description,
-            keywords=request.keywords
+            keywords=request.keywords,
+            mode=request.mode
         )
         if not project:
             raise HTTPException(status_code=404, detail="Projet non trouvé")
@@ -165,16 +234,19 @@ async def get_project_analyses(project_id: str, db: Session = Depends(get_db)):
         if not project:
             raise HTTPException(status_code=404, detail="Projet non trouvé")
 
-        # Récupérer les analyses du projet
-        analyses = db.query(Analysis).filter(
+        # Récupérer les analyses du projet (métadonnées seulement: ni résultats ni rapport)
+        analyses = db.query(
+            Analysis.id, Analysis.date, Analysis.keywords, Analysis.folder_path
+        ).filter(
             Analysis.project_id == project_id
         ).order_by(Analysis.date.desc()).all()
 
+        # Le rapport est rendu à la demande, à l'ouverture d'une analyse
         return [
             {
                 "id": a.id,
                 "date": a.date,
-                "report": a.report,
+                "report_url": f"/api/analyses/{a.id}/report",
                 "keywords": a.keywords,
                 "folder_path": a.folder_path
             }
@@ -188,6 +260,146 @@ async def get_project_analyses(project_id: str, db: Session = Depends(get_db)):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def is_keyword_results(results) -> bool:
+    """Résultats structurés d'une analyse par mots-clés (CVs scorés et conversions échouées)"""
+    return (
+        isinstance(results, list) and bool(results)
+        and all('found_keywords' in r or r.get('success') is False for r in results)
+    )
+
+def render_analysis_report(db: Session, analysis: Analysis, top_n: Optional[int] = None,
+                           sections: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Rend le rapport Markdown d'une analyse à partir de ses résultats structurés,
+    sans relire les PDF ni rappeler le LLM. Les anciennes analyses gardent leur rapport stocké.
+    """
+    keywords = analysis.keywords or {}
+    results = analysis.results if isinstance(analysis.results, list) else []
+
+    if keywords.get("mode") in SIMILARITY_METHODS:
+        return generate_similarity_report(
+            results, keywords.get("job_offer_name", ""), keywords["mode"], model=keywords.get("model"),
+            top_n=DEFAULT_TOP_K if top_n is None else top_n, sections=sections, generated_at=analysis.date
+        )
+
+    if keywords.get("mode") == "llm":
+        if not results:
+            return analysis.report
+        job_offer_name = keywords.get("job_offer_name")
+        if not job_offer_name and analysis.job_offer_id:
+            job_offer = JobOfferManager.get_job_offer(db, analysis.job_offer_id)
+            job_offer_name = job_offer.filename if job_offer else analysis.job_offer_id
+        return generate_llm_report(
+            results, job_offer_name or "", keywords.get("provider", ""), keywords.get("model", ""),
+            top_n=top_n, sections=sections, generated_at=analysis.date
+        )
+
+    if not is_keyword_results(results):
+        return analysis.report
+
+    analyzer = CVAnalyzer(analysis.folder_path or ".", {k: float(v) for k, v in keywords.items()})
+    ranked = analyzer.restore_results(results)
+    return analyzer.generate_markdown_report(
+        ranked, top_n=DEFAULT_TOP_K if top_n is None else top_n,
+        sections=sections, generated_at=analysis.date
+    )
+
+@app.get("/api/analyses/{analysis_id}/report")
+async def get_analysis_report(analysis_id: int, top: Optional[int] = None, sections: Optional[str] = None,
+                              db: Session = Depends(get_db)):
+    """
+    Rapport Markdown d'une analyse, rendu à la demande.
+    top limite le nombre de candidats détaillés, sections est une liste séparée par des virgules.
+    """
+    try:
+        analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
+        if not analysis:
+            raise HTTPException(status_code=404, detail="Analyse non trouvée")
+
+        selected = [s.strip() for s in sections.split(",") if s.strip()] if sections else None
+        if selected:
+            mode = (analysis.keywords or {}).get("mode")
+            allowed = (LLM_REPORT_SECTIONS if mode == "llm" else
+                       SIMILARITY_REPORT_SECTIONS if mode in SIMILARITY_METHODS else REPORT_SECTIONS)
+            unknown = [s for s in selected if s not in allowed]
+            if unknown:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Sections inconnues: {', '.join(unknown)} (disponibles: {', '.join(allowed)})"
+                )
+        if top is not None and top < 0:
+            raise HTTPException(status_code=400, detail="top doit être positif")
+
+        report = render_analysis_report(db, analysis, top_n=top, sections=selected)
+        return {"analysis_id": analysis.id, "report": report}
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in get_analysis_report: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+def discovery_options(options: dict) -> dict:
+    """
+    Options de découverte des fichiers lues dans la requête:
+    max_depth (0 = dossier seul, -1 = sans limite), include, exclude (motifs glob), max_file_size_mb.
+    """
+    max_depth = options.get('max_depth', 0)
+    if max_depth is not None:
+        max_depth = int(max_depth)
+        if max_depth < 0:
+            max_depth = None
+    max_size_mb = options.get('max_file_size_mb')
+    return {
+        "max_depth": max_depth,
+        "include": options.get('include'),
+        "exclude": options.get('exclude'),
+        "max_size": int(float(max_size_mb) * 1024 * 1024) if max_size_mb else None
+    }
+
+def get_previous_keyword_results(db: Session, project_id: str, folder_path: str,
+                                 job_offer_id: Optional[str] = None) -> Optional[List[dict]]:
+    """
+    Récupère les résultats structurés de la dernière analyse par mots-clés
+    du même dossier (sert de manifeste pour l'analyse incrémentale).
+    """
+    analysis = db.query(Analysis).filter(
+        Analysis.project_id == project_id,
+        Analysis.folder_path == folder_path,
+        Analysis.job_offer_id == job_offer_id
+    ).order_by(Analysis.date.desc()).first()
+    if not analysis or not isinstance(analysis.results, list):
+        return None
+    return [r for r in analysis.results if isinstance(r, dict) and 'found_keywords' in r]
+
+def keyword_scoring(project: Project, requested: Optional[str] = None) -> str:
+    """Mode de score d'une analyse par mots-clés: celui demandé, sinon celui du projet"""
+    scoring = requested or ('bm25' if project.mode == 'bm25' else 'binary')
+    if scoring not in SCORING_MODES:
+        raise HTTPException(status_code=400, detail=f"Mode de score inconnu: {scoring}")
+    return scoring
+
+def cv_filter(query: Optional[str]):
+    """Compile le filtre de CVs d'une requête (voir cv_query), 400 si sa syntaxe est invalide"""
+    try:
+        return compile_query(query)
+    except QuerySyntaxError as e:
+        raise HTTPException(status_code=400, detail=f"Filtre invalide: {e}")
+
+def run_keyword_analysis(analyzer: CVAnalyzer, previous_results: Optional[List[dict]],
+                         top_k: Optional[int], from_index: bool = False):
+    """
+    Lance l'analyse par mots-clés: lecture des PDF (incrémentale) ou, avec from_index,
+    comptage direct dans l'index plein texte d'un dossier déjà analysé.
+    """
+    if not from_index:
+        return analyzer.analyze_cvs(previous_results, top_k=top_k)
+    try:
+        return analyzer.analyze_indexed(top_k=top_k)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/api/projects/{project_id}/analyze")
 async def analyze_project(project_id: str, request: dict, db: Session = Depends(get_db)):
     """Analyse les CVs pour un projet spécifique"""
@@ -210,24 +422,44 @@ async def analyze_project(project_id: str, request: dict, db: Session = Depends(
         # Convertir les keywords en floats (au cas où ils seraient des strings/ints depuis la DB)
         keywords = {k: float(v) for k, v in keywords.items()}
 
-        # Lancer l'analyse avec CVAnalyzer
-        analyzer = CVAnalyzer(folder_path, keywords)
-        results = analyzer.analyze_cvs()
-        report = analyzer.generate_markdown_report(results)
+        # Lancer l'analyse avec CVAnalyzer (seuls les fichiers nouveaux ou modifiés sont traités)
+        workers = int(request.get('workers', DEFAULT_WORKERS))
+        analyzer = CVAnalyzer(folder_path, keywords, workers=workers,
+                              discovery=CorpusDiscovery(folder_path, **discovery_options(request)),
+                              scoring=keyword_scoring(project, request.get('scoring')),
+                              query=cv_filter(request.get('query')))
+        previous_results = None
+        if request.get('incremental', True):
+            previous_results = get_previous_keyword_results(db, project_id, folder_path)
+        top_k = int(request.get('top_k', DEFAULT_TOP_K))
+        results = run_keyword_analysis(analyzer, previous_results, top_k, bool(request.get('from_index')))
 
         # Sauvegarder l'analyse en DB
         analysis = Analysis(
             project_id=project_id,
             date=datetime.now(),
-            report=report,
+            report=None,
             keywords=keywords,
-            folder_path=folder_path
+            folder_path=folder_path,
+            results=analyzer.results_to_dicts() + analyzer.failures_to_dicts()
         )
         db.add(analysis)
         db.commit()
         db.refresh(analysis)
 
-        return {"report": report}
+        # Matrice CV x mot-clé pour les re-scorings instantanés et la pagination
+        save_count_matrix(analysis.id, analyzer.count_matrix)
+
+        # Rapport rendu depuis les résultats sauvegardés (même date que l'analyse)
+        report = analyzer.generate_markdown_report(results, generated_at=analysis.date)
+
+        return {
+            "report": report,
+            "analysis_id": analysis.id,
+            "total": analyzer.stats["total"],
+            "failed_conversions": analyzer.failed_conversions,
+            "excluded": analyzer.excluded
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -251,8 +483,16 @@ async def delete_analysis(analysis_id: int, db: Session = Depends(get_db)):
         if not analysis:
             raise HTTPException(status_code=404, detail="Analyse non trouvée")
 
+        folder_path = analysis.folder_path
         db.delete(analysis)
         db.commit()
+        delete_count_matrix(analysis_id)
+
+        # Les CVs envoyés sont supprimés avec la dernière analyse qui les utilise
+        if not db.query(Analysis).filter(Analysis.folder_path == folder_path).first():
+            if is_upload_dir(folder_path):
+                get_cv_index().remove_folder(folder_path)
+            remove_upload_dir(folder_path)
 
         return {"message": "Analyse supprimée avec succès"}
     except SQLAlchemyError as e:
@@ -260,6 +500,307 @@ async def delete_analysis(analysis_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Erreur lors de la suppression de l'analyse")
 
 
+def get_count_matrix(db: Session, analysis_id: int) -> KeywordCountMatrix:
+    """Charge la matrice d'une analyse, ou la reconstruit depuis ses résultats structurés"""
+    matrix = load_count_matrix(analysis_id)
+    if matrix is not None:
+        return matrix
+
+    analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    if "mode" in (analysis.keywords or {}) or not is_keyword_results(analysis.results):
+        raise HTTPException(status_code=400, detail="Cette analyse n'a pas de résultats par mots-clés")
+
+    ranked = [r for r in analysis.results if 'found_keywords' in r]
+    keywords = list(analysis.keywords or {})
+    bm25 = any(r.get('scoring') == 'bm25' for r in ranked)
+    matrix = KeywordCountMatrix.from_results(ranked, keywords,
+                                             corpus=bm25_corpus_statistics(keywords) if bm25 else None)
+    save_count_matrix(analysis_id, matrix)
+    return matrix
+
+@app.post("/api/analyses/{analysis_id}/rescore")
+async def rescore_analysis(analysis_id: int, request: RescoreRequest, db: Session = Depends(get_db)):
+    """Re-score et re-classe une analyse avec de nouveaux poids, sans relire les CVs"""
+    try:
+        matrix = get_count_matrix(db, analysis_id)
+        try:
+            ranking = matrix.rank(request.weights)
+        except KeyError as e:
+            raise HTTPException(status_code=400, detail=str(e.args[0]))
+
+        scores, order = ranking["scores"], ranking["order"]
+        if request.limit is not None:
+            order = order[:request.limit]
+
+        return {
+            "total": len(matrix.filenames),
+            "average_score": float(scores.mean()) if len(scores) else 0,
+            "best_score": float(scores.max()) if len(scores) else 0,
+            "results": [
+                {"rank": rank, "filename": matrix.filenames[index], "score": float(scores[index])}
+                for rank, index in enumerate(order.tolist(), 1)
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in rescore_analysis: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def encode_cursor(offset: int) -> str:
+    """Curseur opaque de pagination"""
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode()
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """Décode un curseur de pagination (None = première page)"""
+    if not cursor:
+        return 0
+    try:
+        offset = json.loads(base64.urlsafe_b64decode(cursor.encode()))["offset"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    return offset
+
+@app.get("/api/analyses/{analysis_id}/results")
+async def get_analysis_results(analysis_id: int, cursor: Optional[str] = None, limit: int = 50,
+                               db: Session = Depends(get_db)):
+    """Classement complet d'une analyse par mots-clés, page par page"""
+    try:
+        analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
+        if not analysis:
+            raise HTTPException(status_code=404, detail="Analyse non trouvée")
+
+        matrix = get_count_matrix(db, analysis_id)
+        ranking = matrix.rank({k: float(v) for k, v in (analysis.keywords or {}).items()})
+        scores, order = ranking["scores"], ranking["order"]
+
+        offset = decode_cursor(cursor)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        page = order[offset:offset + limit].tolist()
+        next_offset = offset + len(page)
+
+        return {
+            "total": len(order),
+            "results": [
+                {
+                    "rank": offset + position,
+                    "filename": matrix.filenames[row],
+                    "score": float(scores[row]),
+                    "found_keywords": dict(zip(matrix.keywords, matrix.counts[row].tolist()))
+                }
+                for position, row in enumerate(page, 1)
+            ],
+            "next_cursor": encode_cursor(next_offset) if next_offset < len(order) else None
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in get_analysis_results: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/analyses/{analysis_id}/explain")
+async def explain_analysis_match(analysis_id: int, filename: str, keyword: str,
+                                 context: int = DEFAULT_CONTEXT_CHARS, limit: int = 50,
+                                 db: Session = Depends(get_db)):
+    """
+    Où un mot-clé a été trouvé dans un CV d'une analyse: positions et extraits autour de
+    chaque occurrence, calculés à la demande depuis le texte extrait en cache.
+    """
+    try:
+        analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
+        if not analysis:
+            raise HTTPException(status_code=404, detail="Analyse non trouvée")
+        if "mode" in (analysis.keywords or {}) or not is_keyword_results(analysis.results):
+            raise HTTPException(status_code=400, detail="Cette analyse n'a pas de résultats par mots-clés")
+        if keyword not in (analysis.keywords or {}):
+            raise HTTPException(status_code=400, detail=f"Mot-clé absent de l'analyse: {keyword}")
+
+        entry = next((r for r in analysis.results if r.get('filename') == filename and 'found_keywords' in r), None)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="CV non trouvé dans l'analyse")
+
+        pdf_path = Path(analysis.folder_path or ".") / filename
+        content_hash = entry.get('content_hash')
+        if not content_hash or not get_text_cache().get_cleaned(content_hash, EXTRACTOR_VERSION, CLEANING_VERSION):
+            # Texte absent du cache: le fichier doit être encore là et inchangé pour être relu
+            if not pdf_path.is_file():
+                raise HTTPException(status_code=404, detail=f"Fichier introuvable: {filename}")
+            current_hash = file_content_hash(pdf_path)
+            if content_hash and current_hash != content_hash:
+                raise HTTPException(status_code=409, detail="Le fichier a changé depuis l'analyse")
+            content_hash = current_hash
+
+        matches = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: explain_keyword(pdf_path, keyword, content_hash, max(0, context))
+        )
+        return {
+            "filename": filename,
+            "keyword": keyword,
+            "count": len(matches),
+            "recorded_count": entry['found_keywords'].get(keyword, 0),
+            "matches": matches[:max(1, min(limit, MAX_PAGE_SIZE))]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in explain_analysis_match: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/analyses/{analysis_id}/similar")
+async def find_similar_candidates(analysis_id: int, filename: str, limit: int = 20,
+                                  model: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    CVs les plus proches d'un CV d'une analyse, dans toute l'archive (tous projets),
+    par recherche approchée sur les embeddings (voir ann_index). Le CV est embarqué
+    à la demande s'il n'a pas encore de vecteur.
+    """
+    try:
+        analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
+        if not analysis:
+            raise HTTPException(status_code=404, detail="Analyse non trouvée")
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise HTTPException(status_code=400, detail=f"limit doit être entre 1 et {MAX_PAGE_SIZE}")
+        results = analysis.results if isinstance(analysis.results, list) else []
+        entry = next((r for r in results if isinstance(r, dict) and r.get('filename') == filename), None)
+        if entry is None or not entry.get('content_hash') or entry.get('success') is False:
+            raise HTTPException(status_code=404, detail=f"CV non trouvé dans l'analyse: {filename}")
+        content_hash = entry['content_hash']
+
+        # Seule une analyse par embeddings enregistre un modèle d'embeddings (celui d'une
+        # analyse LLM est un modèle de chat)
+        if not model:
+            keywords = analysis.keywords or {}
+            model = (keywords.get("model") if keywords.get("mode") == "embedding" else None) or EMBEDDING_MODEL
+        store = get_vector_store(model)
+        if content_hash not in store:
+            try:
+                await embed_cvs(embedding_adapter(db, model), store, [content_hash])
+            except Exception as e:
+                raise HTTPException(status_code=502, detail=f"Embeddings indisponibles: {e}")
+            if content_hash not in store:
+                raise HTTPException(status_code=409, detail="Texte du CV indisponible: relancez l'analyse")
+
+        matches = get_ann_index(store).search(store.vectors([content_hash])[0], limit, exclude=(content_hash,))
+        files = get_cv_index().files_of(h for h, _ in matches)
+        return {
+            "filename": filename,
+            "content_hash": content_hash,
+            "model": model,
+            "similar": [
+                {"content_hash": h, "similarity": round(score * 100, 2), "files": files.get(h, [])}
+                for h, score in matches
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in find_similar_candidates: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/quarantine")
+async def get_quarantine():
+    """Liste les PDF mis en quarantaine (extraction bloquée, mémoire dépassée, processus tué)"""
+    try:
+        return get_text_cache().list_quarantine()
+    except Exception as e:
+        import traceback
+        print(f"ERROR in get_quarantine: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/quarantine/{content_hash}")
+async def release_quarantine(content_hash: str):
+    """Sort un PDF de quarantaine: il sera de nouveau extrait à la prochaine analyse"""
+    try:
+        if not get_text_cache().remove_quarantine(content_hash):
+            raise HTTPException(status_code=404, detail="Fichier non trouvé en quarantaine")
+        return {"message": "Fichier sorti de quarantaine"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in release_quarantine: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ===== SEARCH ENDPOINTS =====
+
+@app.get("/api/search")
+async def search_cvs(q: str, folder: Optional[str] = None, match: str = "all", limit: int = 50):
+    """
+    Recherche dans l'index plein texte des CVs déjà extraits (sans relire les PDF).
+    q: termes séparés par des virgules ("python, machine learning"); match: all (tous
+    les termes) ou any (au moins un). Renvoie les CVs avec le nombre d'occurrences de chaque terme.
+    """
+    try:
+        terms = list(dict.fromkeys(term.strip() for term in q.split(',') if term.strip()))
+        if not terms:
+            raise HTTPException(status_code=400, detail="Aucun terme de recherche")
+        if match not in ("all", "any"):
+            raise HTTPException(status_code=400, detail="match doit valoir 'all' ou 'any'")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        index = get_cv_index()
+        folder_files = None
+        if folder:
+            folder_files = index.folder_files(folder)
+            if not folder_files:
+                raise HTTPException(status_code=404, detail=f"Dossier non indexé: {folder}")
+        counts = index.term_counts(
+            terms, [entry['content_hash'] for entry in folder_files] if folder_files else None
+        )
+
+        found = set().union(*(set(by_hash) for by_hash in counts.values()))
+        if match == "all":
+            found = {content_hash for content_hash in found if all(content_hash in counts[term] for term in terms)}
+        ranked = sorted(
+            found,
+            key=lambda content_hash: (-sum(counts[term].get(content_hash, 0) for term in terms), content_hash)
+        )
+
+        if folder_files:
+            files = {}
+            for entry in folder_files:
+                files.setdefault(entry['content_hash'], []).append(entry['relative_path'])
+        else:
+            files = {content_hash: [f"{entry['folder']}/{entry['relative_path']}" for entry in entries]
+                     for content_hash, entries in index.files_of(ranked[:limit]).items()}
+
+        return {
+            "terms": terms,
+            "total": len(ranked),
+            "results": [
+                {
+                    "content_hash": content_hash,
+                    "filenames": files.get(content_hash, []),
+                    "counts": {term: counts[term].get(content_hash, 0) for term in terms}
+                }
+                for content_hash in ranked[:limit]
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in search_cvs: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ===== JOB OFFER ENDPOINTS =====
 
 @app.post("/api/projects/{project_id}/job-offers")
@@ -305,6 +846,50 @@ async def create_job_offer(project_id: str, request: JobOfferRequest, db: Sessio
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/projects/{project_id}/job-offers/import-folder")
+async def import_job_offers(project_id: str, request: JobOfferFolderRequest, db: Session = Depends(get_db)):
+    """Importe toutes les offres d'emploi (PDF ou TXT) d'un dossier"""
+    try:
+        # Verifier que le projet existe
+        project = ProjectManager.get_project(db, project_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Projet non trouve")
+
+        if not os.path.isdir(request.folder_path):
+            raise HTTPException(status_code=400, detail=f"Dossier non trouve: {request.folder_path}")
+
+        discovery = JobOfferParser.discover_files(request.folder_path, **discovery_options(request.dict()))
+        imported = []
+        errors = []
+        for found in discovery:
+            try:
+                parsed = JobOfferParser.process_file(str(found.path))
+            except ValueError as e:
+                errors.append({"filename": found.relative_path, "error": str(e)})
+                continue
+            job_offer = JobOfferManager.create_job_offer(
+                db,
+                project_id=project_id,
+                filename=found.relative_path,
+                raw_content=parsed["raw_content"],
+                requirements=parsed["requirements"]
+            )
+            imported.append(JobOfferManager.job_offer_to_dict(job_offer))
+
+        errors.extend(
+            {"filename": found.relative_path, "error": "Fichier trop volumineux"}
+            for found in discovery.too_large
+        )
+        return {"imported": imported, "errors": errors}
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in import_job_offers: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/projects/{project_id}/job-offers")
 async def get_project_job_offers(project_id: str, db: Session = Depends(get_db)):
     """Liste toutes les offres d'emploi d'un projet"""
@@ -336,6 +921,54 @@ async def get_job_offer(offer_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/job-offers/{offer_id}/suggested-weights")
+async def suggest_job_offer_weights(offer_id: str, db: Session = Depends(get_db)):
+    """
+    Pondérations suggérées pour les requirements d'une offre: poids de l'offre ajustés
+    par la rareté de chaque mot-clé dans les CVs indexés (fréquences documentaires
+    tenues à jour à l'indexation, sans relire les CVs). Un synonyme compte comme
+    sa compétence (fréquence de la forme la plus répandue).
+    """
+    try:
+        job_offer = JobOfferManager.get_job_offer(db, offer_id)
+        if not job_offer:
+            raise HTTPException(status_code=404, detail="Offre non trouvee")
+        requirements = {k: float(v) for k, v in (job_offer.requirements or {}).items()}
+        if not requirements:
+            raise HTTPException(status_code=400, detail="Aucun requirement dans l'offre")
+
+        taxonomy = get_taxonomy()
+        forms = {keyword: [keyword, *taxonomy.synonyms(keyword)] for keyword in requirements}
+        documents, frequencies = get_cv_index().document_frequencies(
+            form for keyword_forms in forms.values() for form in keyword_forms
+        )
+        keyword_frequencies = {keyword: max(frequencies.get(form, 0) for form in keyword_forms)
+                               for keyword, keyword_forms in forms.items()}
+        suggested = JobOfferParser.adjust_weights(requirements, keyword_frequencies, documents)
+
+        return {
+            "offer_id": offer_id,
+            "documents": documents,
+            "requirements": [
+                {
+                    "keyword": keyword,
+                    "weight": weight,
+                    "suggested_weight": suggested.get(keyword, weight),
+                    "document_frequency": keyword_frequencies[keyword],
+                    "document_share": round(keyword_frequencies[keyword] / documents, 4) if documents else None
+                }
+                for keyword, weight in requirements.items()
+            ],
+            "suggested": suggested
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in suggest_job_offer_weights: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.put("/api/job-offers/{offer_id}")
 async def update_job_offer(offer_id: str, request: JobOfferUpdateRequest, db: Session = Depends(get_db)):
     """Met a jour les requirements d'une offre"""
@@ -397,25 +1030,45 @@ async def analyze_with_job_offer(project_id: str, offer_id: str, request: dict,
         # Convertir les keywords en floats
         keywords = {k: float(v) for k, v in keywords.items()}
 
-        # Lancer l'analyse avec CVAnalyzer
-        analyzer = CVAnalyzer(folder_path, keywords)
-        results = analyzer.analyze_cvs()
-        report = analyzer.generate_markdown_report(results)
+        # Lancer l'analyse avec CVAnalyzer (seuls les fichiers nouveaux ou modifies sont traites)
+        workers = int(request.get('workers', DEFAULT_WORKERS))
+        analyzer = CVAnalyzer(folder_path, keywords, workers=workers,
+                              discovery=CorpusDiscovery(folder_path, **discovery_options(request)),
+                              scoring=keyword_scoring(project, request.get('scoring')),
+                              query=cv_filter(request.get('query')))
+        previous_results = None
+        if request.get('incremental', True):
+            previous_results = get_previous_keyword_results(db, project_id, folder_path, offer_id)
+        top_k = int(request.get('top_k', DEFAULT_TOP_K))
+        results = run_keyword_analysis(analyzer, previous_results, top_k, bool(request.get('from_index')))
 
         # Sauvegarder l'analyse en DB avec reference a l'offre
         analysis = Analysis(
             project_id=project_id,
             job_offer_id=offer_id,
             date=datetime.now(),
-            report=report,
+            report=None,
             keywords=keywords,
-            folder_path=folder_path
+            folder_path=folder_path,
+            results=analyzer.results_to_dicts() + analyzer.failures_to_dicts()
         )
         db.add(analysis)
         db.commit()
         db.refresh(analysis)
 
-        return {"report": report}
+        # Matrice CV x mot-clé pour les re-scorings instantanés et la pagination
+        save_count_matrix(analysis.id, analyzer.count_matrix)
+
+        # Rapport rendu depuis les résultats sauvegardés (même date que l'analyse)
+        report = analyzer.generate_markdown_report(results, generated_at=analysis.date)
+
+        return {
+            "report": report,
+            "analysis_id": analysis.id,
+            "total": analyzer.stats["total"],
+            "failed_conversions": analyzer.failed_conversions,
+            "excluded": analyzer.excluded
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -425,6 +1078,359 @@ async def analyze_with_job_offer(project_id: str, offer_id: str, request: dict,
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def embedding_adapter(db: Session, model: str) -> OllamaAdapter:
+    """Client Ollama d'un modèle d'embedding (URL des paramètres LLM)"""
+    settings = db.query(LLMSettings).first()
+    return OllamaAdapter(model=model, ollama_url=settings.ollama_url if settings else "http://localhost:11434")
+
+@app.post("/api/projects/{project_id}/analyze-similarity/{offer_id}")
+async def analyze_similarity(project_id: str, offer_id: str, request: dict, db: Session = Depends(get_db)):
+    """
+    Classe les CVs par similarité (cosinus) avec le texte complet d'une offre:
+    TF-IDF local ou embeddings calculés par Ollama (method, sinon le mode du projet).
+    Les CVs sont extraits comme pour l'analyse par mots-clés (incrémentale, doublons,
+    filtre), leurs vecteurs sont mis en cache: un nouveau classement ne coûte que le
+    vecteur de l'offre et un produit matrice x vecteur.
+    """
+    try:
+        project = ProjectManager.get_project(db, project_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Projet non trouve")
+
+        job_offer = JobOfferManager.get_job_offer(db, offer_id)
+        if not job_offer:
+            raise HTTPException(status_code=404, detail="Offre non trouvee")
+        if job_offer.project_id != project_id:
+            raise HTTPException(status_code=400, detail="L'offre n'appartient pas a ce projet")
+
+        method = request.get('method') or ('embedding' if project.mode == 'embedding' else 'tfidf')
+        if method not in SIMILARITY_METHODS:
+            raise HTTPException(status_code=400, detail=f"Méthode de similarité inconnue: {method}")
+        folder_path = request.get('folder_path')
+        if not folder_path:
+            raise HTTPException(status_code=400, detail="folder_path requis")
+        if not (job_offer.raw_content or "").strip():
+            raise HTTPException(status_code=400, detail="L'offre n'a pas de texte")
+        if not job_offer.requirements:
+            raise HTTPException(status_code=400, detail="Aucun requirement dans l'offre")
+
+        # Extraction et comptage des requirements (affichés dans les résultats)
+        keywords = {k: float(v) for k, v in job_offer.requirements.items()}
+        workers = int(request.get('workers', DEFAULT_WORKERS))
+        analyzer = CVAnalyzer(folder_path, keywords, workers=workers,
+                              discovery=CorpusDiscovery(folder_path, **discovery_options(request)),
+                              query=cv_filter(request.get('query')))
+        previous_results = None
+        if request.get('incremental', True):
+            previous_results = get_previous_keyword_results(db, project_id, folder_path, offer_id)
+        analyzer.analyze_cvs(previous_results, top_k=0)
+
+        # Similarité de chaque CV avec l'offre, en un seul produit
+        entries = analyzer.results_to_dicts()
+        hashes = [entry.get('content_hash') for entry in entries]
+        mode = {"mode": method, "job_offer_name": job_offer.filename}
+        if method == 'tfidf':
+            vectors = cv_term_vectors(h for h in hashes if h)
+            scores = similarity_scores(job_offer.raw_content, [vectors.get(h) for h in hashes])
+        else:
+            model = request.get('embedding_model') or EMBEDDING_MODEL
+            adapter = embedding_adapter(db, model)
+            store = get_vector_store(model)
+            try:
+                # Seuls les CVs jamais vus par ce modèle sont envoyés à Ollama
+                await embed_cvs(adapter, store, (h for h in hashes if h))
+                offer_vector = await embed_document(adapter, job_offer.raw_content)
+            except Exception as e:
+                raise HTTPException(status_code=502, detail=f"Embeddings indisponibles: {e}")
+            # Nouveaux vecteurs rangés dans l'index de recherche des candidats similaires
+            get_ann_index(store).update()
+            scores = np.clip(store.similarities(offer_vector, [h or "" for h in hashes]), 0, 1)
+            mode["model"] = model
+        for entry, score in zip(entries, scores.tolist()):
+            entry.update({'score': round(score * 100, 2), 'scoring': method})
+        entries.sort(key=lambda entry: entry['score'], reverse=True)
+        results = entries + analyzer.failures_to_dicts()
+
+        analysis = Analysis(
+            project_id=project_id,
+            job_offer_id=offer_id,
+            date=datetime.now(),
+            report=None,
+            keywords=mode,
+            folder_path=folder_path,
+            results=results
+        )
+        db.add(analysis)
+        db.commit()
+        db.refresh(analysis)
+
+        top_k = int(request.get('top_k', DEFAULT_TOP_K))
+        report = render_analysis_report(db, analysis, top_n=top_k)
+
+        return {
+            "report": report,
+            "analysis_id": analysis.id,
+            "total": len(entries),
+            "results": entries[:top_k],
+            "failed_conversions": analyzer.failed_conversions,
+            "excluded": analyzer.excluded
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in analyze_similarity: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class MultiOfferAnalysisRequest(BaseModel):
+    folder_path: str
+    offer_ids: List[str]
+    workers: int = DEFAULT_WORKERS
+    incremental: bool = True
+    top_k: int = DEFAULT_TOP_K  # Taille du classement renvoye pour chaque offre
+    max_depth: Optional[int] = 0  # -1 = tous les sous-dossiers
+    include: Optional[List[str]] = None
+    exclude: Optional[List[str]] = None
+    max_file_size_mb: Optional[float] = None
+    from_index: bool = False  # Comptage dans l'index plein texte (dossier deja analyse)
+    scoring: Optional[str] = None  # binary ou bm25 (par defaut: mode du projet)
+    query: Optional[str] = None  # Filtre prealable des CVs (voir cv_query)
+
+
+def merge_previous_results(result_lists: List[Optional[List[dict]]]) -> List[dict]:
+    """
+    Fusionne les résultats précédents de plusieurs offres sur le même dossier:
+    les comptes de mots-clés d'un fichier sont réunis si toutes les analyses
+    ont vu le même fichier (même taille, même date de modification).
+    """
+    merged = {}
+    conflicts = set()
+    for results in result_lists:
+        for entry in results or []:
+            filename = entry['filename']
+            known = merged.get(filename)
+            if known is None:
+                merged[filename] = {**entry, 'found_keywords': dict(entry['found_keywords'])}
+            elif (known.get('size'), known.get('mtime')) == (entry.get('size'), entry.get('mtime')):
+                known['found_keywords'].update(entry['found_keywords'])
+            else:
+                conflicts.add(filename)
+    return [entry for filename, entry in merged.items() if filename not in conflicts]
+
+@app.post("/api/projects/{project_id}/analyze-offers")
+async def analyze_with_job_offers(project_id: str, request: MultiOfferAnalysisRequest,
+                                  db: Session = Depends(get_db)):
+    """
+    Analyse les CVs d'un dossier pour plusieurs offres en une seule passe: chaque CV est
+    extrait une fois et compté sur l'union des requirements, puis scoré pour chaque offre
+    (matrice CV x offre). Une analyse est enregistrée par offre.
+    """
+    try:
+        project = ProjectManager.get_project(db, project_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Projet non trouve")
+
+        offer_ids = list(dict.fromkeys(request.offer_ids))
+        if not offer_ids:
+            raise HTTPException(status_code=400, detail="Aucune offre selectionnee")
+
+        offers = []
+        for offer_id in offer_ids:
+            job_offer = JobOfferManager.get_job_offer(db, offer_id)
+            if not job_offer:
+                raise HTTPException(status_code=404, detail=f"Offre non trouvee: {offer_id}")
+            if job_offer.project_id != project_id:
+                raise HTTPException(status_code=400, detail=f"L'offre {offer_id} n'appartient pas a ce projet")
+            if not job_offer.requirements:
+                raise HTTPException(status_code=400, detail=f"Aucun requirement dans l'offre {job_offer.filename}")
+            offers.append((job_offer, {k: float(v) for k, v in job_offer.requirements.items()}))
+
+        folder_path = request.folder_path
+        if not os.path.exists(folder_path):
+            raise HTTPException(status_code=400, detail=f"Dossier non trouve: {folder_path}")
+
+        # Union des requirements, pondérée par la moyenne des offres (le total reste 100%)
+        union_weights = {}
+        for _, weights in offers:
+            for keyword, weight in weights.items():
+                union_weights[keyword] = union_weights.get(keyword, 0.0) + weight / len(offers)
+
+        analyzer = CVAnalyzer(folder_path, union_weights, workers=request.workers,
+                              discovery=CorpusDiscovery(folder_path, **discovery_options(request.dict())),
+                              scoring=keyword_scoring(project, request.scoring),
+                              query=cv_filter(request.query))
+        previous_results = None
+        if request.incremental:
+            previous_results = merge_previous_results([
+                get_previous_keyword_results(db, project_id, folder_path, job_offer.id)
+                for job_offer, _ in offers
+            ])
+        # Seule la matrice des occurrences est utile ici: pas de classement sur l'union
+        run_keyword_analysis(analyzer, previous_results, 0, request.from_index)
+
+        matrix = analyzer.count_matrix
+        scores = matrix.score_many([weights for _, weights in offers])
+        failures = analyzer.failures_to_dicts()
+
+        # Une analyse par offre: rapports, re-scorings et pagination fonctionnent comme pour une seule offre
+        now = datetime.now()
+        analyses = []
+        for job_offer, weights in offers:
+            analysis = Analysis(
+                project_id=project_id,
+                job_offer_id=job_offer.id,
+                date=now,
+                report=None,
+                keywords=weights,
+                folder_path=folder_path,
+                results=analyzer.results_to_dicts(weights=weights) + failures
+            )
+            db.add(analysis)
+            analyses.append(analysis)
+        db.commit()
+
+        rankings = []
+        for column, ((job_offer, weights), analysis) in enumerate(zip(offers, analyses)):
+            db.refresh(analysis)
+            save_count_matrix(analysis.id, matrix.select(list(weights)))
+            order = np.argsort(-scores[:, column], kind='stable')[:max(request.top_k, 0)]
+            rankings.append({
+                "offer_id": job_offer.id,
+                "offer_name": job_offer.filename,
+                "analysis_id": analysis.id,
+                "results": [
+                    {"rank": rank, "filename": matrix.filenames[row], "score": float(scores[row, column])}
+                    for rank, row in enumerate(order.tolist(), 1)
+                ]
+            })
+
+        # Meilleure offre de chaque candidat (première offre demandée en cas d'égalité)
+        best = scores.argmax(axis=1)
+        best_offers = [
+            {
+                "filename": filename,
+                "offer_id": offers[column][0].id,
+                "offer_name": offers[column][0].filename,
+                "score": float(scores[row, column])
+            }
+            for row, (filename, column) in enumerate(zip(matrix.filenames, best.tolist()))
+        ]
+
+        return {
+            "total": analyzer.stats["total"],
+            "offers": rankings,
+            "matrix": {
+                "offer_ids": [job_offer.id for job_offer, _ in offers],
+                "filenames": matrix.filenames,
+                "scores": scores.tolist()
+            },
+            "best_offers": best_offers,
+            "failed_conversions": analyzer.failed_conversions,
+            "excluded": analyzer.excluded
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in analyze_with_job_offers: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/projects/{project_id}/analyze-upload")
+async def analyze_upload(project_id: str, request: Request, offer_id: Optional[str] = None,
+                         top_k: int = DEFAULT_TOP_K, workers: int = DEFAULT_WORKERS,
+                         scoring: Optional[str] = None, query: Optional[str] = None,
+                         db: Session = Depends(get_db)):
+    """
+    Analyse des CVs envoyés directement (plusieurs PDF ou une archive .zip en multipart/form-data),
+    sans dossier sur le serveur. Chaque CV est extrait et scoré dès sa réception.
+    Les mots-clés sont ceux du projet, ou ceux de l'offre offer_id.
+    """
+    upload_dir = None
+    try:
+        project = ProjectManager.get_project(db, project_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Projet non trouvé")
+
+        keywords = project.keywords
+        if offer_id:
+            job_offer = JobOfferManager.get_job_offer(db, offer_id)
+            if not job_offer or job_offer.project_id != project_id:
+                raise HTTPException(status_code=404, detail="Offre non trouvée")
+            keywords = job_offer.requirements
+        if not keywords:
+            raise HTTPException(status_code=400, detail="Mots-clés manquants")
+        keywords = {k: float(v) for k, v in keywords.items()}
+        scoring = keyword_scoring(project, scoring)
+        cv_query = cv_filter(query)
+
+        upload_dir = new_upload_dir()
+        try:
+            receiver = UploadReceiver(request.headers.get("content-type", ""), upload_dir)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # L'analyse tourne dans un thread et consomme les CVs à mesure que la réception les termine
+        analyzer = CVAnalyzer(str(upload_dir), keywords, workers=workers, scoring=scoring, query=cv_query)
+        analysis_task = asyncio.get_running_loop().run_in_executor(
+            None, lambda: analyzer.analyze_cvs(top_k=top_k, pdf_files=iter_uploaded_files(receiver))
+        )
+        try:
+            async for chunk in request.stream():
+                receiver.feed(chunk)
+            receiver.finish()
+        except BaseException as e:
+            receiver.abort()
+            try:
+                await analysis_task
+            except Exception:
+                pass
+            if isinstance(e, UploadTooLarge):
+                raise HTTPException(status_code=413, detail=str(e))
+            raise
+        results = await analysis_task
+
+        # Sauvegarder l'analyse en DB (les CVs reçus restent dans le dossier d'envoi)
+        analysis = Analysis(
+            project_id=project_id,
+            job_offer_id=offer_id,
+            date=datetime.now(),
+            report=None,
+            keywords=keywords,
+            folder_path=str(upload_dir),
+            results=analyzer.results_to_dicts() + analyzer.failures_to_dicts()
+        )
+        db.add(analysis)
+        db.commit()
+        db.refresh(analysis)
+
+        save_count_matrix(analysis.id, analyzer.count_matrix)
+        report = analyzer.generate_markdown_report(results, generated_at=analysis.date)
+
+        return {
+            "report": report,
+            "analysis_id": analysis.id,
+            "total": analyzer.stats["total"],
+            "failed_conversions": analyzer.failed_conversions,
+            "excluded": analyzer.excluded,
+            "skipped": receiver.skipped
+        }
+    except HTTPException:
+        if upload_dir is not None:
+            remove_upload_dir(str(upload_dir))
+        raise
+    except Exception as e:
+        if upload_dir is not None:
+            remove_upload_dir(str(upload_dir))
+        import traceback
+        print(f"ERROR in analyze_upload: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ===== LLM SETTINGS ENDPOINTS =====
 
 class LLMSettingsRequest(BaseModel):
@@ -593,6 +1599,11 @@ class LLMAnalysisRequest(BaseModel):
     job_offer_id: str
     cv_files: Optional[List[str]] = None  # Liste optionnelle de fichiers specifiques
     source_analysis_id: Optional[int] = None  # ID de l'analyse source (pour traçabilité)
+    max_depth: Optional[int] = 0  # -1 = tous les sous-dossiers
+    include: Optional[List[str]] = None
+    exclude: Optional[List[str]] = None
+    max_file_size_mb: Optional[float] = None
+    query: Optional[str] = None  # Filtre prealable: les CVs ecartes ne sont pas envoyes au LLM
 
 
 @app.post("/api/projects/{project_id}/analyze-llm")
@@ -623,51 +1634,102 @@ async def analyze_with_llm(project_id: str, request: LLMAnalysisRequest, db: Ses
             raise HTTPException(status_code=400, detail="LLM non configure. Allez dans les parametres.")
 
         # 5. Lire les CVs (soit tous, soit selection specifique)
-        from PyPDF2 import PdfReader
         cvs = []
+        cv_query = cv_filter(request.query)
+        excluded = []
 
         # Determiner la liste des fichiers a analyser
+        discovery = CorpusDiscovery(folder_path, **discovery_options(request.dict()))
         if request.cv_files and len(request.cv_files) > 0:
-            # Mode selection: utiliser uniquement les fichiers specifies
-            files_to_analyze = request.cv_files
+            # Mode selection: utiliser uniquement les fichiers specifies (chemins relatifs au dossier)
+            files_to_analyze = discovery.select(request.cv_files)
         else:
-            # Mode tous: scanner tout le dossier
-            files_to_analyze = [f for f in os.listdir(folder_path) if f.lower().endswith('.pdf')]
-
-        for filename in files_to_analyze:
-            if filename.lower().endswith('.pdf'):
-                filepath = os.path.join(folder_path, filename)
-                if not os.path.exists(filepath):
-                    print(f"Fichier non trouve: {filepath}")
+            # Mode tous: parcourir le dossier
+            files_to_analyze = discovery
+
+        # Les doublons (fichiers identiques ou quasi-identiques) ne sont envoyes qu'une fois au LLM
+        first_by_hash = {}
+        excluded_hashes = set()
+        text_cache = get_text_cache()
+        for found in files_to_analyze:
+            content_hash = None
+            try:
+                content_hash = file_content_hash(found.path)
+                if content_hash in excluded_hashes:
+                    excluded.append(found.relative_path)
+                    continue
+                if content_hash in first_by_hash:
+                    # Copie exacte d'un CV deja lu: ni extraction ni appel au LLM
+                    cvs.append({"filename": found.relative_path, "duplicate_of": first_by_hash[content_hash]})
+                    continue
+                quarantined = text_cache.get_quarantine(content_hash)
+                if quarantined:
+                    print(f"CV en quarantaine ignore {found.relative_path}: {quarantined['error']}")
                     continue
-                try:
-                    reader = PdfReader(filepath)
-                    text = ""
-                    for page in reader.pages:
-                        text += page.extract_text() or ""
-                    if text.strip():
-                        cvs.append({"filename": filename, "content": text})
-                except Exception as e:
-                    print(f"Erreur lecture {filename}: {e}")
+                # Extraction confinee dans les workers du pool (comme pour l'analyse par mots-cles)
+                text = "".join(extract_pages(found.path, content_hash=content_hash))
+                if text.strip():
+                    cleaned = clean_text(text)
+                    if cv_query is not None and not cv_query.matches_text(normalize_text(cleaned)):
+                        # Ecarte par le filtre: jamais envoye au LLM
+                        excluded_hashes.add(content_hash)
+                        excluded.append(found.relative_path)
+                        continue
+                    first_by_hash[content_hash] = found.relative_path
+                    cvs.append({"filename": found.relative_path, "content": text,
+                                "signature": minhash_signature(cleaned)})
+            except Exception as e:
+                reason = failure_reason(e)
+                error = str(e) or failure_message(reason)
+                if reason in QUARANTINE_REASONS and content_hash:
+                    # Fichier qui a bloque ou fait exploser l'extraction: plus relu ensuite
+                    text_cache.add_quarantine(content_hash, found.relative_path, reason, error)
+                print(f"Erreur lecture {found.relative_path}: {error}")
 
         if not cvs:
+            if excluded:
+                raise HTTPException(status_code=400, detail="Aucun CV ne correspond au filtre")
             raise HTTPException(status_code=400, detail="Aucun CV valide trouve dans le dossier")
 
+        near_duplicates = near_duplicate_clusters(
+            (cv["filename"], cv["signature"]) for cv in cvs if cv.get("signature") is not None
+        )
+        for cv in cvs:
+            if cv["filename"] in near_duplicates:
+                cv["duplicate_of"] = near_duplicates[cv["filename"]]
+            elif cv.get("duplicate_of") in near_duplicates:
+                # Copie exacte d'un quasi-doublon: rattachee au representant de son groupe
+                cv["duplicate_of"] = near_duplicates[cv["duplicate_of"]]
+
         # 6. Creer le LLM Manager et analyser
         from .llm_manager import LLMManager
         llm_manager = LLMManager(db)
 
         results = []
+        results_by_name = {}
         for cv in cvs:
+            if cv.get("duplicate_of"):
+                # Le representant du groupe precede toujours ses doublons: son resultat est repris
+                original = results_by_name[cv["duplicate_of"]]
+                results.append({
+                    **{key: value for key, value in original.items() if key != "tokens"},
+                    "filename": cv["filename"],
+                    "duplicate_of": cv["duplicate_of"]
+                })
+                continue
             try:
                 response = await llm_manager.analyze_cv(
                     cv_content=cv["content"],
                     job_offer_content=job_offer.raw_content
                 )
+                # Score et recommandation extraits une fois pour toutes (rendus sans re-parser)
+                parsed = parse_llm_response(response.content)
                 results.append({
                     "filename": cv["filename"],
                     "success": True,
                     "analysis": response.content,
+                    "score": parsed["score"],
+                    "recommendation": parsed["recommendation"],
                     "model": response.model,
                     "provider": response.provider,
                     "tokens": response.usage
@@ -678,24 +1740,27 @@ async def analyze_with_llm(project_id: str, request: LLMAnalysisRequest, db: Ses
                     "success": False,
                     "error": str(e)
                 })
+            results_by_name[cv["filename"]] = results[-1]
 
-        # 7. Generer le rapport Markdown
-        report = generate_llm_report(results, job_offer.filename, settings.provider, settings.model)
-
-        # 8. Sauvegarder l'analyse
+        # 7. Sauvegarder l'analyse (le rapport Markdown est rendu a la demande)
         analysis = Analysis(
             project_id=project_id,
             job_offer_id=request.job_offer_id,
             date=datetime.now(),
-            report=report,
-            keywords={"mode": "llm", "provider": settings.provider, "model": settings.model},
+            report=None,
+            keywords={"mode": "llm", "provider": settings.provider, "model": settings.model,
+                      "job_offer_name": job_offer.filename},
             folder_path=folder_path,
             results=results
         )
         db.add(analysis)
         db.commit()
+        db.refresh(analysis)
+
+        # 8. Generer le rapport Markdown
+        report = render_analysis_report(db, analysis)
 
-        return {"report": report, "results": results}
+        return {"report": report, "results": results, "excluded": excluded}
 
     except HTTPException:
         raise
@@ -755,26 +1820,53 @@ def get_recommendation_label(recommendation: str) -> str:
     return labels.get(recommendation, 'Non évalué')
 
 
-def generate_llm_report(results: list, job_offer_name: str, provider: str, model: str) -> str:
-    """Genere un rapport Markdown avec classement a partir des resultats LLM."""
+LLM_REPORT_SECTIONS = ('ranking', 'top3', 'details', 'errors')
+
+
+def llm_result_entry(result: dict) -> dict:
+    """Score et recommandation d'un résultat LLM (stockés à l'analyse, sinon parsés)"""
+    if 'score' in result and 'recommendation' in result:
+        return {
+            'filename': result['filename'],
+            'score': result['score'],
+            'recommendation': result['recommendation'],
+            'analysis': result.get('analysis', ''),
+            'duplicate_of': result.get('duplicate_of')
+        }
+    parsed = parse_llm_response(result.get("analysis", ""))
+    return {
+        'filename': result['filename'],
+        'score': parsed['score'],
+        'recommendation': parsed['recommendation'],
+        'analysis': parsed['analysis'],
+        'duplicate_of': result.get('duplicate_of')
+    }
+
+
+def generate_llm_report(results: list, job_offer_name: str, provider: str, model: str,
+                        top_n: Optional[int] = None, sections: Optional[List[str]] = None,
+                        generated_at: Optional[datetime] = None) -> str:
+    """
+    Genere un rapport Markdown avec classement a partir des resultats LLM.
+    top_n limite le classement et les analyses detaillees, sections choisit les parties
+    (LLM_REPORT_SECTIONS).
+    """
+    sections = set(sections or LLM_REPORT_SECTIONS)
+    now = generated_at or datetime.now()
 
     # Separer les succes et echecs
     successful = [r for r in results if r.get("success")]
     failed = [r for r in results if not r.get("success")]
 
-    # Parser les scores pour les resultats reussis
-    parsed_results = []
-    for r in successful:
-        parsed = parse_llm_response(r.get("analysis", ""))
-        parsed_results.append({
-            'filename': r['filename'],
-            'score': parsed['score'],
-            'recommendation': parsed['recommendation'],
-            'analysis': parsed['analysis']
-        })
+    # Scores des resultats reussis
+    parsed_results = [llm_result_entry(r) for r in successful]
 
     # Trier par score decroissant (None a la fin)
     parsed_results.sort(key=lambda x: (x['score'] is not None, x['score'] or 0), reverse=True)
+    ranked_results = parsed_results[:top_n] if top_n is not None else parsed_results
+
+    duplicates = sum(1 for r in results if r.get("duplicate_of"))
+    duplicates_row = f"| **Doublons** | {duplicates} |\n" if duplicates else ""
 
     # Generer le rapport
     report = f"""# 📊 Rapport d'Analyse IA
@@ -786,61 +1878,138 @@ def generate_llm_report(results: list, job_offer_name: str, provider: str, model
 | **Provider** | {provider} |
 | **Modèle** | {model} |
 | **CVs analysés** | {len(results)} |
-| **Date** | {datetime.now().strftime('%d/%m/%Y à %H:%M')} |
+{duplicates_row}| **Date** | {now.strftime('%d/%m/%Y à %H:%M')} |
 
 ---
 
-## 🏆 Synthèse et Classement
-
 """
 
+    synthesis = 'ranking' in sections or 'top3' in sections
+    if synthesis:
+        report += "## 🏆 Synthèse et Classement\n\n"
+
     if parsed_results:
-        # Tableau de classement
-        report += "| Rang | Candidat | Score | Recommandation |\n"
-        report += "|:----:|----------|:-----:|----------------|\n"
+        if 'ranking' in sections:
+            # Tableau de classement
+            report += "| Rang | Candidat | Score | Recommandation |\n"
+            report += "|:----:|----------|:-----:|----------------|\n"
+
+            for i, r in enumerate(ranked_results, 1):
+                score_str = f"{r['score']}/100" if r['score'] is not None else "N/A"
+                rec_emoji = get_recommendation_emoji(r['recommendation'])
+                rec_label = get_recommendation_label(r['recommendation'])
+                report += f"| {i} | {r['filename']} | **{score_str}** | {rec_emoji} {rec_label} |\n"
+
+            report += "\n"
+
+        if 'top3' in sections:
+            # Top 3 resume
+            top_3 = [r for r in parsed_results if r['score'] is not None][:3]
+            if top_3:
+                report += "### 🎯 Top 3 Profils\n\n"
+                for i, r in enumerate(top_3, 1):
+                    # Extraire le resume du profil depuis l'analyse
+                    resume_match = re.search(r'## Resume du Profil\s*\n(.*?)(?=\n##|\Z)', r['analysis'], re.DOTALL | re.IGNORECASE)
+                    resume = resume_match.group(1).strip() if resume_match else "Profil analysé"
+                    # Limiter a 150 caracteres
+                    if len(resume) > 150:
+                        resume = resume[:147] + "..."
+                    report += f"{i}. **{r['filename']}** ({r['score']}/100) - {resume}\n\n"
+
+        if synthesis:
+            report += "\n---\n\n"
+
+        if 'details' in sections:
+            # Analyses detaillees
+            report += f"## 📄 Analyses Détaillées\n\n"
+
+            for i, r in enumerate(ranked_results, 1):
+                score_str = f"{r['score']}/100" if r['score'] is not None else "N/A"
+                rec_emoji = get_recommendation_emoji(r['recommendation'])
+                report += f"### {i}. {r['filename']}\n\n"
+                report += f"**Score: {score_str}** | **Recommandation: {rec_emoji} {get_recommendation_label(r['recommendation'])}**\n\n"
+
+                if r['duplicate_of']:
+                    # Analyse identique a celle du representant: pas de repetition
+                    report += f"_Doublon de **{r['duplicate_of']}**: analyse reprise sans nouvel appel au LLM._"
+                    report += "\n\n---\n\n"
+                    continue
+
+                # Retirer les lignes SCORE et RECOMMANDATION du texte d'analyse
+                clean_analysis = re.sub(r'^SCORE:.*$', '', r['analysis'], flags=re.MULTILINE | re.IGNORECASE)
+                clean_analysis = re.sub(r'^RECOMMANDATION:.*$', '', clean_analysis, flags=re.MULTILINE | re.IGNORECASE)
+                clean_analysis = clean_analysis.strip()
 
-        for i, r in enumerate(parsed_results, 1):
-            score_str = f"{r['score']}/100" if r['score'] is not None else "N/A"
-            rec_emoji = get_recommendation_emoji(r['recommendation'])
-            rec_label = get_recommendation_label(r['recommendation'])
-            report += f"| {i} | {r['filename']} | **{score_str}** | {rec_emoji} {rec_label} |\n"
+                report += clean_analysis
+                report += "\n\n---\n\n"
 
+    # Erreurs
+    if failed and 'errors' in sections:
+        report += f"## ⚠️ Erreurs ({len(failed)} CVs)\n\n"
+        for result in failed:
+            report += f"- **{result['filename']}**: {result.get('error', 'Erreur inconnue')}\n"
         report += "\n"
 
-        # Top 3 resume
-        top_3 = [r for r in parsed_results if r['score'] is not None][:3]
-        if top_3:
-            report += "### 🎯 Top 3 Profils\n\n"
-            for i, r in enumerate(top_3, 1):
-                # Extraire le resume du profil depuis l'analyse
-                resume_match = re.search(r'## Resume du Profil\s*\n(.*?)(?=\n##|\Z)', r['analysis'], re.DOTALL | re.IGNORECASE)
-                resume = resume_match.group(1).strip() if resume_match else "Profil analysé"
-                # Limiter a 150 caracteres
-                if len(resume) > 150:
-                    resume = resume[:147] + "..."
-                report += f"{i}. **{r['filename']}** ({r['score']}/100) - {resume}\n\n"
-
-        report += "\n---\n\n"
-
-        # Analyses detaillees
-        report += f"## 📄 Analyses Détaillées\n\n"
-
-        for i, r in enumerate(parsed_results, 1):
-            score_str = f"{r['score']}/100" if r['score'] is not None else "N/A"
-            rec_emoji = get_recommendation_emoji(r['recommendation'])
-            report += f"### {i}. {r['filename']}\n\n"
-            report += f"**Score: {score_str}** | **Recommandation: {rec_emoji} {get_recommendation_label(r['recommendation'])}**\n\n"
-
-            # Retirer les lignes SCORE et RECOMMANDATION du texte d'analyse
-            clean_analysis = re.sub(r'^SCORE:.*$', '', r['analysis'], flags=re.MULTILINE | re.IGNORECASE)
-            clean_analysis = re.sub(r'^RECOMMANDATION:.*$', '', clean_analysis, flags=re.MULTILINE | re.IGNORECASE)
-            clean_analysis = clean_analysis.strip()
-
-            report += clean_analysis
-            report += "\n\n---\n\n"
+    return report
+
 
-    # Erreurs
-    if failed:
+SIMILARITY_REPORT_SECTIONS = ('ranking', 'errors')
+
+
+def generate_similarity_report(results: list, job_offer_name: str, method: str = "tfidf",
+                               model: Optional[str] = None, top_n: Optional[int] = None,
+                               sections: Optional[List[str]] = None,
+                               generated_at: Optional[datetime] = None) -> str:
+    """
+    Genere le rapport Markdown d'un classement par similarite avec une offre
+    (method: 'tfidf' ou 'embedding', avec le modele utilise).
+    top_n limite le classement, sections choisit les parties (SIMILARITY_REPORT_SECTIONS).
+    """
+    sections = set(sections or SIMILARITY_REPORT_SECTIONS)
+    now = generated_at or datetime.now()
+
+    ranked = [r for r in results if 'found_keywords' in r]
+    failed = [r for r in results if r.get("success") is False]
+    shown = ranked[:top_n] if top_n is not None else ranked
+    best = max((r['score'] for r in ranked), default=0)
+    average = sum(r['score'] for r in ranked) / len(ranked) if ranked else 0
+    duplicates = sum(1 for r in ranked if r.get("duplicate_of"))
+    duplicates_row = f"| **Doublons** | {duplicates} |\n" if duplicates else ""
+
+    title = "Sémantique" if method == "embedding" else "TF-IDF"
+    model_row = f"| **Modèle** | {model} |\n" if model else ""
+
+    report = f"""# 📊 Rapport de Similarité {title}
+
+## Informations
+| | |
+|---|---|
+| **Offre d'emploi** | {job_offer_name} |
+{model_row}| **CVs analysés** | {len(ranked)} |
+| **Meilleure similarité** | {best:.1f}/100 |
+| **Similarité moyenne** | {average:.1f}/100 |
+{duplicates_row}| **Date** | {now.strftime('%d/%m/%Y à %H:%M')} |
+
+---
+
+"""
+
+    if ranked and 'ranking' in sections:
+        report += "## 🏆 Classement\n\n"
+        report += "| Rang | Candidat | Similarité | Requirements trouvés |\n"
+        report += "|:----:|----------|:----------:|----------------------|\n"
+        for i, r in enumerate(shown, 1):
+            found = [k for k, count in r['found_keywords'].items() if count > 0]
+            found_str = ", ".join(found) if found else "-"
+            name = r['filename']
+            if r.get("duplicate_of"):
+                name += f" _(doublon de {r['duplicate_of']})_"
+            report += f"| {i} | {name} | **{r['score']:.1f}/100** | {found_str} |\n"
+        report += "\n"
+        if len(shown) < len(ranked):
+            report += f"_{len(ranked) - len(shown)} autres CVs non affichés._\n\n"
+
+    if failed and 'errors' in sections:
         report += f"## ⚠️ Erreurs ({len(failed)} CVs)\n\n"
         for result in failed:
             report += f"- **{result['filename']}**: {result.get('error', 'Erreur inconnue')}\n"
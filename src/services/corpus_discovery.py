@@ -0,0 +1,115 @@
+"""
+Decouverte des fichiers a analyser (CVs, offres d'emploi).
+Parcours base sur os.scandir: les informations de stat des entrees sont reutilisees
+(taille, date de modification) au lieu d'un appel systeme par fichier, les
+sous-dossiers sont parcourus jusqu'a une profondeur donnee et les fichiers sont
+produits au fur et a mesure.
+"""
+import os
+import stat
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Union
+
+
+@dataclass(frozen=True)
+class DiscoveredFile:
+    """Fichier trouve, avec les informations de stat deja lues"""
+    path: Path
+    # Chemin relatif a la racine (separateur '/'): identifiant du fichier dans les resultats
+    relative_path: str
+    size: int
+    mtime: float
+
+
+class CorpusDiscovery:
+    """
+    Parcourt un dossier et produit les fichiers retenus.
+    max_depth: 0 = dossier seul, n = n niveaux de sous-dossiers, None = sans limite.
+    include/exclude: motifs glob testes sur le chemin relatif et sur le nom
+    (un dossier exclu n'est pas parcouru). max_size: taille maximale en octets.
+    """
+
+    def __init__(self, root: Union[str, Path], extensions: Sequence[str] = ('.pdf',),
+                 max_depth: Optional[int] = 0, include: Optional[Iterable[str]] = None,
+                 exclude: Optional[Iterable[str]] = None, max_size: Optional[int] = None):
+        self.root = Path(root)
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self.max_depth = max_depth
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.max_size = max_size
+        # Fichiers ecartes car trop volumineux (remplie pendant le parcours)
+        self.too_large: List[DiscoveredFile] = []
+
+    def __iter__(self) -> Iterator[DiscoveredFile]:
+        self.too_large = []
+        return self._scan(self.root, '', 0)
+
+    def _matches(self, patterns: List[str], relative_path: str, name: str) -> bool:
+        return any(fnmatch(relative_path, pattern) or fnmatch(name, pattern) for pattern in patterns)
+
+    def _accept(self, relative_path: str, name: str) -> bool:
+        """Extension, motifs d'inclusion et d'exclusion"""
+        if not name.lower().endswith(self.extensions):
+            return False
+        if self.include and not self._matches(self.include, relative_path, name):
+            return False
+        return not self._matches(self.exclude, relative_path, name)
+
+    def _keep(self, found: DiscoveredFile) -> bool:
+        """Applique la taille maximale"""
+        if self.max_size is not None and found.size > self.max_size:
+            self.too_large.append(found)
+            return False
+        return True
+
+    def _scan(self, directory: Path, prefix: str, depth: int) -> Iterator[DiscoveredFile]:
+        try:
+            with os.scandir(directory) as entries:
+                # Les sous-dossiers sont parcourus apres les fichiers du dossier courant
+                subdirectories = []
+                for entry in entries:
+                    relative_path = prefix + entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.max_depth is None or depth < self.max_depth:
+                                if not self._matches(self.exclude, relative_path, entry.name):
+                                    subdirectories.append((entry.path, relative_path))
+                            continue
+                        if not self._accept(relative_path, entry.name) or not entry.is_file():
+                            continue
+                        info = entry.stat()
+                    except OSError:
+                        # Entree disparue ou illisible pendant le parcours
+                        continue
+                    found = DiscoveredFile(Path(entry.path), relative_path, info.st_size, info.st_mtime)
+                    if self._keep(found):
+                        yield found
+        except OSError:
+            return
+
+        for path, relative_path in subdirectories:
+            yield from self._scan(Path(path), relative_path + '/', depth + 1)
+
+    def select(self, relative_paths: Iterable[str]) -> Iterator[DiscoveredFile]:
+        """
+        Produit uniquement les fichiers demandes (chemins relatifs a la racine),
+        avec un seul stat par fichier; les fichiers absents sont ignores.
+        """
+        for relative_path in relative_paths:
+            relative_path = relative_path.replace('\\', '/')
+            name = relative_path.rsplit('/', 1)[-1]
+            if not self._accept(relative_path, name):
+                continue
+            path = self.root / relative_path
+            try:
+                info = path.stat()
+            except OSError:
+                continue
+            if not stat.S_ISREG(info.st_mode):
+                continue
+            found = DiscoveredFile(path, relative_path, info.st_size, info.st_mtime)
+            if self._keep(found):
+                yield found
@@ -3,11 +3,90 @@ Service d'analyse des CV
 """
 import os
 from pathlib import Path
-import PyPDF2
 import re
-from typing import Dict, List
-from dataclasses import dataclass
+import heapq
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from dataclasses import dataclass, asdict
 from datetime import datetime
+import numpy as np
+from .keyword_matcher import KeywordMatcher
+from .skills_taxonomy import get_taxonomy
+from .text_normalization import NORMALIZATION_VERSION, normalize_text, normalize_with_offsets
+from .score_matrix import SCORING_MODES, CorpusStatistics, KeywordCountMatrix
+from .process_pool import imap_ordered
+from .pdf_extraction import (
+    EXTRACTOR_VERSION, PAGE_PARALLEL_THRESHOLD, QUARANTINE_REASONS, SANDBOX_EXTRACTION,
+    PageSplitRequired, extract_pages, failure_message, failure_reason, watchdog_memory_mb, watchdog_timeout
+)
+from .text_cache import file_content_hash, get_text_cache
+from .cv_index import get_cv_index
+from .cv_query import CVQuery
+from .corpus_discovery import CorpusDiscovery, DiscoveredFile
+from .dedup import (
+    MINHASH_VERSION, minhash_signature, near_duplicate_clusters,
+    signature_from_bytes, signature_to_bytes
+)
+
+# Version du nettoyage: à incrémenter si clean_text change (invalide le texte nettoyé en cache)
+CLEANING_VERSION = "1"
+
+# Parties du rapport Markdown, dans l'ordre d'affichage
+REPORT_SECTIONS = ('summary', 'criteria', 'top3', 'details', 'duplicates', 'errors')
+
+# Libellés des causes d'échec de conversion
+FAILURE_LABELS = {
+    'timeout': "Délai dépassé",
+    'memory': "Mémoire",
+    'crash': "Arrêt du processus",
+    'no-text-layer': "Pas de couche texte",
+    'too-large': "Fichier trop volumineux",
+    'error': "Erreur",
+}
+
+# Frontière minuscule/majuscule ASCII (mots collés par l'extraction: "PythonDeveloper")
+_CAMEL_CASE_BOUNDARY = re.compile(r'(?<=[a-z])(?=[A-Z])')
+
+
+def clean_text(text: str) -> str:
+    """
+    Nettoie le texte extrait: sauts de ligne et blancs réduits à une espace,
+    mots collés séparés, une espace (et une seule) après chaque virgule ou point.
+    Résultat identique à la suite de re.sub d'origine, mais en passes linéaires
+    au niveau C au lieu de quatre substitutions regex.
+    """
+    words = text.split()
+    if not words:
+        return ' ' if text else ''
+
+    # str.split et \s reconnaissent les mêmes blancs; un blanc initial ou final devient une espace
+    cleaned = ' '.join(words)
+    if text[0].isspace():
+        cleaned = ' ' + cleaned
+    if text[-1].isspace():
+        cleaned = cleaned + ' '
+
+    # Les espaces sont uniques: on retire celles qui touchent une ponctuation, puis on en remet une après
+    cleaned = cleaned.replace(' ,', ',').replace(', ', ',').replace(' .', '.').replace('. ', '.')
+    cleaned = cleaned.replace(',', ', ').replace('.', '. ')
+
+    return _CAMEL_CASE_BOUNDARY.sub(' ', cleaned)
+
+
+def clean_pages(pages: Iterable[str]) -> str:
+    """Assemble le texte des pages en une seule concaténation puis le nettoie"""
+    return clean_text(''.join(pages))
+
+
+def bm25_corpus_statistics(keywords: Iterable[str]) -> Optional[CorpusStatistics]:
+    """Statistiques BM25 de toute l'archive, lues dans les compteurs de l'index (None si index vide)"""
+    cv_index = get_cv_index()
+    documents, average_length = cv_index.corpus_totals()
+    if not documents:
+        return None
+    _, frequencies = cv_index.document_frequencies(keywords)
+    return CorpusStatistics(documents=documents, average_length=average_length, frequencies=frequencies)
 
 @dataclass
 class ScoredCV:
@@ -15,60 +94,128 @@ class ScoredCV:
     filename: str
     score: float
     found_keywords: Dict[str, int]
+    content_hash: Optional[str] = None
+    # CV représentant du groupe de doublons (identiques ou quasi-identiques) auquel appartient ce CV
+    duplicate_of: Optional[str] = None
 
 class CVAnalyzer:
-    def __init__(self, pdf_folder: str, keywords: Dict[str, float]):
+    def __init__(self, pdf_folder: str, keywords: Dict[str, float], workers: int = 1,
+                 page_threshold: int = PAGE_PARALLEL_THRESHOLD,
+                 discovery: Optional[CorpusDiscovery] = None, scoring: str = 'binary',
+                 query: Optional[CVQuery] = None):
         self.pdf_folder = Path(pdf_folder)
+        # Fichiers à analyser (par défaut: les PDF du dossier, sans sous-dossiers)
+        self.discovery = discovery or CorpusDiscovery(pdf_folder)
+        # Nombre de processus pour l'analyse (1 = mode séquentiel)
+        self.workers = workers
+        # Au-delà de ce nombre de pages, un PDF est extrait en parallèle page par page
+        self.page_threshold = page_threshold
         self.keywords_original = keywords
-        self.keywords_patterns = {
-            self._create_case_insensitive_pattern(k): v
-            for k, v in keywords.items()
-        }
+        # Score binaire (poids des mots-clés présents) ou BM25 (occurrences, rareté, longueur du CV)
+        if scoring not in SCORING_MODES:
+            raise ValueError(f"Mode de score inconnu: {scoring}")
+        self.scoring = scoring
+        # Synonymes de la taxonomie des compétences ("k8s" compte pour "Kubernetes")
+        taxonomy = get_taxonomy()
+        synonyms = {keyword: taxonomy.synonyms(keyword) for keyword in keywords}
+        # Façon de compter (normalisation, taxonomie si des synonymes servent): les comptes
+        # d'une analyse précédente ne sont repris que s'ils ont été obtenus de la même façon
+        self.matching_version = f"n{NORMALIZATION_VERSION}"
+        if any(synonyms.values()):
+            self.matching_version += f"-t{taxonomy.fingerprint}"
+        # Automate construit une seule fois, réutilisé pour chaque CV; mots-clés normalisés
+        # comme le texte (sans accents, casefold): "Développeur" trouve "DEVELOPPEUR"
+        self.matcher = KeywordMatcher(keywords.keys(), synonyms=synonyms, normalize=normalize_text)
+        # Fichiers non convertis: {'file', 'error', 'reason', 'content_hash'}
         self.failed_conversions = []
+        # Doublons de la dernière analyse: CV -> représentant de son groupe
+        self.duplicates: Dict[str, str] = {}
+        # Filtre préalable compilé (voir cv_query): les CVs qui n'y répondent pas ne sont pas classés
+        self.query = query
+        self.excluded: List[str] = []
+        # Manifeste du dossier: fichier -> taille, date de modification, empreinte
+        self.manifest: Dict[str, Dict] = {}
+        # Remplis par analyze_cvs: occurrences et scores de tous les CVs, statistiques globales
+        self.count_matrix: Optional[KeywordCountMatrix] = None
+        self.scores: Optional[np.ndarray] = None
+        self.stats: Optional[Dict] = None
 
         # Validation que les pourcentages totalisent 100%
         total = sum(keywords.values())
         if not(99.5 <= total <= 100.5):
             raise ValueError(f"La somme des pourcentages doit être 100%. Actuellement: {total}%")
 
-    def _create_case_insensitive_pattern(self, keyword: str) -> str:
-        """Crée un pattern regex case-insensitive pour un mot-clé"""
-        return f"\\b{re.escape(keyword)}\\b"
-
     def clean_text(self, text: str) -> str:
         """Nettoie le texte extrait"""
-        text = text.replace('\n', ' ')
-        text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'\s*([,.])\s*', r'\1 ', text)
-        return text
+        return clean_text(text)
 
     def extract_text_from_pdf(self, pdf_path: Path) -> str:
-        """Extrait le texte d'un PDF"""
+        """Extrait le texte d'un PDF (via le cache de texte extrait)"""
+        text, _ = self._extract_text_with_hash(pdf_path)
+        return text
+
+    def _extract_text_with_hash(self, pdf_path: Path, content_hash: Optional[str] = None,
+                                name: Optional[str] = None, normalized: bool = False) -> Tuple[str, Optional[str]]:
+        """
+        Extrait le texte nettoyé d'un PDF et renvoie aussi l'empreinte de son contenu.
+        Avec normalized, renvoie le texte normalisé (mis en cache avec sa table de positions).
+        """
+        name = name or pdf_path.name
         try:
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                text = ''
-                for page in reader.pages:
-                    text += page.extract_text() or ''
-                return self.clean_text(text)
+            if content_hash is None:
+                content_hash = file_content_hash(pdf_path)
+            cache = get_text_cache()
+            text = None
+            if normalized:
+                text = cache.get_normalized(content_hash, EXTRACTOR_VERSION, CLEANING_VERSION,
+                                            NORMALIZATION_VERSION)
+            if text is None:
+                text = cache.get_cleaned(content_hash, EXTRACTOR_VERSION, CLEANING_VERSION)
+                if text is None:
+                    pages = extract_pages(pdf_path, self.page_threshold, self.workers, content_hash)
+                    text = clean_pages(pages)
+                    cache.put_cleaned(content_hash, EXTRACTOR_VERSION, CLEANING_VERSION, text)
+                    # Signature calculée ici (dans le worker), une fois par contenu
+                    store_signature(content_hash, text)
+                if normalized:
+                    text, offsets = normalize_with_offsets(text)
+                    cache.put_normalized(content_hash, EXTRACTOR_VERSION, CLEANING_VERSION,
+                                         NORMALIZATION_VERSION, text, offsets)
+            if not text.strip():
+                # PDF scanné: aucune couche texte à analyser
+                self._record_failure(name, 'no-text-layer', failure_message('no-text-layer'), content_hash)
+                return '', content_hash
+            if normalized:
+                # Index plein texte tenu à jour à l'extraction (sans effet si déjà indexé)
+                get_cv_index().add(content_hash, text)
+            return text, content_hash
+        except PageSplitRequired:
+            raise
         except Exception as e:
-            self.failed_conversions.append({
-                'file': pdf_path.name,
-                'error': str(e)
-            })
-            return ''
+            reason = failure_reason(e)
+            self._record_failure(name, reason, str(e) or failure_message(reason), content_hash)
+            return '', content_hash
+
+    def _record_failure(self, filename: str, reason: str, error: str,
+                        content_hash: Optional[str] = None) -> None:
+        """Enregistre un fichier non converti avec la cause de l'échec"""
+        self.failed_conversions.append({
+            'file': filename,
+            'error': error,
+            'reason': reason,
+            'content_hash': content_hash
+        })
+
+    def _quarantine_failures(self, failures: List[Dict]) -> None:
+        """Met en quarantaine les fichiers qui ont bloqué ou fait exploser l'extraction"""
+        cache = get_text_cache()
+        for failure in failures:
+            if failure.get('reason') in QUARANTINE_REASONS and failure.get('content_hash'):
+                cache.add_quarantine(failure['content_hash'], failure['file'], failure['reason'], failure['error'])
 
     def count_keywords(self, text: str) -> Dict[str, int]:
-        """Compte les occurrences de chaque mot-clé"""
-        keyword_counts = {}
-        for pattern in self.keywords_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            count = len(matches)
-            original_keyword = next(k for k in self.keywords_original.keys()
-                                if self._create_case_insensitive_pattern(k) == pattern)
-            keyword_counts[original_keyword] = count
-        return keyword_counts
+        """Compte les occurrences de chaque mot-clé (texte normalisé ici, puis une seule passe)"""
+        return self.matcher.count(normalize_text(text))
 
     def calculate_score(self, keyword_counts: Dict[str, int]) -> float:
         """Calcule le score: somme des poids des keywords trouvés"""
@@ -78,23 +225,438 @@ class CVAnalyzer:
                 score += self.keywords_original[keyword]  # Ajouter son poids une seule fois
         return score
 
-    def analyze_cvs(self) -> List[ScoredCV]:
-        """Analyse tous les CVs du dossier"""
-        results = []
-        for pdf_file in self.pdf_folder.glob('*.pdf'):
-            text = self.extract_text_from_pdf(pdf_file)
-            if not text:
+    def analyze_cv_file(self, pdf_file: Path, content_hash: Optional[str] = None,
+                        name: Optional[str] = None) -> Optional[ScoredCV]:
+        """
+        Extrait, nettoie et score un CV (None si aucun texte).
+        name identifie le CV dans les résultats (chemin relatif au dossier analysé).
+        """
+        text, content_hash = self._extract_text_with_hash(pdf_file, content_hash, name, normalized=True)
+        if not text:
+            return None
+        if self.query is not None and not self.query.matches_text(text):
+            # Écarté par le filtre (évalué sur le texte extrait): jamais compté ni scoré
+            self.excluded.append(name or pdf_file.name)
+            return None
+        # Texte déjà normalisé (en cache): pas de pliage de casse à refaire
+        keyword_counts = self.matcher.count(text)
+        score = self.calculate_score(keyword_counts)
+
+        return ScoredCV(
+            filename=name or pdf_file.name,
+            score=score,
+            found_keywords=keyword_counts,
+            content_hash=content_hash
+        )
+
+    def _reusable_results(self, previous_results: Optional[List[Dict]]) -> Dict[str, Dict]:
+        """
+        Indexe les résultats d'une analyse précédente par fichier.
+        Ils ne sont réutilisables que s'ils comptent (au moins) les mêmes mots-clés.
+        """
+        reusable = {}
+        for entry in previous_results or []:
+            found = entry.get('found_keywords')
+            if not isinstance(found, dict) or not set(self.keywords_original) <= set(found):
+                continue
+            if entry.get('size') is None or entry.get('mtime') is None:
+                continue
+            if entry.get('matching') != self.matching_version:
+                continue
+            reusable[entry['filename']] = entry
+        return reusable
+
+    def _iter_scored_cvs(self, pdf_files: Iterable[DiscoveredFile],
+                         previous: Dict[str, Dict]) -> Iterator[Tuple[int, ScoredCV]]:
+        """
+        Produit (position du fichier, résultat) pour chaque CV contenant du texte.
+        Les fichiers sont consommés au fur et à mesure (ils peuvent encore arriver).
+        Les fichiers inchangés depuis l'analyse précédente ne sont pas relus, ceux
+        en quarantaine sont ignorés. Un fichier identique (même empreinte) à un fichier
+        déjà vu n'est pas analysé: il reprend le résultat de ce dernier, produit à la fin.
+        Avec un filtre, les CVs qui n'y répondent pas sont écartés avant tout comptage:
+        sur le texte en cache ou l'index, sinon dans le worker juste après l'extraction.
+        L'extraction se fait dans les workers du pool (confinée) sauf si
+        SANDBOX_EXTRACTION est désactivé.
+        """
+        cache = get_text_cache()
+        # Résultats repris de l'analyse précédente et fichiers soumis, dans l'ordre de soumission
+        reused = deque()
+        submitted = deque()
+        # Premier fichier vu pour chaque empreinte, copies à produire à la fin
+        first_by_hash: Dict[str, str] = {}
+        exact_duplicates = []
+        counts_by_hash: Dict[str, Dict[str, int]] = {}
+        # Empreintes écartées par le filtre (leurs copies le sont aussi)
+        excluded_hashes = set()
+
+        def exclude(name: str, content_hash: str) -> None:
+            excluded_hashes.add(content_hash)
+            self.excluded.append(name)
+            # Empreinte gardée: le fichier reste connu de l'index du dossier
+            self.manifest[name]['content_hash'] = content_hash
+
+        def pending_tasks():
+            for index, pdf_file in enumerate(pdf_files):
+                name = pdf_file.relative_path
+                # Taille et date lues pendant la découverte (pas de stat supplémentaire)
+                self.manifest[name] = {'size': pdf_file.size, 'mtime': pdf_file.mtime,
+                                       'matching': self.matching_version}
+                entry = previous.get(name)
+                unchanged = bool(entry) and entry['size'] == pdf_file.size and entry['mtime'] == pdf_file.mtime
+                if unchanged and self.query is not None:
+                    # Filtre évalué sur le texte connu du CV; s'il est inconnu, le fichier est relu
+                    decision = self._query_decision(entry.get('content_hash'))
+                    if decision is False:
+                        first_by_hash.setdefault(entry['content_hash'], name)
+                        exclude(name, entry['content_hash'])
+                        continue
+                    unchanged = bool(decision)
+                if unchanged:
+                    # Fichier inchangé: comptes repris, score recalculé avec les poids actuels
+                    found_keywords = {k: entry['found_keywords'][k] for k in self.keywords_original}
+                    if entry.get('content_hash'):
+                        first_by_hash.setdefault(entry['content_hash'], name)
+                        counts_by_hash.setdefault(entry['content_hash'], found_keywords)
+                    reused.append((index, ScoredCV(
+                        filename=name,
+                        score=self.calculate_score(found_keywords),
+                        found_keywords=found_keywords,
+                        content_hash=entry.get('content_hash')
+                    )))
+                    continue
+                try:
+                    content_hash = file_content_hash(pdf_file.path)
+                except OSError as e:
+                    self._record_failure(name, 'error', str(e))
+                    continue
+                quarantined = cache.get_quarantine(content_hash)
+                if quarantined:
+                    self._record_failure(name, quarantined['reason'],
+                                         f"En quarantaine: {quarantined['error']}", content_hash)
+                    continue
+                original = first_by_hash.get(content_hash)
+                if original is not None:
+                    exact_duplicates.append((index, name, content_hash, original))
+                    continue
+                first_by_hash[content_hash] = name
+                if self._query_decision(content_hash) is False:
+                    exclude(name, content_hash)
+                    continue
+                submitted.append((index, pdf_file, content_hash))
+                yield str(pdf_file.path), keywords, self.page_threshold, content_hash, name, self.query
+
+        keywords = tuple(self.keywords_original.items())
+        first_new_failure = len(self.failed_conversions)
+        if SANDBOX_EXTRACTION or self.workers > 1:
+            outcomes = imap_ordered(_analyze_cv_task, pending_tasks(), self.workers,
+                                    timeout=watchdog_timeout(), on_failure=_analyze_cv_failed,
+                                    memory_limit_mb=watchdog_memory_mb())
+        else:
+            # Sans pool: chaque CV est analysé dans ce processus
+            outcomes = ((None, [], True, False) for _ in pending_tasks())
+
+        for scored, failures, analyze_here, excluded in outcomes:
+            while reused:
+                yield reused.popleft()
+            index, pdf_file, content_hash = submitted.popleft()
+            if analyze_here:
+                # Document long (pages réparties entre les workers depuis ici) ou mode sans pool
+                already_excluded = len(self.excluded)
+                scored = self.analyze_cv_file(pdf_file.path, content_hash, pdf_file.relative_path)
+                if len(self.excluded) > already_excluded:
+                    del self.excluded[already_excluded:]
+                    excluded = True
+            if excluded:
+                exclude(pdf_file.relative_path, content_hash)
                 continue
-            keyword_counts = self.count_keywords(text)
-            score = self.calculate_score(keyword_counts)
+            self.failed_conversions.extend(failures)
+            if scored is not None:
+                counts_by_hash[content_hash] = scored.found_keywords
+                yield index, scored
+        while reused:
+            yield reused.popleft()
+
+        self._quarantine_failures(self.failed_conversions[first_new_failure:])
+
+        # Copies exactes: résultat (ou échec) du premier fichier identique
+        failures_by_hash = {failure['content_hash']: failure for failure in self.failed_conversions
+                            if failure.get('content_hash')}
+        for index, name, content_hash, original in exact_duplicates:
+            if content_hash in excluded_hashes:
+                exclude(name, content_hash)
+                continue
+            found_keywords = counts_by_hash.get(content_hash)
+            if found_keywords is None:
+                failure = failures_by_hash.get(content_hash)
+                reason = failure['reason'] if failure else 'error'
+                self._record_failure(name, reason, f"Doublon de {original}: "
+                                     f"{failure['error'] if failure else failure_message(reason)}",
+                                     content_hash)
+                continue
+            yield index, ScoredCV(
+                filename=name,
+                score=self.calculate_score(found_keywords),
+                found_keywords=dict(found_keywords),
+                content_hash=content_hash,
+                duplicate_of=original
+            )
+
+    def analyze_cvs(self, previous_results: Optional[List[Dict]] = None,
+                    top_k: Optional[int] = None,
+                    pdf_files: Optional[Iterable[DiscoveredFile]] = None) -> List[ScoredCV]:
+        """
+        Analyse tous les CVs du dossier et renvoie le classement.
+        Avec previous_results (résultats d'une analyse précédente du même dossier),
+        seuls les fichiers ajoutés ou modifiés sont extraits et scorés.
+        Avec top_k, seuls les k meilleurs CVs sont gardés en mémoire (tas); les autres
+        restent accessibles via self.count_matrix.
+        Avec pdf_files, les fichiers sont pris dans l'ordre où ils arrivent (envoi en cours)
+        au lieu d'être découverts dans le dossier.
+        """
+        if pdf_files is None:
+            # Ordre fixe des fichiers: les modes séquentiel et parallèle donnent le même résultat
+            pdf_files = sorted(self.discovery, key=lambda found: found.relative_path)
+            for found in self.discovery.too_large:
+                self._record_failure(found.relative_path, 'too-large',
+                                     f"Fichier trop volumineux ({found.size / (1024 * 1024):.1f} Mo)")
+        previous = self._reusable_results(previous_results)
+        results = self._rank(self._iter_scored_cvs(pdf_files, previous), top_k)
+        self._index_folder()
+        return results
+
+    def analyze_indexed(self, top_k: Optional[int] = None) -> List[ScoredCV]:
+        """
+        Classe les CVs d'un dossier déjà analysé à partir de l'index plein texte,
+        sans relire ni les PDF ni leur texte (voir cv_index). Mêmes résultats que
+        analyze_cvs, à la découpe en mots près (l'index compte des mots entiers).
+        Lève ValueError si le dossier n'a jamais été analysé (donc pas indexé).
+        """
+        index = get_cv_index()
+        files = index.folder_files(self.pdf_folder)
+        if not files:
+            raise ValueError(f"Dossier non indexé: {self.pdf_folder} (lancer d'abord une analyse)")
+        if self.query is not None:
+            # Filtre évalué sur l'index pour tout le dossier, avant tout comptage
+            kept = self.query.filter_indexed(index, [entry['content_hash'] for entry in files])
+            self.excluded = [entry['relative_path'] for entry in files if entry['content_hash'] not in kept]
+            files = [entry for entry in files if entry['content_hash'] in kept]
+
+        # Chaque mot-clé compte aussi ses synonymes de la taxonomie
+        taxonomy = get_taxonomy()
+        terms_by_keyword = {keyword: [keyword, *taxonomy.synonyms(keyword)] for keyword in self.keywords_original}
+        counts = index.term_counts([term for terms in terms_by_keyword.values() for term in terms],
+                                   [entry['content_hash'] for entry in files])
+
+        def scored_cvs():
+            first_by_hash: Dict[str, str] = {}
+            for position, entry in enumerate(files):
+                content_hash = entry['content_hash']
+                original = first_by_hash.setdefault(content_hash, entry['relative_path'])
+                found_keywords = {
+                    keyword: sum(counts[term].get(content_hash, 0) for term in terms)
+                    for keyword, terms in terms_by_keyword.items()
+                }
+                self.manifest[entry['relative_path']] = {
+                    'size': entry['size'],
+                    'mtime': entry['mtime'],
+                    'matching': f"index-{self.matching_version}",
+                }
+                yield position, ScoredCV(
+                    filename=entry['relative_path'],
+                    score=self.calculate_score(found_keywords),
+                    found_keywords=found_keywords,
+                    content_hash=content_hash,
+                    # Copie identique d'un fichier précédent du dossier
+                    duplicate_of=original if original != entry['relative_path'] else None
+                )
+
+        return self._rank(scored_cvs(), top_k)
+
+    def _query_decision(self, content_hash: Optional[str]) -> Optional[bool]:
+        """
+        Le CV répond-il au filtre, d'après son texte normalisé en cache ou l'index
+        (True sans filtre). None si son texte n'est connu nulle part: il faut l'extraire.
+        """
+        if self.query is None:
+            return True
+        if not content_hash:
+            return None
+        text = cached_normalized_text(content_hash)
+        if text is not None:
+            return self.query.matches_text(text)
+        cv_index = get_cv_index()
+        if not cv_index.enabled or cv_index.missing([content_hash]):
+            return None
+        return bool(self.query.filter_indexed(cv_index, [content_hash]))
 
-            results.append(ScoredCV(
-                filename=pdf_file.name,
-                score=score,
-                found_keywords=keyword_counts
+    def _rank(self, scored_cvs: Iterable[Tuple[int, ScoredCV]], top_k: Optional[int]) -> List[ScoredCV]:
+        """
+        Classe les CVs produits par (position, résultat) et remplit count_matrix, scores,
+        stats et duplicates. Avec top_k, seuls les k meilleurs sont gardés (tas).
+        En BM25, le score dépend de tout le corpus: le classement est fait à la fin, sur la matrice.
+        """
+        keywords = list(self.keywords_original)
+        bm25 = self.scoring == 'bm25'
+        heap_size = 0 if bm25 else top_k
+
+        # Lignes compactes pour tous les CVs, objets complets seulement pour le top k
+        rows = []
+        top = []
+        exact_duplicates = {}
+
+        for index, scored in scored_cvs:
+            rows.append((index, scored.filename, [scored.found_keywords[k] for k in keywords], scored.score))
+            self.manifest[scored.filename]['content_hash'] = scored.content_hash
+            if scored.duplicate_of:
+                exact_duplicates[scored.filename] = scored.duplicate_of
+
+            # Tas min sur (score, -position): la racine est le moins bon CV gardé
+            entry = (scored.score, -index, scored)
+            if heap_size is None or len(top) < heap_size:
+                heapq.heappush(top, entry)
+            elif top and entry[:2] > top[0][:2]:
+                heapq.heapreplace(top, entry)
+
+        # Lignes dans l'ordre des fichiers (les résultats arrivent dans le désordre)
+        rows.sort(key=lambda row: row[0])
+        filenames = [row[1] for row in rows]
+        duplicates = {**exact_duplicates, **self._near_duplicates(filenames)}
+        self.duplicates = {name: duplicates[name] for name in filenames if name in duplicates}
+        counts = np.array([row[2] for row in rows], dtype=np.int32).reshape(len(rows), len(keywords))
+        if bm25:
+            top = self._rank_bm25(filenames, counts, top_k)
+        else:
+            self.count_matrix = KeywordCountMatrix(filenames, keywords, counts)
+            self.scores = np.array([row[3] for row in rows], dtype=np.float64)
+        self.stats = {
+            'total': len(rows),
+            'average_score': float(self.scores.sum() / len(rows)) if rows else 0,
+            'best_score': float(self.scores.max()) if rows else 0,
+        }
+
+        # Score décroissant, puis ordre des fichiers en cas d'égalité
+        top.sort(key=lambda entry: entry[:2], reverse=True)
+        for _, _, scored in top:
+            scored.duplicate_of = self.duplicates.get(scored.filename)
+        return [scored for _, _, scored in top]
+
+    def _rank_bm25(self, filenames: List[str], counts: np.ndarray,
+                   top_k: Optional[int]) -> List[Tuple[float, int, ScoredCV]]:
+        """
+        Scores BM25 de tous les CVs en une opération vectorisée. Les longueurs des CVs et les
+        statistiques de l'archive viennent de l'index plein texte (tenues à jour à l'indexation).
+        Renvoie les k meilleurs au format du tas de _rank.
+        """
+        hashes = [self.manifest[name].get('content_hash') for name in filenames]
+        self._index_missing(h for h in hashes if h)
+        known = get_cv_index().document_lengths(h for h in hashes if h)
+        lengths = np.array([known.get(h, 0) for h in hashes], dtype=np.int64)
+        self.count_matrix = KeywordCountMatrix(filenames, list(self.keywords_original), counts,
+                                               scoring='bm25', lengths=lengths,
+                                               corpus=bm25_corpus_statistics(self.keywords_original))
+        self.scores = self.count_matrix.rescore(self.keywords_original)
+        # Entrées de manifeste: le re-score depuis les résultats sauvegardés reste en BM25
+        for name, length in zip(filenames, lengths.tolist()):
+            self.manifest[name].update({'scoring': 'bm25', 'length': length})
+
+        order = np.argsort(-self.scores, kind='stable')
+        if top_k is not None:
+            order = order[:top_k]
+        return [
+            (float(self.scores[row]), -row, ScoredCV(
+                filename=filenames[row],
+                score=float(self.scores[row]),
+                found_keywords=dict(zip(self.count_matrix.keywords, counts[row].tolist())),
+                content_hash=hashes[row]
             ))
+            for row in order.tolist()
+        ]
+
+    def _index_folder(self) -> None:
+        """
+        Enregistre les fichiers du dossier dans l'index plein texte. Les CVs repris d'une
+        analyse précédente sans être relus y sont ajoutés depuis le texte en cache.
+        """
+        index = get_cv_index()
+        if not index.enabled:
+            return
+        files = [(name, entry['content_hash'], entry.get('size'), entry.get('mtime'))
+                 for name, entry in self.manifest.items() if entry.get('content_hash')]
+        self._index_missing(content_hash for _, content_hash, _, _ in files)
+        index.set_folder_files(self.pdf_folder, files)
 
-        return sorted(results, key=lambda x: x.score, reverse=True)
+    def _index_missing(self, content_hashes: Iterable[str]) -> None:
+        """Indexe, depuis le texte en cache, les CVs absents de l'index (repris sans être relus)"""
+        index = get_cv_index()
+        for content_hash in index.missing(content_hashes):
+            text = cached_normalized_text(content_hash)
+            if text and text.strip():
+                index.add(content_hash, text)
+
+    def _near_duplicates(self, filenames: List[str]) -> Dict[str, str]:
+        """
+        Regroupe les CVs quasi-identiques (signatures MinHash du texte nettoyé).
+        Le représentant d'un groupe est son premier CV dans l'ordre des fichiers.
+        """
+        hashes = [self.manifest[name].get('content_hash') for name in filenames]
+        cache = get_text_cache()
+        stored = cache.get_signatures([h for h in hashes if h], MINHASH_VERSION)
+
+        signatures = []
+        for name, content_hash in zip(filenames, hashes):
+            if not content_hash:
+                continue
+            if content_hash not in stored:
+                # Texte mis en cache avant le calcul des signatures
+                text = cache.get_cleaned(content_hash, EXTRACTOR_VERSION, CLEANING_VERSION)
+                signature = store_signature(content_hash, text) if text else None
+                if signature is None:
+                    continue
+                stored[content_hash] = signature_to_bytes(signature)
+            signatures.append((name, signature_from_bytes(stored[content_hash])))
+        return near_duplicate_clusters(signatures)
+
+    def results_to_dicts(self, results: Optional[List[ScoredCV]] = None,
+                         weights: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """
+        Sérialise les résultats avec leur entrée de manifeste (pour Analysis.results).
+        Sans argument, sérialise tous les CVs de la dernière analyse, dans l'ordre du classement.
+        Avec weights (sous-ensemble des mots-clés analysés, par exemple une offre parmi
+        plusieurs), les CVs sont re-scorés et classés avec ces seuls mots-clés.
+        """
+        if results is not None:
+            return [{**asdict(cv), **self.manifest.get(cv.filename, {})} for cv in results]
+
+        matrix = self.count_matrix
+        scores = self.scores
+        if weights is not None:
+            matrix = matrix.select(list(weights))
+            scores = matrix.rescore(weights)
+        order = np.argsort(-scores, kind='stable')
+        return [
+            {
+                'filename': matrix.filenames[row],
+                'score': float(scores[row]),
+                'found_keywords': dict(zip(matrix.keywords, matrix.counts[row].tolist())),
+                'duplicate_of': self.duplicates.get(matrix.filenames[row]),
+                **self.manifest[matrix.filenames[row]]
+            }
+            for row in order.tolist()
+        ]
+
+    def failures_to_dicts(self) -> List[Dict]:
+        """Sérialise les conversions échouées (entrées 'success': False de Analysis.results)"""
+        return [
+            {
+                'filename': failure['file'],
+                'success': False,
+                'error': failure['error'],
+                'reason': failure.get('reason', 'error'),
+                'content_hash': failure.get('content_hash')
+            }
+            for failure in self.failed_conversions
+        ]
 
     def calculate_average_score(self, results: List[ScoredCV]) -> float:
         """Calcule le score moyen"""
@@ -108,62 +670,228 @@ class CVAnalyzer:
             return 0
         return max(cv.score for cv in results)
 
-    def generate_markdown_report(self, results: List[ScoredCV]) -> str:
-        """Génère un rapport détaillé au format Markdown"""
-        now = datetime.now()
+    def restore_results(self, result_dicts: List[Dict]) -> List[ScoredCV]:
+        """
+        Reconstruit le classement d'une analyse à partir de ses résultats sauvegardés
+        (Analysis.results), sans relire aucun PDF.
+        """
+        results = [
+            ScoredCV(
+                filename=entry['filename'],
+                score=entry['score'],
+                found_keywords=entry['found_keywords'],
+                content_hash=entry.get('content_hash'),
+                duplicate_of=entry.get('duplicate_of')
+            )
+            for entry in result_dicts
+            if 'found_keywords' in entry
+        ]
+        self.duplicates = {cv.filename: cv.duplicate_of for cv in results if cv.duplicate_of}
+        if any(entry.get('scoring') == 'bm25' for entry in result_dicts):
+            # Matrice reconstruite pour le détail des points BM25 du rapport
+            self.scoring = 'bm25'
+            self.count_matrix = KeywordCountMatrix.from_results(
+                [entry for entry in result_dicts if 'found_keywords' in entry], list(self.keywords_original),
+                corpus=bm25_corpus_statistics(self.keywords_original)
+            )
+        self.failed_conversions = [
+            {
+                'file': entry['filename'],
+                'error': entry.get('error', ''),
+                'reason': entry.get('reason', 'error'),
+                'content_hash': entry.get('content_hash')
+            }
+            for entry in result_dicts
+            if entry.get('success') is False
+        ]
+        self.stats = {
+            'total': len(results),
+            'average_score': self.calculate_average_score(results),
+            'best_score': self.calculate_best_score(results),
+        }
+        return results
+
+    def generate_markdown_report(self, results: List[ScoredCV], top_n: Optional[int] = None,
+                                 sections: Optional[List[str]] = None,
+                                 generated_at: Optional[datetime] = None) -> str:
+        """
+        Génère un rapport détaillé au format Markdown.
+        Si results ne contient que le top k, le résumé porte sur tous les CVs analysés.
+        top_n limite le tableau détaillé, sections choisit les parties (REPORT_SECTIONS).
+        """
+        now = generated_at or datetime.now()
+        stats = self.stats or {
+            'total': len(results),
+            'average_score': self.calculate_average_score(results),
+            'best_score': self.calculate_best_score(results),
+        }
+        sections = set(sections or REPORT_SECTIONS)
+        if top_n is not None:
+            results = results[:top_n]
 
         # En-tête du rapport
         report = [
             "# 📊 Rapport d'Analyse des CV",
             "",
             f"Généré le {now.strftime('%d %B %Y à %H:%M')}",
-            "",
-            "## 📋 Résumé",
-            f"- 📁 Nombre total de CV analysés: **{len(results)}**",
-            f"- ⭐ Score moyen: **{self.calculate_average_score(results):.1f}%**",
-            f"- 🏆 Meilleur score: **{self.calculate_best_score(results):.1f}%**",
-            "",
-            "## 🎯 Critères d'évaluation",
-            "| Compétence | Pondération |",
-            "|------------|-------------|",
         ]
 
-        # Ajouter les critères d'évaluation (sans multiplier par 100)
-        for keyword, weight in self.keywords_original.items():
-            # weight est déjà en pourcentage (100 = 100%), donc affiche tel quel
-            report.append(f"| {keyword} | {weight}% |")
+        if 'summary' in sections:
+            report += [
+                "",
+                "## 📋 Résumé",
+                f"- 📁 Nombre total de CV analysés: **{stats['total']}**",
+                f"- ⭐ Score moyen: **{stats['average_score']:.1f}%**",
+                f"- 🏆 Meilleur score: **{stats['best_score']:.1f}%**",
+            ]
+            if self.scoring == 'bm25':
+                report.append("- 📐 Score: **BM25** (occurrences, rareté de la compétence, longueur du CV)")
+            if self.duplicates:
+                report.append(f"- 🔁 Doublons détectés: **{len(self.duplicates)}**")
+
+        if 'criteria' in sections:
+            report += [
+                "",
+                "## 🎯 Critères d'évaluation",
+                "| Compétence | Pondération |",
+                "|------------|-------------|",
+            ]
+
+            # Ajouter les critères d'évaluation (sans multiplier par 100)
+            for keyword, weight in self.keywords_original.items():
+                # weight est déjà en pourcentage (100 = 100%), donc affiche tel quel
+                report.append(f"| {keyword} | {weight}% |")
+
+        if 'top3' in sections:
+            report.append("")
+            report.append("## 🏅 Top 3 des Candidats")
+
+            # Top 3
+            top_3 = results[:3] if len(results) >= 3 else results
+
+            # En BM25, les points d'un mot-clé dépendent de ses occurrences et de sa rareté
+            matrix = self.count_matrix if self.scoring == 'bm25' else None
+            if matrix is not None:
+                matrix_points = matrix.points(self.keywords_original)
+                matrix_rows = {filename: row for row, filename in enumerate(matrix.filenames)}
+                matrix_columns = {keyword: column for column, keyword in enumerate(matrix.keywords)}
 
-        report.append("")
-        report.append("## 🏅 Top 3 des Candidats")
+            for cv in top_3:
+                report.append(f"\n### 🏆 {cv.filename} ({cv.score:.1f}%)")
+                report.append("| Compétence | Occurrences | Points |")
+                report.append("|------------|-------------|---------|")
 
-        # Top 3
-        top_3 = results[:3] if len(results) >= 3 else results
+                for keyword, count in cv.found_keywords.items():
+                    weight = self.keywords_original.get(keyword, 0)
+                    if matrix is not None and cv.filename in matrix_rows and keyword in matrix_columns:
+                        points = matrix_points[matrix_rows[cv.filename], matrix_columns[keyword]]
+                        report.append(f"| {keyword} | {count} | {points:.1f}% |")
+                        continue
+                    # Points = le poids du keyword s'il est trouvé (déjà en %)
+                    points = weight if count > 0 else 0
+                    report.append(f"| {keyword} | {count} | {points}% |")
 
-        for cv in top_3:
-            report.append(f"\n### 🏆 {cv.filename} ({cv.score:.1f}%)")
-            report.append("| Compétence | Occurrences | Points |")
-            report.append("|------------|-------------|---------|")
+        if 'details' in sections:
+            # Résultats détaillés
+            report.append("")
+            report.append("## 📋 Résultats Détaillés")
+            if stats['total'] > len(results):
+                report.append(f"_{len(results)} meilleurs CVs sur {stats['total']}, "
+                              "la suite du classement est disponible page par page._")
+                report.append("")
+            report.append("| Position | Candidat | Score | Compétences Clés |")
+            report.append("|----------|----------|-------|------------------|")
 
-            for keyword, count in cv.found_keywords.items():
-                weight = self.keywords_original.get(keyword, 0)
-                # Points = le poids du keyword s'il est trouvé (déjà en %)
-                points = weight if count > 0 else 0
-                report.append(f"| {keyword} | {count} | {points}% |")
+            for idx, cv in enumerate(results, 1):
+                # Construire la liste des compétences avec occurrences
+                competences = []
+                for keyword, count in cv.found_keywords.items():
+                    if count > 0:
+                        competences.append(f"{keyword} ({count})")
 
-        # Résultats détaillés
-        report.append("")
-        report.append("## 📋 Résultats Détaillés")
-        report.append("| Position | Candidat | Score | Compétences Clés |")
-        report.append("|----------|----------|-------|------------------|")
+                competences_str = ", ".join(competences) if competences else "Aucune"
+                report.append(f"| {idx} | {cv.filename} | {cv.score:.1f}% | {competences_str} |")
 
-        for idx, cv in enumerate(results, 1):
-            # Construire la liste des compétences avec occurrences
-            competences = []
-            for keyword, count in cv.found_keywords.items():
-                if count > 0:
-                    competences.append(f"{keyword} ({count})")
+        if 'duplicates' in sections and self.duplicates:
+            report.append("")
+            report.append(f"## 🔁 Doublons ({len(self.duplicates)} CVs)")
+            report.append("_CVs identiques ou quasi-identiques à un autre CV du dossier._")
+            report.append("")
+            report.append("| Candidat | Doublon de |")
+            report.append("|----------|------------|")
+            for filename, original in self.duplicates.items():
+                report.append(f"| {filename} | {original} |")
 
-            competences_str = ", ".join(competences) if competences else "Aucune"
-            report.append(f"| {idx} | {cv.filename} | {cv.score:.1f}% | {competences_str} |")
+        if 'errors' in sections and self.failed_conversions:
+            report.append("")
+            report.append(f"## ⚠️ Conversions échouées ({len(self.failed_conversions)} fichiers)")
+            report.append("| Fichier | Cause | Détail |")
+            report.append("|---------|-------|--------|")
+            for failure in self.failed_conversions:
+                label = FAILURE_LABELS.get(failure.get('reason'), FAILURE_LABELS['error'])
+                report.append(f"| {failure['file']} | {label} | {failure['error']} |")
 
         return "\n".join(report)
+
+
+def cached_normalized_text(content_hash: str) -> Optional[str]:
+    """Texte normalisé d'un CV depuis le cache de texte (None s'il n'y est pas)"""
+    cache = get_text_cache()
+    text = cache.get_normalized(content_hash, EXTRACTOR_VERSION, CLEANING_VERSION, NORMALIZATION_VERSION)
+    if text is None:
+        cleaned = cache.get_cleaned(content_hash, EXTRACTOR_VERSION, CLEANING_VERSION)
+        text = normalize_text(cleaned) if cleaned is not None else None
+    return text
+
+
+def store_signature(content_hash: str, text: str) -> Optional[np.ndarray]:
+    """Calcule et met en cache la signature MinHash d'un texte nettoyé (None si vide)"""
+    signature = minhash_signature(text)
+    if signature is not None:
+        get_text_cache().put_signature(content_hash, MINHASH_VERSION, signature_to_bytes(signature))
+    return signature
+
+
+@lru_cache(maxsize=8)
+def _worker_analyzer(keywords: Tuple[Tuple[str, float], ...]) -> CVAnalyzer:
+    """Analyseur mis en cache dans chaque worker (automate construit une fois par jeu de mots-clés)"""
+    return CVAnalyzer('.', dict(keywords))
+
+
+def _analyze_cv_task(task: Tuple[str, Tuple[Tuple[str, float], ...], int, Optional[str], str, Optional[CVQuery]]
+                     ) -> Tuple[Optional[ScoredCV], List[Dict], bool, bool]:
+    """
+    Tâche exécutée dans le pool: analyse un CV (extraction confinée) et renvoie ses éventuelles erreurs.
+    Le troisième élément indique un document trop long, à découper par le processus parent,
+    le dernier un CV écarté par le filtre (non compté).
+    """
+    pdf_path, keywords, page_threshold, content_hash, name, query = task
+    analyzer = _worker_analyzer(keywords)
+    analyzer.page_threshold = page_threshold
+    analyzer.query = query
+    analyzer.failed_conversions = []
+    analyzer.excluded = []
+    try:
+        # Extraction confinée dans extract_pages (la minuterie ne couvre pas les écritures du cache)
+        scored = analyzer.analyze_cv_file(Path(pdf_path), content_hash, name)
+    except PageSplitRequired:
+        return None, [], True, False
+    except MemoryError as e:
+        # Plafond mémoire atteint hors de l'extraction proprement dite
+        reason = failure_reason(e)
+        analyzer._record_failure(name, reason, failure_message(reason), content_hash)
+        return None, analyzer.failed_conversions, False, False
+    return scored, analyzer.failed_conversions, False, bool(analyzer.excluded)
+
+
+def _analyze_cv_failed(task: Tuple[str, Tuple[Tuple[str, float], ...], int, Optional[str], str, Optional[CVQuery]],
+                       reason: str) -> Tuple[Optional[ScoredCV], List[Dict], bool, bool]:
+    """Résultat d'une tâche dont le worker a été tué (bloqué) ou est mort"""
+    _, _, _, content_hash, name, _ = task
+    failure = {
+        'file': name,
+        'error': failure_message(reason),
+        'reason': reason,
+        'content_hash': content_hash
+    }
+    return None, [failure], False, False
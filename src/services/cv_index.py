@@ -0,0 +1,472 @@
+"""
+Index plein texte des CVs extraits (SQLite FTS5), a cote de cv_analyzer.db.
+Chaque document est indexe une fois par empreinte de contenu, au moment ou son texte
+normalise est produit (voir CVAnalyzer._extract_text_with_hash); la table des fichiers
+garde, pour chaque dossier analyse, le fichier correspondant a chaque empreinte.
+Les occurrences par terme sont lues dans l'index (table fts5vocab): rechercher ou
+scorer un dossier deja analyse ne relit ni les PDF ni leur texte.
+Le nombre de documents contenant chaque mot est tenu a jour a l'indexation d'un
+nouveau contenu (table term_frequencies), comme le nombre de documents et leur
+longueur totale (table corpus_totals): la frequence documentaire d'un terme et la
+longueur moyenne des CVs de toute l'archive se lisent sans parcourir l'index.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from ..database.database import data_dir
+from .text_normalization import NORMALIZATION_VERSION, normalize_text
+
+
+CV_INDEX_PATH = data_dir / "cv_index.db"
+
+# Index desactivable (il garde une copie du texte normalise de chaque CV)
+CV_INDEX_ENABLED = os.environ.get("CV_INDEX_ENABLED", "1") != "0"
+
+# Le texte est deja normalise (sans accents, casefold): le tokenizer ne fait que decouper.
+# '+' et '#' font partie des mots ("c++", "c#").
+_FTS_TOKENIZER = "unicode61 remove_diacritics 0 tokenchars '+#'"
+_TOKEN = re.compile(r"(?:[^\W_]|[+#])+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Decoupe un texte (ou un mot-cle) en termes de l'index, comme le tokenizer FTS5"""
+    return split_words(normalize_text(text))
+
+
+def split_words(normalized_text: str) -> List[str]:
+    """Decoupe un texte deja normalise en termes de l'index"""
+    return _TOKEN.findall(normalized_text)
+
+
+def folder_key(folder: Union[str, Path]) -> str:
+    """Identifiant d'un dossier dans la table des fichiers"""
+    return str(Path(folder))
+
+
+class CVIndex:
+    """Index FTS5 du texte normalise des CVs et fichiers de chaque dossier analyse"""
+
+    def __init__(self, path: Union[str, Path] = CV_INDEX_PATH, enabled: bool = CV_INDEX_ENABLED):
+        self.path = Path(path)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Ouvre la base a la premiere utilisation (une connexion par processus, jamais heritee d'un fork)"""
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY,
+                    content_hash TEXT NOT NULL UNIQUE,
+                    normalization_version TEXT NOT NULL,
+                    indexed_at REAL NOT NULL,
+                    length INTEGER
+                )
+            """)
+            # Colonne ajoutee apres la creation de la table (bases existantes)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+            if 'length' not in columns:
+                conn.execute("ALTER TABLE documents ADD COLUMN length INTEGER")
+            if 'term_counted' not in columns:
+                conn.execute("ALTER TABLE documents ADD COLUMN term_counted INTEGER NOT NULL DEFAULT 0")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS term_frequencies (
+                    normalization_version TEXT NOT NULL,
+                    term TEXT NOT NULL,
+                    documents INTEGER NOT NULL,
+                    PRIMARY KEY (normalization_version, term)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS corpus_totals (
+                    normalization_version TEXT PRIMARY KEY,
+                    documents INTEGER NOT NULL,
+                    total_length INTEGER NOT NULL
+                )
+            """)
+            # Compteurs d'une normalisation plus ancienne: jamais relus
+            conn.execute("DELETE FROM term_frequencies WHERE normalization_version != ?", (NORMALIZATION_VERSION,))
+            conn.execute("DELETE FROM corpus_totals WHERE normalization_version != ?", (NORMALIZATION_VERSION,))
+            conn.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS cv_fts USING fts5(body, tokenize="{_FTS_TOKENIZER}")
+            """)
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS cv_fts_vocab USING fts5vocab(cv_fts, instance)")
+            if conn.execute("SELECT 1 FROM corpus_totals WHERE normalization_version = ?",
+                            (NORMALIZATION_VERSION,)).fetchone() is None:
+                # Bases existantes: longueurs manquantes relues dans l'index, puis totaux initialises une fois
+                rows = conn.execute(
+                    """SELECT d.id, f.body FROM documents d JOIN cv_fts f ON f.rowid = d.id
+                       WHERE d.normalization_version = ? AND d.term_counted = 1 AND d.length IS NULL""",
+                    (NORMALIZATION_VERSION,)
+                ).fetchall()
+                conn.executemany("UPDATE documents SET length = ? WHERE id = ?",
+                                 [(len(split_words(body)), document_id) for document_id, body in rows])
+                conn.execute(
+                    """INSERT OR IGNORE INTO corpus_totals (normalization_version, documents, total_length)
+                       SELECT ?, count(*), coalesce(sum(length), 0) FROM documents
+                       WHERE normalization_version = ? AND term_counted = 1""",
+                    (NORMALIZATION_VERSION, NORMALIZATION_VERSION)
+                )
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    folder TEXT NOT NULL,
+                    relative_path TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    size INTEGER,
+                    mtime REAL,
+                    PRIMARY KEY (folder, relative_path)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_hash ON files (content_hash)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def add(self, content_hash: str, normalized_text: str) -> None:
+        """Indexe le texte normalise d'un document (sans effet s'il est deja indexe)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT id, normalization_version, length, term_counted FROM documents WHERE content_hash = ?",
+                (content_hash,)
+            ).fetchone()
+            if row is not None and row[1] == NORMALIZATION_VERSION and row[2] is not None and row[3]:
+                return
+            # Longueur en mots (normalisation BM25 par la longueur du document)
+            words = split_words(normalized_text)
+            length = len(words)
+            if row is not None and row[1] == NORMALIZATION_VERSION:
+                # Indexe avant le calcul des longueurs ou des frequences documentaires
+                if not row[3]:
+                    self._count_terms(conn, words)
+                else:
+                    self._add_to_totals(conn, 0, length)
+                conn.execute("UPDATE documents SET length = ?, term_counted = 1 WHERE id = ?", (length, row[0]))
+                conn.commit()
+                return
+            if row is not None:
+                # Normalisation plus ancienne: le document est reindexe
+                document_id = row[0]
+                conn.execute("DELETE FROM cv_fts WHERE rowid = ?", (document_id,))
+                conn.execute(
+                    """UPDATE documents SET normalization_version = ?, indexed_at = ?, length = ?, term_counted = 1
+                       WHERE id = ?""",
+                    (NORMALIZATION_VERSION, time.time(), length, document_id)
+                )
+            else:
+                cursor = conn.execute(
+                    """INSERT OR IGNORE INTO documents
+                       (content_hash, normalization_version, indexed_at, length, term_counted)
+                       VALUES (?, ?, ?, ?, 1)""",
+                    (content_hash, NORMALIZATION_VERSION, time.time(), length)
+                )
+                if cursor.rowcount == 0:
+                    # Indexe entre-temps par un autre processus
+                    conn.commit()
+                    return
+                document_id = cursor.lastrowid
+            conn.execute("INSERT INTO cv_fts (rowid, body) VALUES (?, ?)", (document_id, normalized_text))
+            self._count_terms(conn, words)
+            conn.commit()
+
+    def _count_indexed_terms(self, conn: sqlite3.Connection) -> None:
+        """Compte les documents indexes avant les compteurs (texte relu dans l'index, une seule fois)"""
+        while True:
+            rows = conn.execute(
+                """SELECT d.id, f.body FROM documents d JOIN cv_fts f ON f.rowid = d.id
+                   WHERE d.normalization_version = ? AND d.term_counted = 0 LIMIT 500""",
+                (NORMALIZATION_VERSION,)
+            ).fetchall()
+            if not rows:
+                return
+            lengths = []
+            for document_id, body in rows:
+                words = split_words(body)
+                self._count_terms(conn, words)
+                lengths.append((len(words), document_id))
+            conn.executemany("UPDATE documents SET term_counted = 1, length = ? WHERE id = ?", lengths)
+            conn.commit()
+
+    @classmethod
+    def _count_terms(cls, conn: sqlite3.Connection, words: List[str]) -> None:
+        """Compte un document de plus pour chacun de ses mots (dans la transaction de l'indexation)"""
+        conn.executemany(
+            """INSERT INTO term_frequencies (normalization_version, term, documents) VALUES (?, ?, 1)
+               ON CONFLICT (normalization_version, term) DO UPDATE SET documents = documents + 1""",
+            ((NORMALIZATION_VERSION, word) for word in set(words))
+        )
+        cls._add_to_totals(conn, 1, len(words))
+
+    @staticmethod
+    def _add_to_totals(conn: sqlite3.Connection, documents: int, length: int) -> None:
+        """Ajoute des documents et des mots aux totaux de l'archive (dans la meme transaction)"""
+        conn.execute(
+            """INSERT INTO corpus_totals (normalization_version, documents, total_length) VALUES (?, ?, ?)
+               ON CONFLICT (normalization_version) DO UPDATE
+               SET documents = documents + excluded.documents, total_length = total_length + excluded.total_length""",
+            (NORMALIZATION_VERSION, documents, length)
+        )
+
+    def missing(self, content_hashes: Iterable[str]) -> List[str]:
+        """Empreintes pas encore indexees (ou indexees avec une normalisation plus ancienne ou sans longueur)"""
+        unique = list(dict.fromkeys(content_hashes))
+        if not self.enabled or not unique:
+            return []
+        with self._lock:
+            conn = self._connection()
+            current = set()
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                current.update(row[0] for row in conn.execute(
+                    f"""SELECT content_hash FROM documents
+                        WHERE normalization_version = ? AND length IS NOT NULL
+                        AND content_hash IN ({', '.join('?' * len(batch))})""",
+                    [NORMALIZATION_VERSION, *batch]
+                ))
+        return [content_hash for content_hash in unique if content_hash not in current]
+
+    def document_lengths(self, content_hashes: Iterable[str]) -> Dict[str, int]:
+        """Longueur en mots de chaque document indexe (les empreintes inconnues sont absentes)"""
+        lengths: Dict[str, int] = {}
+        unique = list(dict.fromkeys(content_hashes))
+        if not self.enabled or not unique:
+            return lengths
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                lengths.update(conn.execute(
+                    f"""SELECT content_hash, length FROM documents
+                        WHERE length IS NOT NULL AND content_hash IN ({', '.join('?' * len(batch))})""",
+                    batch
+                ).fetchall())
+        return lengths
+
+    def set_folder_files(self, folder: Union[str, Path],
+                         files: Iterable[Tuple[str, str, Optional[int], Optional[float]]]) -> None:
+        """Remplace les fichiers connus d'un dossier: (chemin relatif, empreinte, taille, date)"""
+        if not self.enabled:
+            return
+        key = folder_key(folder)
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM files WHERE folder = ?", (key,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO files (folder, relative_path, content_hash, size, mtime) VALUES (?, ?, ?, ?, ?)",
+                ((key, relative_path, content_hash, size, mtime)
+                 for relative_path, content_hash, size, mtime in files)
+            )
+            conn.commit()
+
+    def remove_folder(self, folder: Union[str, Path]) -> None:
+        """Oublie les fichiers d'un dossier (les documents restent indexes par empreinte)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM files WHERE folder = ?", (folder_key(folder),))
+            conn.commit()
+
+    def folder_files(self, folder: Union[str, Path]) -> List[Dict]:
+        """Fichiers indexes d'un dossier, par chemin relatif"""
+        if not self.enabled:
+            return []
+        with self._lock:
+            rows = self._connection().execute(
+                """SELECT f.relative_path, f.content_hash, f.size, f.mtime FROM files f
+                   JOIN documents d ON d.content_hash = f.content_hash
+                   WHERE f.folder = ? ORDER BY f.relative_path""",
+                (folder_key(folder),)
+            ).fetchall()
+        return [{'relative_path': row[0], 'content_hash': row[1], 'size': row[2], 'mtime': row[3]}
+                for row in rows]
+
+    def files_of(self, content_hashes: Iterable[str]) -> Dict[str, List[Dict]]:
+        """Fichiers (dossier, chemin relatif) de chaque empreinte"""
+        files: Dict[str, List[Dict]] = {}
+        unique = list(dict.fromkeys(content_hashes))
+        if not self.enabled or not unique:
+            return files
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                for content_hash, folder, relative_path in conn.execute(
+                    f"""SELECT content_hash, folder, relative_path FROM files
+                        WHERE content_hash IN ({', '.join('?' * len(batch))})
+                        ORDER BY folder, relative_path""",
+                    batch
+                ):
+                    files.setdefault(content_hash, []).append({'folder': folder, 'relative_path': relative_path})
+        return files
+
+    def term_counts(self, terms: Iterable[str],
+                    content_hashes: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, int]]:
+        """
+        Occurrences de chaque terme par document: {terme: {empreinte: nombre}}.
+        Un terme de plusieurs mots ("machine learning") est compte comme une suite de mots consecutifs.
+        content_hashes limite le resultat a ces documents.
+        """
+        terms = list(dict.fromkeys(terms))
+        if not self.enabled:
+            return {term: {} for term in terms}
+        with self._lock:
+            conn = self._connection()
+            # Identifiants des documents retenus (None = tous)
+            allowed = None
+            if content_hashes is not None:
+                allowed = set(self._document_ids(conn, content_hashes).values())
+
+            positions: Dict[str, List[Tuple[int, int]]] = {}
+
+            def token_positions(token: str) -> List[Tuple[int, int]]:
+                if token not in positions:
+                    rows = conn.execute(
+                        "SELECT doc, offset FROM cv_fts_vocab WHERE term = ?", (token,)
+                    ).fetchall()
+                    positions[token] = [row for row in rows if allowed is None or row[0] in allowed]
+                return positions[token]
+
+            counts_by_id: Dict[str, Counter] = {}
+            for term in terms:
+                tokens = tokenize(term)
+                if not tokens:
+                    counts_by_id[term] = Counter()
+                    continue
+                if len(tokens) == 1:
+                    counts = Counter({
+                        doc: count for doc, count in conn.execute(
+                            "SELECT doc, count(*) FROM cv_fts_vocab WHERE term = ? GROUP BY doc", (tokens[0],)
+                        )
+                        if allowed is None or doc in allowed
+                    })
+                else:
+                    # Suite de mots: chaque mot suivant doit etre a la position suivante
+                    following = [set(token_positions(token)) for token in tokens[1:]]
+                    counts = Counter(
+                        doc for doc, offset in token_positions(tokens[0])
+                        if all((doc, offset + shift) in found for shift, found in enumerate(following, 1))
+                    )
+                counts_by_id[term] = counts
+
+            document_ids = {doc for counts in counts_by_id.values() for doc in counts}
+            hashes = self._document_hashes(conn, document_ids)
+        return {
+            term: {hashes[doc]: count for doc, count in counts.items() if doc in hashes}
+            for term, counts in counts_by_id.items()
+        }
+
+    def document_frequencies(self, terms: Iterable[str]) -> Tuple[int, Dict[str, int]]:
+        """
+        Nombre de documents indexes et nombre de documents contenant chaque terme.
+        Un mot est lu dans les compteurs; un terme de plusieurs mots est compte comme
+        une suite de mots consecutifs dans l'index.
+        """
+        terms = list(dict.fromkeys(terms))
+        if not self.enabled:
+            return 0, {term: 0 for term in terms}
+        frequencies: Dict[str, int] = {}
+        phrases = []
+        with self._lock:
+            conn = self._connection()
+            self._count_indexed_terms(conn)
+            total = self._totals(conn)[0]
+            for term in terms:
+                tokens = tokenize(term)
+                if len(tokens) == 1:
+                    row = conn.execute(
+                        "SELECT documents FROM term_frequencies WHERE normalization_version = ? AND term = ?",
+                        (NORMALIZATION_VERSION, tokens[0])
+                    ).fetchone()
+                    frequencies[term] = row[0] if row else 0
+                elif tokens:
+                    phrases.append(term)
+                else:
+                    frequencies[term] = 0
+        for term, counts in self.term_counts(phrases).items():
+            frequencies[term] = len(counts)
+        return total, frequencies
+
+    def corpus_totals(self) -> Tuple[int, float]:
+        """Nombre de documents indexes et leur longueur moyenne en mots (compteurs de l'indexation)"""
+        if not self.enabled:
+            return 0, 0.0
+        with self._lock:
+            conn = self._connection()
+            self._count_indexed_terms(conn)
+            documents, total_length = self._totals(conn)
+        return documents, total_length / documents if documents else 0.0
+
+    @staticmethod
+    def _totals(conn: sqlite3.Connection) -> Tuple[int, int]:
+        row = conn.execute(
+            "SELECT documents, total_length FROM corpus_totals WHERE normalization_version = ?",
+            (NORMALIZATION_VERSION,)
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    def postings(self, tokens: Iterable[str], content_hashes: Iterable[str]) -> Dict[str, Dict[str, List[int]]]:
+        """Positions de chaque mot dans chaque document: {mot: {empreinte: [positions]}}"""
+        tokens = list(dict.fromkeys(tokens))
+        if not self.enabled:
+            return {token: {} for token in tokens}
+        with self._lock:
+            conn = self._connection()
+            ids = self._document_ids(conn, content_hashes)
+            hashes = {document_id: content_hash for content_hash, document_id in ids.items()}
+            postings: Dict[str, Dict[str, List[int]]] = {}
+            for token in tokens:
+                by_hash: Dict[str, List[int]] = {}
+                for doc, offset in conn.execute(
+                    "SELECT doc, offset FROM cv_fts_vocab WHERE term = ? ORDER BY doc, offset", (token,)
+                ):
+                    if doc in hashes:
+                        by_hash.setdefault(hashes[doc], []).append(offset)
+                postings[token] = by_hash
+        return postings
+
+    def _document_ids(self, conn: sqlite3.Connection, content_hashes: Iterable[str]) -> Dict[str, int]:
+        ids = {}
+        unique = list(dict.fromkeys(content_hashes))
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            ids.update(conn.execute(
+                f"SELECT content_hash, id FROM documents WHERE content_hash IN ({', '.join('?' * len(batch))})",
+                batch
+            ).fetchall())
+        return ids
+
+    def _document_hashes(self, conn: sqlite3.Connection, document_ids: Iterable[int]) -> Dict[int, str]:
+        hashes = {}
+        unique = list(document_ids)
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            hashes.update(conn.execute(
+                f"SELECT id, content_hash FROM documents WHERE id IN ({', '.join('?' * len(batch))})",
+                batch
+            ).fetchall())
+        return hashes
+
+
+_cv_index: Optional[CVIndex] = None
+
+
+def get_cv_index() -> CVIndex:
+    """Retourne l'index partage du processus courant"""
+    global _cv_index
+    if _cv_index is None:
+        _cv_index = CVIndex()
+    return _cv_index
@@ -0,0 +1,278 @@
+"""
+Langage de filtrage des CVs: AND/OR/NOT, parentheses, phrases entre guillemets et proximite.
+    python AND (django OR fastapi) AND NOT "stage"
+    "machine learning" NEAR/5 python
+Les operateurs s'ecrivent en majuscules (ET/OU/SAUF sont acceptes); deux termes
+juxtaposes sont relies par AND. Les termes sont decoupes et normalises comme le
+texte indexe (voir cv_index.tokenize): "Node.js" est la phrase "node js".
+La requete est compilee une fois en un plan evalue sur les positions des termes
+dans chaque CV (texte normalise d'un CV, ou index plein texte pour tout un dossier).
+"""
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from .cv_index import CVIndex, split_words, tokenize
+
+# Distance maximale (en mots) de NEAR sans /n
+DEFAULT_NEAR_DISTANCE = 10
+
+_OPERATORS = {'AND': 'AND', 'ET': 'AND', 'OR': 'OR', 'OU': 'OR', 'NOT': 'NOT', 'SAUF': 'NOT'}
+_LEXEME = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|(NEAR(?:/(\d+))?)(?![^\s()"])|([^\s()"]+))')
+
+# Positions des mots de chaque terme: {mot: {document: [positions]}}
+Postings = Dict[str, Dict[str, List[int]]]
+
+
+class QuerySyntaxError(ValueError):
+    """Requete de filtrage mal formee"""
+
+
+class _Node:
+    def tokens(self) -> Set[str]:
+        raise NotImplementedError
+
+    def evaluate(self, postings: Postings, universe: FrozenSet[str]) -> Set[str]:
+        raise NotImplementedError
+
+    def cost(self, postings: Postings) -> int:
+        """Estimation du nombre de documents produits (ordre d'evaluation des AND)"""
+        return min((len(postings.get(token, ())) for token in self.tokens()), default=0)
+
+
+class _Term(_Node):
+    """Mot ou phrase (mots consecutifs)"""
+
+    def __init__(self, words: List[str]):
+        self.words = words
+
+    def tokens(self) -> Set[str]:
+        return set(self.words)
+
+    def positions(self, postings: Postings, document: str) -> List[int]:
+        """Positions de debut de la phrase dans un document"""
+        first = postings.get(self.words[0], {}).get(document, [])
+        if len(self.words) == 1:
+            return first
+        following = [set(postings.get(word, {}).get(document, ())) for word in self.words[1:]]
+        return [position for position in first
+                if all(position + shift in found for shift, found in enumerate(following, 1))]
+
+    def evaluate(self, postings: Postings, universe: FrozenSet[str]) -> Set[str]:
+        # Documents contenant tous les mots, puis verification des positions pour une phrase
+        candidates = set(postings.get(self.words[0], {})) & universe
+        for word in self.words[1:]:
+            candidates &= set(postings.get(word, {}))
+        if len(self.words) == 1:
+            return candidates
+        return {document for document in candidates if self.positions(postings, document)}
+
+
+class _Near(_Node):
+    """Deux termes separes d'au plus `distance` positions (1 = mots voisins), dans un sens ou dans l'autre"""
+
+    def __init__(self, left: _Term, right: _Term, distance: int):
+        self.left = left
+        self.right = right
+        self.distance = distance
+
+    def tokens(self) -> Set[str]:
+        return self.left.tokens() | self.right.tokens()
+
+    def evaluate(self, postings: Postings, universe: FrozenSet[str]) -> Set[str]:
+        matches = set()
+        for document in self.left.evaluate(postings, universe) & self.right.evaluate(postings, universe):
+            right_positions = self.right.positions(postings, document)
+            # Ecart mesure entre la fin d'un terme et le debut de l'autre
+            for start in self.left.positions(postings, document):
+                end = start + len(self.left.words) - 1
+                if any(start - (other + len(self.right.words) - 1) <= self.distance and
+                       other - end <= self.distance for other in right_positions):
+                    matches.add(document)
+                    break
+        return matches
+
+
+class _Not(_Node):
+    def __init__(self, child: _Node):
+        self.child = child
+
+    def tokens(self) -> Set[str]:
+        return self.child.tokens()
+
+    def cost(self, postings: Postings) -> int:
+        return 0
+
+    def evaluate(self, postings: Postings, universe: FrozenSet[str]) -> Set[str]:
+        return set(universe - self.child.evaluate(postings, universe))
+
+
+class _And(_Node):
+    def __init__(self, children: List[_Node]):
+        self.children = children
+
+    def tokens(self) -> Set[str]:
+        return set().union(*(child.tokens() for child in self.children))
+
+    def cost(self, postings: Postings) -> int:
+        return min(child.cost(postings) for child in self.children)
+
+    def evaluate(self, postings: Postings, universe: FrozenSet[str]) -> Set[str]:
+        # Termes positifs du plus rare au plus frequent (arret des que le resultat est vide),
+        # exclusions (NOT) appliquees ensuite sur le resultat
+        positives = sorted((child for child in self.children if not isinstance(child, _Not)),
+                           key=lambda child: child.cost(postings))
+        negatives = [child.child for child in self.children if isinstance(child, _Not)]
+        result = set(universe)
+        for child in positives:
+            result &= child.evaluate(postings, frozenset(result))
+            if not result:
+                return result
+        for child in negatives:
+            result -= child.evaluate(postings, frozenset(result))
+        return result
+
+
+class _Or(_Node):
+    def __init__(self, children: List[_Node]):
+        self.children = children
+
+    def tokens(self) -> Set[str]:
+        return set().union(*(child.tokens() for child in self.children))
+
+    def cost(self, postings: Postings) -> int:
+        return sum(child.cost(postings) for child in self.children)
+
+    def evaluate(self, postings: Postings, universe: FrozenSet[str]) -> Set[str]:
+        result = set()
+        for child in self.children:
+            result |= child.evaluate(postings, frozenset(universe - result))
+        return result
+
+
+class _Parser:
+    """Analyse descendante: OR < AND (explicite ou implicite) < NOT < NEAR < terme"""
+
+    def __init__(self, query: str):
+        self.lexemes = self._lex(query)
+        self.position = 0
+
+    @staticmethod
+    def _lex(query: str) -> List[Tuple[str, object]]:
+        lexemes = []
+        position = 0
+        query = query.rstrip()
+        while position < len(query):
+            match = _LEXEME.match(query, position)
+            if not match:
+                raise QuerySyntaxError(f"Guillemet non ferme a la position {position}")
+            position = match.end()
+            if match.group(1):
+                lexemes.append(('(', None))
+            elif match.group(2):
+                lexemes.append((')', None))
+            elif match.group(3) is not None:
+                lexemes.append(('TERM', match.group(3)))
+            elif match.group(4):
+                distance = int(match.group(5)) if match.group(5) else DEFAULT_NEAR_DISTANCE
+                lexemes.append(('NEAR', distance))
+            elif match.group(6) in _OPERATORS:
+                lexemes.append((_OPERATORS[match.group(6)], None))
+            else:
+                lexemes.append(('TERM', match.group(6)))
+        return lexemes
+
+    def _peek(self) -> Optional[str]:
+        return self.lexemes[self.position][0] if self.position < len(self.lexemes) else None
+
+    def _take(self) -> Tuple[str, object]:
+        lexeme = self.lexemes[self.position]
+        self.position += 1
+        return lexeme
+
+    def parse(self) -> _Node:
+        if not self.lexemes:
+            raise QuerySyntaxError("Requete vide")
+        node = self._or()
+        if self._peek() is not None:
+            raise QuerySyntaxError(f"Element inattendu: {self._peek()}")
+        return node
+
+    def _or(self) -> _Node:
+        children = [self._and()]
+        while self._peek() == 'OR':
+            self._take()
+            children.append(self._and())
+        return children[0] if len(children) == 1 else _Or(children)
+
+    def _and(self) -> _Node:
+        children = [self._not()]
+        while self._peek() in ('AND', 'NOT', 'TERM', '('):
+            if self._peek() == 'AND':
+                self._take()
+            children.append(self._not())
+        return children[0] if len(children) == 1 else _And(children)
+
+    def _not(self) -> _Node:
+        if self._peek() == 'NOT':
+            self._take()
+            return _Not(self._not())
+        return self._near()
+
+    def _near(self) -> _Node:
+        node = self._primary()
+        while self._peek() == 'NEAR':
+            _, distance = self._take()
+            right = self._primary()
+            if not isinstance(node, _Term) or not isinstance(right, _Term):
+                raise QuerySyntaxError("NEAR relie deux mots ou phrases")
+            node = _Near(node, right, distance)
+        return node
+
+    def _primary(self) -> _Node:
+        kind = self._peek()
+        if kind == '(':
+            self._take()
+            node = self._or()
+            if self._peek() != ')':
+                raise QuerySyntaxError("Parenthese non fermee")
+            self._take()
+            return node
+        if kind == 'TERM':
+            _, text = self._take()
+            words = tokenize(text)
+            if not words:
+                raise QuerySyntaxError(f"Terme sans mot: {text!r}")
+            return _Term(words)
+        raise QuerySyntaxError("Terme attendu" if kind is None else f"Terme attendu avant {kind}")
+
+
+class CVQuery:
+    """Requete de filtrage compilee, evaluee sur un CV ou sur un ensemble de CVs indexes"""
+
+    def __init__(self, query: str):
+        self.query = query
+        self._plan = _Parser(query).parse()
+        # Mots dont les positions sont necessaires a l'evaluation
+        self.tokens: FrozenSet[str] = frozenset(self._plan.tokens())
+
+    def matches_text(self, normalized_text: str) -> bool:
+        """Le texte normalise d'un CV satisfait-il la requete (positions lues dans le texte)"""
+        postings: Postings = {}
+        for position, word in enumerate(split_words(normalized_text)):
+            if word in self.tokens:
+                postings.setdefault(word, {}).setdefault('', []).append(position)
+        return bool(self._plan.evaluate(postings, frozenset({''})))
+
+    def filter_indexed(self, index: CVIndex, content_hashes: Iterable[str]) -> Set[str]:
+        """Empreintes des CVs indexes qui satisfont la requete (positions lues dans l'index)"""
+        universe = frozenset(content_hashes)
+        if not universe:
+            return set()
+        return self._plan.evaluate(index.postings(self.tokens, universe), universe)
+
+
+def compile_query(query: Optional[str]) -> Optional[CVQuery]:
+    """Compile une requete de filtrage (None si absente ou vide)"""
+    if query is None or not query.strip():
+        return None
+    return CVQuery(query)
@@ -0,0 +1,118 @@
+"""
+Detection des CVs en double.
+- Doublons exacts: meme empreinte de contenu (voir text_cache.file_content_hash).
+- Quasi-doublons: signatures MinHash du texte nettoye, regroupees par LSH (bandes)
+  puis verifiees par similarite estimee (Jaccard des shingles de mots).
+Les signatures sont stables d'un processus a l'autre (pas de hash() Python) et
+peuvent donc etre mises en cache par empreinte de contenu.
+"""
+import os
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+# Version des signatures: a incrementer si leur calcul change (invalide le cache)
+MINHASH_VERSION = "1"
+
+# Nombre de permutations (taille de la signature) et decoupage LSH (bandes x lignes)
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16
+_LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+
+# Taille des shingles, en mots
+SHINGLE_SIZE = 5
+
+# Similarite estimee a partir de laquelle deux CVs sont consideres comme quasi-doublons
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("CV_NEAR_DUPLICATE_THRESHOLD", "0.9"))
+
+# Nombre premier superieur a 2**32: (a * x + b) tient dans un uint64 pour a, x, b < 2**32
+_PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(20240101)
+_COEF_A = _rng.integers(1, 2 ** 32, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_COEF_B = _rng.integers(0, 2 ** 32, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_SHINGLE_BASE = np.uint64(1000003)
+_MASK_32 = np.uint64(0xFFFFFFFF)
+
+
+def minhash_signature(text: str) -> Optional[np.ndarray]:
+    """Signature MinHash (uint64) des shingles de mots du texte, None si le texte est vide"""
+    words = text.lower().split()
+    if not words:
+        return None
+
+    # Hash stable de chaque mot, puis combinaison glissante sur SHINGLE_SIZE mots
+    word_hashes = np.fromiter((zlib.crc32(word.encode('utf-8')) for word in words),
+                              dtype=np.uint64, count=len(words))
+    size = min(SHINGLE_SIZE, len(words))
+    shingles = np.zeros(len(words) - size + 1, dtype=np.uint64)
+    for offset in range(size):
+        shingles = (shingles * _SHINGLE_BASE + word_hashes[offset:offset + len(shingles)]) & _MASK_32
+    shingles = np.unique(shingles)
+
+    hashed = (_COEF_A[:, None] * shingles[None, :] + _COEF_B[:, None]) % _PRIME
+    return hashed.min(axis=1)
+
+
+def estimate_similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Similarite de Jaccard estimee: proportion de minimums egaux"""
+    return float(np.count_nonzero(first == second)) / len(first)
+
+
+def signature_to_bytes(signature: np.ndarray) -> bytes:
+    return signature.astype('<u8').tobytes()
+
+
+def signature_from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype='<u8').astype(np.uint64)
+
+
+def near_duplicate_clusters(signatures: Iterable[Tuple[str, np.ndarray]],
+                            threshold: float = NEAR_DUPLICATE_THRESHOLD) -> Dict[str, str]:
+    """
+    Regroupe les quasi-doublons. Les signatures sont donnees dans l'ordre de reference:
+    le premier CV d'un groupe en est le representant.
+    Retourne {CV: representant} pour les seuls CVs qui ne sont pas representants.
+    """
+    names: List[str] = []
+    matrix = []
+    for name, signature in signatures:
+        names.append(name)
+        matrix.append(signature)
+    if len(names) < 2:
+        return {}
+    matrix = np.vstack(matrix)
+
+    # Union-find: le representant est toujours le plus petit indice du groupe
+    parent = list(range(len(names)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    for band in range(LSH_BANDS):
+        buckets: Dict[bytes, List[int]] = {}
+        rows = matrix[:, band * _LSH_ROWS:(band + 1) * _LSH_ROWS]
+        for index, key in enumerate(map(bytes, rows)):
+            buckets.setdefault(key, []).append(index)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            # Candidats de la meme case: verification sur la signature complete
+            for position, first in enumerate(members):
+                for second in members[position + 1:]:
+                    root_first, root_second = find(first), find(second)
+                    if root_first == root_second:
+                        continue
+                    if estimate_similarity(matrix[first], matrix[second]) >= threshold:
+                        parent[max(root_first, root_second)] = min(root_first, root_second)
+
+    clusters = {}
+    for index, name in enumerate(names):
+        root = find(index)
+        if root != index:
+            clusters[name] = names[root]
+    return clusters
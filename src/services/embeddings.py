@@ -0,0 +1,104 @@
+"""
+Embeddings des CVs et des offres via le serveur Ollama local (/api/embed).
+Le texte nettoye d'un CV est decoupe en morceaux de quelques centaines de mots,
+envoyes par lots avec un nombre borne de requetes simultanees; le vecteur du CV
+est la moyenne des vecteurs de ses morceaux. Les vecteurs sont stockes par empreinte
+de contenu (voir vector_store): un CV n'est jamais embarque deux fois par modele.
+"""
+import asyncio
+import os
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from .cv_analyzer import CLEANING_VERSION
+from .llm_adapters import OllamaAdapter
+from .pdf_extraction import EXTRACTOR_VERSION
+from .text_cache import get_text_cache
+from .vector_store import VectorStore
+
+# Modele d'embedding Ollama par defaut
+EMBEDDING_MODEL = os.environ.get("CV_EMBEDDING_MODEL", "nomic-embed-text")
+
+# Textes par requete et requetes simultanees vers Ollama
+EMBED_BATCH_SIZE = 16
+EMBED_CONCURRENCY = 4
+
+# CVs embarques (puis stockes) ensemble: borne la memoire des vecteurs en attente
+EMBED_GROUP_SIZE = 256
+
+# Taille des morceaux (en mots) et nombre maximal de morceaux par document
+CHUNK_WORDS = 256
+MAX_CHUNKS = 16
+
+
+def chunk_text(text: str) -> List[str]:
+    """Decoupe un texte en morceaux de CHUNK_WORDS mots (les MAX_CHUNKS premiers)"""
+    words = text.split()
+    return [" ".join(words[start:start + CHUNK_WORDS])
+            for start in range(0, min(len(words), CHUNK_WORDS * MAX_CHUNKS), CHUNK_WORDS)]
+
+
+async def embed_texts(adapter: OllamaAdapter, texts: List[str],
+                      batch_size: int = EMBED_BATCH_SIZE,
+                      concurrency: int = EMBED_CONCURRENCY) -> np.ndarray:
+    """Vecteurs d'une liste de textes, par lots, au plus `concurrency` lots en cours"""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def embed_batch(batch: List[str]) -> List[List[float]]:
+        async with semaphore:
+            return await adapter.embed(batch)
+
+    batches = await asyncio.gather(*(embed_batch(texts[start:start + batch_size])
+                                     for start in range(0, len(texts), batch_size)))
+    return np.array([vector for batch in batches for vector in batch], dtype=np.float32)
+
+
+def pool_chunks(vectors: np.ndarray) -> np.ndarray:
+    """Vecteur d'un document: moyenne des vecteurs normalises de ses morceaux"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0).mean(axis=0)
+
+
+async def embed_document(adapter: OllamaAdapter, text: str) -> np.ndarray:
+    """Vecteur d'un texte (une offre), decoupe comme les CVs"""
+    chunks = chunk_text(text)
+    if not chunks:
+        raise ValueError("Texte vide")
+    return pool_chunks(await embed_texts(adapter, chunks))
+
+
+async def embed_cvs(adapter: OllamaAdapter, store: VectorStore, content_hashes: Iterable[str]) -> int:
+    """
+    Calcule et stocke les vecteurs des CVs qui n'en ont pas encore, depuis leur texte
+    nettoye en cache (les CVs absents du cache sont ignores). Renvoie le nombre de CVs embarques.
+    Les CVs sont traites par groupes de EMBED_GROUP_SIZE, stockes au fur et a mesure:
+    memoire bornee, et un echec d'Ollama ne fait pas perdre les groupes deja embarques.
+    """
+    missing = store.missing(content_hashes)
+    embedded = 0
+    for start in range(0, len(missing), EMBED_GROUP_SIZE):
+        embedded += await _embed_group(adapter, store, missing[start:start + EMBED_GROUP_SIZE])
+    return embedded
+
+
+async def _embed_group(adapter: OllamaAdapter, store: VectorStore, content_hashes: List[str]) -> int:
+    """Embarque et stocke un groupe de CVs"""
+    cache = get_text_cache()
+    chunks: List[str] = []
+    spans: Dict[str, slice] = {}
+    for content_hash in content_hashes:
+        text = cache.get_cleaned(content_hash, EXTRACTOR_VERSION, CLEANING_VERSION)
+        document_chunks = chunk_text(text or "")
+        if document_chunks:
+            spans[content_hash] = slice(len(chunks), len(chunks) + len(document_chunks))
+            chunks.extend(document_chunks)
+    if not chunks:
+        return 0
+
+    # Morceaux de tous les CVs du groupe envoyes ensemble: lots pleins meme pour des CVs courts
+    vectors = await embed_texts(adapter, chunks)
+    store.add({content_hash: pool_chunks(vectors[span]) for content_hash, span in spans.items()})
+    return len(spans)
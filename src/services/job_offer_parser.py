@@ -2,90 +2,35 @@
 """
 Parser d'offres d'emploi - Extraction de texte et parsing des requirements
 """
-import re
+import math
 from pathlib import Path
 from typing import Dict, Optional
 
-# Essayer d'importer PyPDF2
-try:
-    from PyPDF2 import PdfReader
-except ImportError:
-    PdfReader = None
-
-
-# Liste des mots-cles techniques a detecter
-TECH_KEYWORDS = {
-    # Langages de programmation
-    "python", "javascript", "java", "c++", "c#", "csharp", "go", "golang",
-    "rust", "php", "ruby", "swift", "kotlin", "scala", "typescript",
-    "perl", "matlab", "bash", "shell", "powershell",
-
-    # Frontend
-    "react", "reactjs", "vue", "vuejs", "angular", "angularjs",
-    "html", "html5", "css", "css3", "sass", "scss", "less",
-    "webpack", "vite", "nextjs", "next.js", "nuxt", "gatsby",
-    "tailwind", "bootstrap", "material-ui", "mui",
-
-    # Backend
-    "node", "nodejs", "node.js", "express", "expressjs",
-    "django", "flask", "fastapi", "spring", "springboot",
-    "laravel", "symfony", "rails", "ruby on rails",
-    "asp.net", "dotnet", ".net",
-
-    # Base de donnees
-    "sql", "mysql", "postgresql", "postgres", "mongodb", "mongo",
-    "redis", "elasticsearch", "oracle", "sqlite", "mariadb",
-    "dynamodb", "cassandra", "neo4j", "graphql",
-
-    # Cloud & DevOps
-    "aws", "amazon web services", "azure", "gcp", "google cloud",
-    "docker", "kubernetes", "k8s", "jenkins", "gitlab", "github",
-    "terraform", "ansible", "puppet", "chef",
-    "ci/cd", "cicd", "devops", "sre",
-
-    # Data & ML
-    "machine learning", "deep learning",
-    "tensorflow", "pytorch", "keras", "scikit-learn", "sklearn",
-    "pandas", "numpy", "spark", "hadoop", "airflow",
-    "data science", "data engineering", "etl",
-    "tableau", "power bi", "looker",
-
-    # Methodologies & pratiques
-    "agile", "scrum", "kanban", "jira",
-    "rest api", "restful", "soap", "microservices",
-    "git", "svn",
-    "tdd", "bdd", "unit testing",
-
-    # Securite
-    "cybersecurity", "owasp", "penetration testing",
-    "oauth", "jwt",
-
-    # Mobile
-    "android", "ios", "react native", "flutter", "xamarin",
-
-    # Autres
-    "linux", "unix", "windows server",
-    "nginx", "apache"
-}
+from .corpus_discovery import CorpusDiscovery
+from .pdf_extraction import PdfReader, PAGE_PARALLEL_THRESHOLD, extract_pages
+# TECH_KEYWORDS reste importable depuis ce module
+from .skills_taxonomy import TECH_KEYWORDS, get_taxonomy, normalize_skill
+
+
+# Formats d'offres d'emploi pris en charge
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt')
 
 
 class JobOfferParser:
     """Classe pour parser les offres d'emploi et extraire les requirements"""
 
     @staticmethod
-    def extract_text_from_pdf(file_path: str) -> str:
-        """Extrait le texte d'un fichier PDF"""
+    def extract_text_from_pdf(file_path: str, page_threshold: int = PAGE_PARALLEL_THRESHOLD) -> str:
+        """
+        Extrait le texte d'un fichier PDF.
+        Au-dela de page_threshold pages, les pages sont extraites en parallele.
+        """
         if PdfReader is None:
             raise ImportError("PyPDF2 n'est pas installe. Installez-le avec: pip install PyPDF2")
 
         try:
-            reader = PdfReader(file_path)
-            text_parts = []
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    text_parts.append(text)
-            return "\n".join(text_parts)
+            pages = extract_pages(file_path, page_threshold)
+            return "\n".join(text for text in pages if text)
         except Exception as e:
             raise ValueError(f"Erreur lors de la lecture du PDF: {str(e)}")
 
@@ -118,6 +63,15 @@ class JobOfferParser:
         else:
             raise ValueError(f"Format de fichier non supporte: {extension}. Utilisez PDF ou TXT.")
 
+    @staticmethod
+    def discover_files(folder_path: str, max_depth: Optional[int] = 0, include=None,
+                       exclude=None, max_size: Optional[int] = None) -> CorpusDiscovery:
+        """
+        Trouve les offres d'emploi (PDF ou TXT) d'un dossier.
+        Les fichiers sont produits au fur et a mesure du parcours.
+        """
+        return CorpusDiscovery(folder_path, SUPPORTED_EXTENSIONS, max_depth, include, exclude, max_size)
+
     @staticmethod
     def parse_requirements(text: str) -> Dict[str, float]:
         """
@@ -135,22 +89,30 @@ class JobOfferParser:
         text_length = len(text_lower)
         first_third = text_length // 3  # Premier tiers du document
 
+        # Une seule passe (automate de la taxonomie, sensible a la casse sur le texte en minuscules):
+        # occurrences et occurrences dans le premier tiers de chaque terme
+        taxonomy = get_taxonomy()
+        occurrences = {}
+        for keyword, start, _ in taxonomy.matcher.finditer(text_lower):
+            found = occurrences.get(keyword)
+            if found is None:
+                found = occurrences[keyword] = [0, 0]
+            found[0] += 1
+            if start < first_third:
+                found[1] += 1
+
         # Dictionnaire pour stocker les scores bruts
         keyword_scores = {}
 
-        for keyword in TECH_KEYWORDS:
-            # Pattern pour matcher le mot-cle comme mot complet
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            matches = list(re.finditer(pattern, text_lower))
-
-            if matches:
-                normalized = JobOfferParser._normalize_keyword(keyword)
+        for keyword in taxonomy.terms:
+            if keyword in occurrences:
+                # Synonymes regroupes sous le nom de leur competence
+                normalized = taxonomy.skill(keyword)
 
                 # Score de base = nombre d'occurrences
-                count = len(matches)
+                count, early_matches = occurrences[keyword]
 
                 # Bonus si apparait dans le premier tiers (titre, intro, requirements principaux)
-                early_matches = sum(1 for m in matches if m.start() < first_third)
                 position_bonus = early_matches * 0.5  # +0.5 par occurrence dans le premier tiers
 
                 # Score total pour ce keyword
@@ -162,11 +124,18 @@ class JobOfferParser:
                 else:
                     keyword_scores[normalized] = score
 
+        return JobOfferParser._to_percentages(keyword_scores)
+
+    @staticmethod
+    def _to_percentages(keyword_scores: Dict[str, float]) -> Dict[str, float]:
+        """Convertit des scores en ponderations (total = 100%), triees par poids decroissant"""
         if not keyword_scores:
             return {}
 
         # Convertir les scores en pourcentages (total = 100%)
         total_score = sum(keyword_scores.values())
+        if total_score <= 0:
+            return {}
         requirements = {}
 
         for keyword, score in keyword_scores.items():
@@ -187,51 +156,25 @@ class JobOfferParser:
         return requirements
 
     @staticmethod
-    def _normalize_keyword(keyword: str) -> str:
-        """Normalise les synonymes de mots-cles"""
-        normalizations = {
-            "reactjs": "React",
-            "vuejs": "Vue",
-            "angularjs": "Angular",
-            "nodejs": "Node.js",
-            "node.js": "Node.js",
-            "node": "Node.js",
-            "expressjs": "Express",
-            "golang": "Go",
-            "csharp": "C#",
-            "c#": "C#",
-            "postgres": "PostgreSQL",
-            "postgresql": "PostgreSQL",
-            "mongo": "MongoDB",
-            "mongodb": "MongoDB",
-            "k8s": "Kubernetes",
-            "kubernetes": "Kubernetes",
-            "amazon web services": "AWS",
-            "aws": "AWS",
-            "google cloud": "GCP",
-            "gcp": "GCP",
-            "cicd": "CI/CD",
-            "ci/cd": "CI/CD",
-            "ml": "Machine Learning",
-            "machine learning": "Machine Learning",
-            "dl": "Deep Learning",
-            "deep learning": "Deep Learning",
-            "sklearn": "Scikit-learn",
-            "scikit-learn": "Scikit-learn",
-            "next.js": "Next.js",
-            "nextjs": "Next.js",
-            "ruby on rails": "Rails",
-            "dotnet": ".NET",
-            ".net": ".NET",
-            "asp.net": ".NET",
+    def adjust_weights(requirements: Dict[str, float], document_frequencies: Dict[str, int],
+                       documents: int) -> Dict[str, float]:
+        """
+        Ajuste les ponderations d'une offre par la rarete de chaque mot-cle dans les CVs:
+        poids x IDF lisse, log((1 + N) / (1 + df)) + 1, puis retour a un total de 100%.
+        Un mot-cle present dans presque tous les CVs discrimine peu et perd du poids.
+        """
+        if not documents:
+            return dict(requirements)
+        scores = {
+            keyword: weight * (math.log((1 + documents) / (1 + document_frequencies.get(keyword, 0))) + 1)
+            for keyword, weight in requirements.items()
         }
+        return JobOfferParser._to_percentages(scores)
 
-        lower = keyword.lower()
-        if lower in normalizations:
-            return normalizations[lower]
-
-        # Capitaliser la premiere lettre
-        return keyword.capitalize()
+    @staticmethod
+    def _normalize_keyword(keyword: str) -> str:
+        """Normalise les synonymes de mots-cles"""
+        return normalize_skill(keyword)
 
     @staticmethod
     def process_file(file_path: str) -> Dict:
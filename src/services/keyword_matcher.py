@@ -0,0 +1,210 @@
+"""
+Matcher multi-mots-cles - Automate Aho-Corasick.
+Compte toutes les occurrences de tous les mots-cles en une seule passe sur le texte,
+avec la meme semantique que re.findall(r'\\bmot\\b', texte, re.IGNORECASE) par mot-cle.
+"""
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+# Classes de caracteres que re.IGNORECASE considere equivalents en plus de lower()
+# (ex: 's' et 's long', 'i' et 'i sans point', sigma final).
+_CASE_EQUIVALENCES = (
+    "i\u0131", "s\u017f", "\u00b5\u03bc", "\u0345\u03b9\u1fbe", "\u0390\u1fd3", "\u03b0\u1fe3",
+    "\u03b2\u03d0", "\u03b5\u03f5", "\u03b8\u03d1", "\u03ba\u03f0", "\u03c0\u03d6", "\u03c1\u03f1",
+    "\u03c2\u03c3", "\u03c6\u03d5", "\u0432\u1c80", "\u0434\u1c81", "\u043e\u1c82", "\u0441\u1c83",
+    "\u0442\u1c84\u1c85", "\u044a\u1c86", "\u0463\u1c87", "\u1c88\ua64b", "\u1e61\u1e9b", "\ufb05\ufb06",
+)
+
+_CASE_FOLD_TABLE = {
+    ord(ch): min(group)
+    for group in _CASE_EQUIVALENCES
+    for ch in group
+    if ch != min(group)
+}
+
+
+def fold_case(text: str) -> str:
+    """
+    Passe le texte en minuscules comme le fait re.IGNORECASE.
+    La longueur est conservee: un index dans le texte plie est valide dans l'original.
+    """
+    # 'I' avec point est le seul caractere dont lower() produit deux caracteres
+    return text.replace('\u0130', 'i').lower().translate(_CASE_FOLD_TABLE)
+
+
+def _is_word_char(ch: str) -> bool:
+    """Meme definition que \\w pour les motifs str du module re"""
+    return ch.isalnum() or ch == '_'
+
+
+class KeywordMatcher:
+    """
+    Automate Aho-Corasick construit une seule fois pour un ensemble de mots-cles.
+    Les occurrences sont filtrees sur les frontieres de mots (\\b) et ne se chevauchent
+    pas pour un meme mot-cle, comme avec re.findall.
+    Avec ignore_case=False, la recherche est sensible a la casse (comme re sans IGNORECASE).
+    synonyms donne d'autres termes par mot-cle: leurs occurrences sont comptees pour ce
+    mot-cle (sans chevauchement entre les termes d'un meme mot-cle).
+    normalize est appliquee aux termes a la place du pliage de casse: le texte doit alors
+    etre deja normalise de la meme facon (voir text_normalization.normalize_text).
+    """
+
+    def __init__(self, keywords: Iterable[str], ignore_case: bool = True,
+                 synonyms: Optional[Dict[str, Iterable[str]]] = None,
+                 normalize: Optional[Callable[[str], str]] = None):
+        self.keywords: List[str] = list(dict.fromkeys(keywords))
+        self.ignore_case = ignore_case and normalize is None
+        if normalize is None:
+            normalize = fold_case if ignore_case else str
+
+        # Tables de l'automate: transitions, liens d'echec et sorties (motifs) par etat
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        # Longueur et mot-cle de chaque motif
+        self._lengths: List[int] = []
+        self._pattern_keywords: List[int] = []
+
+        synonyms = synonyms or {}
+        for keyword_id, keyword in enumerate(self.keywords):
+            terms = (keyword, *synonyms.get(keyword, ()))
+            for pattern in dict.fromkeys(normalize(term) for term in terms):
+                self._add(pattern, keyword_id)
+        self._build_failure_links()
+
+    def _add(self, pattern: str, keyword_id: int) -> None:
+        """Ajoute un motif deja plie dans le trie"""
+        pattern_id = len(self._lengths)
+        self._lengths.append(len(pattern))
+        self._pattern_keywords.append(keyword_id)
+        if not pattern:
+            # Un mot-cle vide ne peut jamais etre trouve
+            return
+
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        self._out[state] = self._out[state] + (pattern_id,)
+
+    def _build_failure_links(self) -> None:
+        """Parcours en largeur pour calculer les liens d'echec et fusionner les sorties"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def finditer(self, text: str) -> Iterator[Tuple[str, int, int]]:
+        """
+        Parcourt le texte une seule fois et produit (mot-cle, debut, fin)
+        pour chaque occurrence valide, dans l'ordre des positions de fin.
+        """
+        goto, fail, out, lengths = self._goto, self._fail, self._out, self._lengths
+        pattern_keywords = self._pattern_keywords
+        keywords = self.keywords
+        folded = fold_case(text) if self.ignore_case else text
+        text_length = len(text)
+        last_end = [0] * len(keywords)
+
+        state = 0
+        for index, ch in enumerate(folded):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not out[state]:
+                continue
+
+            end = index + 1
+            for pattern_id in out[state]:
+                keyword_id = pattern_keywords[pattern_id]
+                start = end - lengths[pattern_id]
+                if start < last_end[keyword_id]:
+                    continue
+                # Frontieres de mots (\b) au debut et a la fin de l'occurrence
+                before = start > 0 and _is_word_char(text[start - 1])
+                if before == _is_word_char(text[start]):
+                    continue
+                after = end < text_length and _is_word_char(text[end])
+                if after == _is_word_char(text[end - 1]):
+                    continue
+                last_end[keyword_id] = end
+                yield keywords[keyword_id], start, end
+
+    def count(self, text: str) -> Dict[str, int]:
+        """Compte les occurrences de chaque mot-cle (0 si absent)"""
+        counts = dict.fromkeys(self.keywords, 0)
+        for keyword, _, _ in self.finditer(text):
+            counts[keyword] += 1
+        return counts
+
+    def save(self, path: Path) -> None:
+        """
+        Sauvegarde les tables de l'automate dans un .npz de tableaux plats: rechargees
+        avec allow_pickle=False, elles ne peuvent pas executer de code.
+        """
+        with open(path, 'wb') as file:
+            np.savez(
+                file,
+                keywords=np.array(self.keywords, dtype=str),
+                ignore_case=np.array(self.ignore_case),
+                # Transitions de chaque etat a la suite: nombre par etat, caracteres, etats cibles
+                transitions=np.array([len(goto) for goto in self._goto], dtype=np.int32),
+                chars=np.array(''.join(ch for goto in self._goto for ch in goto)),
+                targets=np.array([state for goto in self._goto for state in goto.values()], dtype=np.int32),
+                fail=np.array(self._fail, dtype=np.int32),
+                outputs=np.array([len(out) for out in self._out], dtype=np.int32),
+                patterns=np.array([pattern_id for out in self._out for pattern_id in out], dtype=np.int32),
+                lengths=np.array(self._lengths, dtype=np.int32),
+                pattern_keywords=np.array(self._pattern_keywords, dtype=np.int32),
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "KeywordMatcher":
+        """
+        Recharge un automate sauvegarde par save (sans le reconstruire).
+        Leve OSError, EOFError, ValueError, KeyError ou zipfile.BadZipFile si le fichier
+        est absent ou invalide.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            transitions = data['transitions'].tolist()
+            chars = str(data['chars'])
+            targets = data['targets'].tolist()
+            outputs = data['outputs'].tolist()
+            patterns = data['patterns'].tolist()
+            matcher = cls.__new__(cls)
+            matcher.keywords = data['keywords'].tolist()
+            matcher.ignore_case = bool(data['ignore_case'])
+            matcher._fail = data['fail'].tolist()
+            matcher._lengths = data['lengths'].tolist()
+            matcher._pattern_keywords = data['pattern_keywords'].tolist()
+        if not (len(transitions) == len(outputs) == len(matcher._fail)
+                and sum(transitions) == len(chars) == len(targets) and sum(outputs) == len(patterns)
+                and len(matcher._lengths) == len(matcher._pattern_keywords)):
+            raise ValueError("Tables de l'automate incoherentes")
+
+        matcher._goto = []
+        position = 0
+        for count in transitions:
+            matcher._goto.append(dict(zip(chars[position:position + count], targets[position:position + count])))
+            position += count
+        matcher._out = []
+        position = 0
+        for count in outputs:
+            matcher._out.append(tuple(patterns[position:position + count]))
+            position += count
+        return matcher
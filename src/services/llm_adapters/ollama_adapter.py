@@ -4,7 +4,7 @@ https://ollama.ai
 """
 
 import httpx
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from .base_adapter import BaseLLMAdapter, LLMResponse
 
 
@@ -94,6 +94,36 @@ class OllamaAdapter(BaseLLMAdapter):
         except Exception as e:
             raise Exception(f"Erreur Ollama: {str(e)}")
 
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Calcule les embeddings d'un lot de textes avec le modele configure
+        (un modele d'embedding, ex: 'nomic-embed-text').
+        """
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.post(
+                    f"{self.ollama_url}/api/embed",
+                    json={"model": self.model, "input": texts}
+                )
+
+                if response.status_code != 200:
+                    raise Exception(f"Erreur Ollama: {response.status_code} - {response.text}")
+
+                embeddings = response.json().get("embeddings", [])
+                if len(embeddings) != len(texts):
+                    raise Exception(f"{len(embeddings)} embeddings recus pour {len(texts)} textes")
+                return embeddings
+
+        except httpx.ConnectError:
+            raise Exception(
+                f"Impossible de se connecter a Ollama sur {self.ollama_url}. "
+                "Verifiez que Ollama est lance (ollama serve)."
+            )
+        except httpx.TimeoutException:
+            raise Exception(
+                f"Timeout lors du calcul des embeddings avec le modele {self.model}."
+            )
+
     async def test_connection(self) -> Dict[str, Any]:
         """Teste la connexion a Ollama et liste les modeles disponibles."""
         try:
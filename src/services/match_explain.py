@@ -0,0 +1,99 @@
+"""
+Explication a la demande des occurrences d'un mot-cle dans un CV: positions dans le
+texte nettoye et extraits autour de chaque occurrence.
+Rien n'est calcule ni stocke pendant l'analyse: le texte vient du cache de texte
+extrait (re-extrait si besoin), les occurrences de l'automate de recherche (memes
+regles que le comptage: normalisation, synonymes de la taxonomie, frontieres de mots).
+Les dernieres explications sont gardees en memoire (LRU).
+"""
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .cv_analyzer import CLEANING_VERSION, clean_pages
+from .keyword_matcher import KeywordMatcher
+from .pdf_extraction import EXTRACTOR_VERSION, extract_pages
+from .skills_taxonomy import get_taxonomy
+from .text_cache import file_content_hash, get_text_cache
+from .text_normalization import NORMALIZATION_VERSION, normalize_text, normalize_with_offsets, original_span
+
+# Nombre de caracteres de contexte de chaque cote d'une occurrence
+DEFAULT_CONTEXT_CHARS = 80
+
+# Nombre d'explications gardees en memoire
+_EXPLAIN_CACHE_SIZE = 64
+
+_explain_cache: "OrderedDict[Tuple, List[Dict]]" = OrderedDict()
+_explain_lock = threading.Lock()
+
+
+@lru_cache(maxsize=32)
+def _keyword_matcher(keyword: str, taxonomy_fingerprint: str) -> KeywordMatcher:
+    """Automate d'un mot-cle et de ses synonymes (reconstruit si la taxonomie change)"""
+    synonyms = {keyword: get_taxonomy().synonyms(keyword)}
+    return KeywordMatcher([keyword], synonyms=synonyms, normalize=normalize_text)
+
+
+def load_texts(pdf_path: Path, content_hash: str) -> Tuple[str, str, List[List[int]]]:
+    """
+    Texte nettoye, texte normalise et table des positions d'un CV, depuis le cache
+    de texte extrait ou, a defaut, par une nouvelle extraction (remise en cache).
+    """
+    cache = get_text_cache()
+    cleaned = cache.get_cleaned(content_hash, EXTRACTOR_VERSION, CLEANING_VERSION)
+    if cleaned is None:
+        cleaned = clean_pages(extract_pages(pdf_path, content_hash=content_hash))
+        cache.put_cleaned(content_hash, EXTRACTOR_VERSION, CLEANING_VERSION, cleaned)
+    normalized = cache.get_normalized(content_hash, EXTRACTOR_VERSION, CLEANING_VERSION,
+                                      NORMALIZATION_VERSION, with_offsets=True)
+    if normalized is None:
+        normalized = normalize_with_offsets(cleaned)
+        cache.put_normalized(content_hash, EXTRACTOR_VERSION, CLEANING_VERSION,
+                             NORMALIZATION_VERSION, *normalized)
+    return cleaned, normalized[0], normalized[1]
+
+
+def explain_keyword(pdf_path: Path, keyword: str, content_hash: Optional[str] = None,
+                    context: int = DEFAULT_CONTEXT_CHARS) -> List[Dict]:
+    """
+    Occurrences d'un mot-cle dans un CV: position [start, end) dans le texte nettoye,
+    texte trouve (le mot-cle ou un synonyme) et contexte avant/apres.
+    """
+    if content_hash is None:
+        content_hash = file_content_hash(pdf_path)
+    taxonomy = get_taxonomy()
+    key = (content_hash, keyword, taxonomy.fingerprint, context)
+    with _explain_lock:
+        if key in _explain_cache:
+            _explain_cache.move_to_end(key)
+            return _explain_cache[key]
+
+    cleaned, normalized, offsets = load_texts(pdf_path, content_hash)
+    matcher = _keyword_matcher(keyword, taxonomy.fingerprint)
+    matches = []
+    for _, start, end in matcher.finditer(normalized):
+        start, end = original_span(offsets, start, end)
+        before_start = max(0, start - context)
+        after_end = min(len(cleaned), end + context)
+        # Contexte coupe sur une espace pour ne pas couper un mot
+        if before_start > 0:
+            space = cleaned.find(' ', before_start, start)
+            before_start = space + 1 if space != -1 else before_start
+        if after_end < len(cleaned):
+            space = cleaned.rfind(' ', end, after_end)
+            after_end = space if space != -1 else after_end
+        matches.append({
+            'start': start,
+            'end': end,
+            'match': cleaned[start:end],
+            'before': ('…' if before_start > 0 else '') + cleaned[before_start:start],
+            'after': cleaned[end:after_end] + ('…' if after_end < len(cleaned) else ''),
+        })
+
+    with _explain_lock:
+        _explain_cache[key] = matches
+        while len(_explain_cache) > _EXPLAIN_CACHE_SIZE:
+            _explain_cache.popitem(last=False)
+    return matches
@@ -0,0 +1,263 @@
+"""
+Extraction du texte des PDF page par page.
+Au-dela d'un nombre de pages configurable, les pages sont reparties entre les
+workers du pool partage puis reassemblees dans l'ordre.
+Le texte extrait est lu et ecrit dans le cache adresse par le contenu.
+
+Dans les workers, l'extraction est confinee: delai maximal par fichier et plafond
+memoire. Sous Linux, une minuterie SIGALRM et RLIMIT_AS arretent l'extraction dans le
+worker; partout (y compris Windows, ou ni l'un ni l'autre n'existe), le parent surveille
+la duree et la memoire residente de chaque tache et tue le pool qui les depasse.
+Un PDF malveillant n'emporte plus toute l'analyse.
+Le processus principal n'ouvre jamais un PDF lui-meme, pas meme pour en compter les pages.
+"""
+import math
+import os
+import signal
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+from .process_pool import DEFAULT_WORKERS, imap_ordered, in_worker_process
+from .text_cache import file_content_hash, get_text_cache
+
+# resource n'existe pas sous Windows: pas de plafond memoire
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Essayer d'importer PyPDF2
+try:
+    import PyPDF2
+    from PyPDF2 import PdfReader
+except ImportError:
+    PdfReader = None
+
+
+# Version de l'extracteur: a incrementer si la facon d'extraire le texte change
+EXTRACTOR_VERSION = f"pypdf2-{PyPDF2.__version__}/1" if PdfReader is not None else "none"
+
+
+# Nombre de pages a partir duquel un document est decoupe entre les workers
+PAGE_PARALLEL_THRESHOLD = int(os.environ.get("CV_PAGE_PARALLEL_THRESHOLD", "40"))
+
+# Extraction dans les workers du pool (confinee) plutot que dans le processus de l'API
+SANDBOX_EXTRACTION = os.environ.get("CV_EXTRACTION_SANDBOX", "1") != "0"
+
+# Delai maximal d'extraction d'un fichier, en secondes (0 = sans limite)
+EXTRACTION_TIMEOUT = float(os.environ.get("CV_EXTRACTION_TIMEOUT", "60"))
+
+# Memoire supplementaire autorisee a un worker pendant l'extraction, en Mo (0 = sans limite)
+EXTRACTION_MEMORY_MB = int(os.environ.get("CV_EXTRACTION_MEMORY_MB", "1024"))
+
+# Marge laissee a la minuterie du worker avant que le parent ne tue le pool
+_WATCHDOG_GRACE = 10.0
+
+# Causes d'echec qui mettent un fichier en quarantaine (il n'est plus relu ensuite)
+QUARANTINE_REASONS = ('timeout', 'memory', 'crash')
+
+
+class PageSplitRequired(Exception):
+    """
+    Levee dans un worker du pool quand un document long doit etre decoupe:
+    seul le processus principal peut repartir les pages entre les workers.
+    """
+    def __init__(self, page_count: int):
+        self.page_count = page_count
+        super().__init__(f"Document de {page_count} pages a decouper")
+
+
+class ExtractionTimeout(Exception):
+    """Levee par la minuterie quand l'extraction d'un fichier depasse EXTRACTION_TIMEOUT"""
+
+
+class ExtractionFailed(Exception):
+    """Echec d'extraction dont la cause est connue ('timeout', 'memory', 'crash', ...)"""
+    def __init__(self, reason: str, message: str):
+        self.reason = reason
+        super().__init__(message)
+
+
+FAILURE_MESSAGES = {
+    'timeout': "Extraction trop longue (plus de {timeout:g} s)",
+    'memory': "Memoire insuffisante pour extraire le document",
+    'crash': "Le processus d'extraction s'est arrete brutalement",
+    'no-text-layer': "Aucun texte extractible (PDF image sans couche texte ?)",
+}
+
+
+def failure_message(reason: str) -> str:
+    """Message lisible pour une cause d'echec"""
+    return FAILURE_MESSAGES.get(reason, reason).format(timeout=EXTRACTION_TIMEOUT)
+
+
+def failure_reason(error: BaseException) -> str:
+    """Cause d'echec d'une exception levee pendant l'extraction"""
+    if isinstance(error, ExtractionFailed):
+        return error.reason
+    if isinstance(error, ExtractionTimeout):
+        return 'timeout'
+    if isinstance(error, MemoryError):
+        return 'memory'
+    return 'error'
+
+
+def watchdog_timeout() -> Optional[float]:
+    """Delai au-dela duquel le parent considere un worker comme bloque"""
+    return EXTRACTION_TIMEOUT + _WATCHDOG_GRACE if EXTRACTION_TIMEOUT > 0 else None
+
+
+def watchdog_memory_mb() -> Optional[int]:
+    """Memoire supplementaire au-dela de laquelle le parent tue le worker d'une tache"""
+    return EXTRACTION_MEMORY_MB if EXTRACTION_MEMORY_MB > 0 else None
+
+
+_memory_limited = False
+
+
+def _limit_worker_memory() -> None:
+    """
+    Plafonne l'espace d'adressage du worker (une fois par processus) a sa taille actuelle
+    plus EXTRACTION_MEMORY_MB: au-dela, les allocations levent MemoryError.
+    Linux seulement (resource et /proc); ailleurs, seule la surveillance du parent s'applique.
+    """
+    global _memory_limited
+    if _memory_limited or resource is None or EXTRACTION_MEMORY_MB <= 0:
+        return
+    _memory_limited = True
+    try:
+        with open('/proc/self/statm') as statm:
+            current = int(statm.read().split()[0]) * resource.getpagesize()
+    except OSError:
+        # Taille actuelle inconnue (hors Linux): pas de plafond plutot qu'un plafond faux
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = current + EXTRACTION_MEMORY_MB * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _on_extraction_timeout(signum, frame):
+    raise ExtractionTimeout()
+
+
+@contextmanager
+def extraction_sandbox(timeout: float = EXTRACTION_TIMEOUT):
+    """
+    Confine une extraction executee dans un worker du pool: plafond memoire et minuterie.
+    Sans effet dans le processus principal (ni signal ni limite sur le serveur).
+    """
+    if not in_worker_process():
+        yield
+        return
+
+    _limit_worker_memory()
+    if not timeout or not hasattr(signal, 'setitimer'):
+        yield
+        return
+
+    previous = signal.signal(signal.SIGALRM, _on_extraction_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_page_range(task: Tuple[str, int, int]) -> List[str]:
+    """Tache executee dans le pool: extrait les pages [start, stop) d'un PDF"""
+    pdf_path, start, stop = task
+    with extraction_sandbox():
+        reader = PdfReader(pdf_path)
+        return [reader.pages[index].extract_text() or '' for index in range(start, stop)]
+
+
+def _page_range_failed(task: Tuple[str, int, int], reason: str) -> List[str]:
+    """Worker bloque ou mort pendant l'extraction d'un intervalle de pages"""
+    raise ExtractionFailed(reason, failure_message(reason))
+
+
+def _extract_document(task: Tuple[str, int]) -> Tuple[Optional[List[str]], int]:
+    """
+    Tache executee dans le pool: compte les pages d'un PDF et l'extrait s'il est court.
+    Renvoie (None, nombre de pages) pour un document a decouper.
+    """
+    pdf_path, page_threshold = task
+    with extraction_sandbox():
+        reader = PdfReader(pdf_path)
+        page_count = len(reader.pages)
+        if page_threshold and page_count > page_threshold:
+            return None, page_count
+        return [page.extract_text() or '' for page in reader.pages], page_count
+
+
+def _document_failed(task: Tuple[str, int], reason: str) -> Tuple[Optional[List[str]], int]:
+    """Worker bloque ou mort pendant l'ouverture d'un document"""
+    raise ExtractionFailed(reason, failure_message(reason))
+
+
+def split_page_ranges(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    """Decoupe [0, page_count) en au plus `parts` intervalles contigus"""
+    size = max(1, math.ceil(page_count / max(1, parts)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def extract_pages(pdf_path: Union[str, Path],
+                  page_threshold: int = PAGE_PARALLEL_THRESHOLD,
+                  workers: int = DEFAULT_WORKERS,
+                  content_hash: Optional[str] = None) -> List[str]:
+    """
+    Extrait le texte de chaque page d'un PDF, dans l'ordre des pages.
+    Le cache est consulte d'abord (PyPDF2 n'est pas appele si le contenu est connu).
+    Les documents de plus de `page_threshold` pages sont extraits en parallele.
+    """
+    if PdfReader is None:
+        raise ImportError("PyPDF2 n'est pas installe. Installez-le avec: pip install PyPDF2")
+
+    cache = get_text_cache()
+    if content_hash is None:
+        content_hash = file_content_hash(pdf_path)
+    pages = cache.get_pages(content_hash, EXTRACTOR_VERSION)
+    if pages is None:
+        # Minuterie limitee a PyPDF2: jamais armee pendant les ecritures SQLite
+        with extraction_sandbox():
+            pages = _read_pages(pdf_path, page_threshold, workers)
+        cache.put_pages(content_hash, EXTRACTOR_VERSION, pages)
+    return pages
+
+
+def _read_pages(pdf_path: Union[str, Path], page_threshold: int, workers: int) -> List[str]:
+    """Extraction effective avec PyPDF2"""
+    if SANDBOX_EXTRACTION and not in_worker_process():
+        # Le PDF n'est jamais ouvert dans le processus principal: pages comptees dans un worker
+        pages, page_count = next(imap_ordered(_extract_document, [(str(pdf_path), page_threshold)], 1,
+                                              timeout=watchdog_timeout(), on_failure=_document_failed,
+                                              memory_limit_mb=watchdog_memory_mb()))
+        if pages is not None:
+            return pages
+        return _read_page_ranges(pdf_path, page_count, workers)
+
+    reader = PdfReader(str(pdf_path))
+    page_count = len(reader.pages)
+
+    if page_threshold and page_count > page_threshold:
+        if in_worker_process():
+            raise PageSplitRequired(page_count)
+        if workers > 1:
+            return _read_page_ranges(pdf_path, page_count, workers)
+
+    return [page.extract_text() or '' for page in reader.pages]
+
+
+def _read_page_ranges(pdf_path: Union[str, Path], page_count: int, workers: int) -> List[str]:
+    """Pages d'un document long, reparties entre les workers du pool"""
+    tasks = [(str(pdf_path), start, stop) for start, stop in split_page_ranges(page_count, workers)]
+    pages = []
+    for chunk in imap_ordered(_extract_page_range, tasks, workers,
+                              timeout=watchdog_timeout(), on_failure=_page_range_failed,
+                              memory_limit_mb=watchdog_memory_mb()):
+        pages.extend(chunk)
+    return pages
@@ -0,0 +1,261 @@
+"""
+Pool de processus partage pour les traitements lourds (extraction PDF, comptage).
+Le pool est cree une seule fois, pre-chauffe, puis reutilise par toutes les analyses.
+
+Les taches surveillees annoncent leur demarrage au parent (numero, pid, memoire residente):
+le delai d'une tache court a partir de cette annonce et la memoire de son worker est
+surveillee par le parent, ce qui fonctionne aussi sans SIGALRM ni RLIMIT_AS (Windows).
+"""
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+# psutil mesure la memoire des workers sur toutes les plateformes; sans lui, /proc (Linux)
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Nombre de workers par defaut (surchargeable via la variable d'environnement)
+DEFAULT_WORKERS = int(os.environ.get("CV_ANALYZER_WORKERS", "0")) or (os.cpu_count() or 1)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# Vrai uniquement dans les processus du pool (jamais dans le processus principal)
+_in_worker = False
+
+# Intervalle de surveillance des taches en cours (secondes)
+_WATCHDOG_POLL = 0.5
+
+# Annonces de demarrage des taches, une file par pool (celle d'un pool tue est abandonnee)
+_task_starts = None
+_task_starts_lock = threading.Lock()
+
+# Taches demarrees: numero -> (instant de l'annonce, pid du worker, memoire au demarrage)
+_started: Dict[int, Tuple[float, int, Optional[int]]] = {}
+_task_ids = itertools.count()
+
+
+class WorkerMemoryExceeded(Exception):
+    """Levee par le parent quand le worker d'une tache depasse sa memoire autorisee"""
+
+
+def _init_worker(task_starts=None) -> None:
+    """Initialisation de chaque processus du pool"""
+    global _in_worker, _task_starts
+    _in_worker = True
+    _task_starts = task_starts
+
+
+def in_worker_process() -> bool:
+    """Indique si le code s'execute dans un worker du pool"""
+    return _in_worker
+
+
+def _process_memory(pid: int) -> Optional[int]:
+    """Memoire residente d'un processus en octets (None si inconnue)"""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f'/proc/{pid}/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _run_task(task_id: int, func: Callable, item):
+    """Tache surveillee: annonce son demarrage au parent avant d'executer func"""
+    pid = os.getpid()
+    _task_starts.put((task_id, pid, _process_memory(pid)))
+    return func(item)
+
+
+def _task_start(task_id: int) -> Optional[Tuple[float, int, Optional[int]]]:
+    """Releve les annonces en attente et renvoie celle de la tache (None si pas demarree)"""
+    with _task_starts_lock:
+        if _task_starts is not None:
+            while not _task_starts.empty():
+                started_id, pid, memory = _task_starts.get()
+                _started[started_id] = (time.monotonic(), pid, memory)
+        return _started.get(task_id)
+
+
+def _forget_task(task_id: int) -> None:
+    """Oublie l'annonce d'une tache terminee (ou abandonnee)"""
+    _task_start(task_id)
+    with _task_starts_lock:
+        _started.pop(task_id, None)
+
+
+def _warm_up_worker() -> int:
+    """Importe les modules lourds dans le worker pour que la premiere tache soit rapide"""
+    from . import cv_analyzer  # noqa: F401
+    return os.getpid()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Retourne le pool partage, en le creant et en le pre-chauffant si necessaire"""
+    global _pool, _task_starts
+    with _pool_lock:
+        if _pool is None:
+            # SimpleQueue: l'annonce est ecrite avant que la tache ne commence
+            with _task_starts_lock:
+                _task_starts = multiprocessing.SimpleQueue()
+            _pool = ProcessPoolExecutor(max_workers=DEFAULT_WORKERS, initializer=_init_worker,
+                                        initargs=(_task_starts,))
+            # Une tache par worker force le demarrage de tous les processus
+            warm_up = [_pool.submit(_warm_up_worker) for _ in range(DEFAULT_WORKERS)]
+            for future in warm_up:
+                future.result()
+        return _pool
+
+
+def shutdown_process_pool() -> None:
+    """Arrete le pool partage (appele a l'arret de l'application)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def reset_process_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    Tue les workers d'un pool bloque ou casse; le prochain get_process_pool en cree un neuf.
+    Sans effet si ce pool a deja ete remplace (par une autre analyse par exemple).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    # ProcessPoolExecutor ne sait pas arreter un worker bloque: on termine ses processus
+    for process in list((getattr(pool, '_processes', None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _wait_result(future, task_id: Optional[int], timeout: Optional[float],
+                 memory_limit_mb: Optional[int]):
+    """
+    Attend le resultat d'une tache. Le delai court a partir du demarrage annonce par le
+    worker lui-meme (pas de la soumission ni de l'entree dans la file d'appels du pool):
+    une tache en attente n'expire pas. Pendant l'execution, la memoire residente du worker
+    ne doit pas depasser celle du demarrage de plus de memory_limit_mb.
+    """
+    if task_id is None:
+        return future.result()
+    try:
+        while True:
+            try:
+                return future.result(timeout=_WATCHDOG_POLL)
+            except FuturesTimeoutError:
+                start = _task_start(task_id)
+                if start is None:
+                    continue
+                started, pid, memory = start
+                if timeout is not None and time.monotonic() - started > timeout:
+                    raise
+                if memory_limit_mb and memory is not None:
+                    current = _process_memory(pid)
+                    if current is not None and current - memory > memory_limit_mb * 1024 * 1024:
+                        raise WorkerMemoryExceeded(f"Worker {pid}: plus de {memory_limit_mb} Mo")
+    finally:
+        _forget_task(task_id)
+
+
+def _failure_reason(error: Exception) -> str:
+    """Cause d'echec d'une tache dont le worker a du etre tue ou est mort"""
+    if isinstance(error, FuturesTimeoutError):
+        return 'timeout'
+    if isinstance(error, WorkerMemoryExceeded):
+        return 'memory'
+    return 'crash'
+
+
+def imap_ordered(func: Callable, items: Iterable, workers: int,
+                 timeout: Optional[float] = None,
+                 on_failure: Optional[Callable] = None,
+                 memory_limit_mb: Optional[int] = None) -> Iterator:
+    """
+    Applique func a chaque element dans le pool partage et produit les resultats
+    dans l'ordre des entrees. Au plus `workers` taches sont en vol a la fois.
+
+    Avec on_failure, une tache qui depasse `timeout` (worker bloque) ou dont le worker
+    depasse memory_limit_mb fait redemarrer le pool, et une tache dont le worker meurt
+    est relancee seule une fois pour identifier le fautif. Son resultat est alors
+    on_failure(element, raison), raison valant 'timeout', 'memory' ou 'crash';
+    les autres taches en vol sont resoumises au nouveau pool.
+    """
+    in_flight = deque()
+    max_in_flight = max(1, min(workers, DEFAULT_WORKERS))
+    monitored = timeout is not None or bool(memory_limit_mb)
+
+    def submit(item):
+        pool = get_process_pool()
+        if not monitored:
+            return item, pool.submit(func, item), pool, None
+        task_id = next(_task_ids)
+        return item, pool.submit(_run_task, task_id, func, item), pool, task_id
+
+    def resubmit_stale() -> None:
+        """Resoumet les taches en vol dont le pool a ete tue"""
+        for position, (item, future, pool, task_id) in enumerate(in_flight):
+            if pool is not _pool:
+                if task_id is not None:
+                    _forget_task(task_id)
+                in_flight[position] = submit(item)
+
+    def collect():
+        item, future, pool, task_id = in_flight.popleft()
+        while True:
+            try:
+                return _wait_result(future, task_id, timeout, memory_limit_mb)
+            except CancelledError:
+                # Annulee par le redemarrage du pool (par une autre analyse): resoumise
+                _, future, pool, task_id = submit(item)
+            except (FuturesTimeoutError, WorkerMemoryExceeded) as e:
+                if on_failure is None:
+                    raise
+                reset_process_pool(pool)
+                resubmit_stale()
+                return on_failure(item, _failure_reason(e))
+            except BrokenProcessPool:
+                if on_failure is None:
+                    raise
+                reset_process_pool(pool)
+                return retry_alone(item)
+
+    def retry_alone(item):
+        """Relance seule une tache: si le worker meurt encore, c'est bien elle qui est en cause"""
+        _, future, pool, task_id = submit(item)
+        while True:
+            try:
+                result = _wait_result(future, task_id, timeout, memory_limit_mb)
+                break
+            except CancelledError:
+                _, future, pool, task_id = submit(item)
+            except (FuturesTimeoutError, WorkerMemoryExceeded, BrokenProcessPool) as e:
+                reset_process_pool(pool)
+                result = on_failure(item, _failure_reason(e))
+                break
+        resubmit_stale()
+        return result
+
+    for item in items:
+        in_flight.append(submit(item))
+        if len(in_flight) >= max_in_flight:
+            yield collect()
+
+    while in_flight:
+        yield collect()
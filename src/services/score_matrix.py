@@ -0,0 +1,264 @@
+"""
+Matrice CV x mot-cle des occurrences d'une analyse.
+Persistee a cote de la base (format npz, creux si peu dense) pour re-scorer et
+re-classer tout le corpus avec de nouveaux poids en une operation vectorisee.
+Deux facons de scorer:
+- binary: somme des poids des mots-cles presents (chaque mot-cle compte une fois);
+- bm25: chaque mot-cle pese selon ses occurrences (saturees), sa rarete dans toute
+  l'archive (IDF) et la longueur du CV (normalisation par la longueur moyenne).
+  Les statistiques viennent des compteurs de l'index plein texte et le score n'est pas
+  ramene au meilleur CV: un CV a le meme score quel que soit le dossier analyse.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ..database.database import data_dir
+
+
+MATRICES_DIR = data_dir / "matrices"
+
+# En dessous de cette densite, la matrice est stockee sous forme creuse (coordonnees)
+SPARSE_DENSITY_THRESHOLD = 0.3
+
+# Nombre de matrices gardees en memoire pour les re-scorings interactifs
+_MATRIX_CACHE_SIZE = 8
+
+SCORING_MODES = ('binary', 'bm25')
+
+# Parametres BM25: saturation des occurrences et poids de la normalisation par la longueur
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+@dataclass
+class CorpusStatistics:
+    """Statistiques de l'archive pour BM25: nombre de CVs, longueur moyenne, CVs contenant chaque mot-cle"""
+    documents: int
+    average_length: float
+    frequencies: Dict[str, int]
+
+
+class KeywordCountMatrix:
+    """Occurrences de chaque mot-cle (colonnes) dans chaque CV (lignes)"""
+
+    def __init__(self, filenames: List[str], keywords: List[str], counts: np.ndarray,
+                 scoring: str = 'binary', lengths: Optional[np.ndarray] = None,
+                 corpus: Optional[CorpusStatistics] = None):
+        if scoring not in SCORING_MODES:
+            raise ValueError(f"Mode de score inconnu: {scoring}")
+        self.filenames = list(filenames)
+        self.keywords = list(keywords)
+        self.counts = counts.astype(np.int32, copy=False).reshape(len(self.filenames), len(self.keywords))
+        self.scoring = scoring
+        # Longueur (en mots) de chaque CV pour bm25, 0 si inconnue
+        self.lengths = None
+        if lengths is not None:
+            self.lengths = np.asarray(lengths, dtype=np.int64).reshape(len(self.filenames))
+        # Statistiques BM25 de l'archive (a defaut, celles des lignes de la matrice)
+        self.corpus = corpus
+        self._keyword_index = {keyword: index for index, keyword in enumerate(self.keywords)}
+        self._presence: Optional[np.ndarray] = None
+        self._relevance: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict], keywords: List[str],
+                     corpus: Optional[CorpusStatistics] = None) -> "KeywordCountMatrix":
+        """
+        Construit la matrice a partir de resultats serialises (filename, found_keywords).
+        Des resultats scores en bm25 portent 'scoring' et la longueur de chaque CV.
+        """
+        filenames = []
+        rows = []
+        lengths = []
+        scoring = 'binary'
+        for result in results:
+            found = result.get('found_keywords') or {}
+            filenames.append(result['filename'])
+            rows.append([found.get(keyword, 0) for keyword in keywords])
+            lengths.append(result.get('length') or 0)
+            if result.get('scoring') == 'bm25':
+                scoring = 'bm25'
+        counts = np.array(rows, dtype=np.int32).reshape(len(filenames), len(keywords))
+        return cls(filenames, keywords, counts, scoring=scoring,
+                   lengths=np.array(lengths, dtype=np.int64) if scoring == 'bm25' else None,
+                   corpus=corpus if scoring == 'bm25' else None)
+
+    @property
+    def presence(self) -> np.ndarray:
+        """1.0 si le mot-cle est present dans le CV (le score compte chaque mot-cle une fois)"""
+        if self._presence is None:
+            self._presence = (self.counts > 0).astype(np.float64)
+        return self._presence
+
+    @property
+    def relevance(self) -> np.ndarray:
+        """
+        Pertinence BM25 de chaque mot-cle dans chaque CV, entre 0 et 1 environ: IDF x
+        occurrences saturees, divise par l'IDF maximal possible (mot-cle present dans un seul CV).
+        Les statistiques (nombre de CVs, CVs contenant le mot-cle, longueur moyenne) sont celles
+        de l'archive; sans elles (index desactive), celles des lignes de la matrice.
+        """
+        if self._relevance is None:
+            rows = len(self.filenames)
+            lengths = np.zeros(rows) if self.lengths is None else self.lengths.astype(np.float64)
+            known = lengths > 0
+            if self.corpus is not None and self.corpus.documents > 0:
+                documents = self.corpus.documents
+                frequencies = np.array([self.corpus.frequencies.get(keyword, 0) for keyword in self.keywords],
+                                       dtype=np.float64).clip(0, documents)
+                average = self.corpus.average_length
+            else:
+                documents = rows
+                frequencies = np.count_nonzero(self.counts, axis=0).astype(np.float64)
+                average = lengths[known].mean() if known.any() else 0.0
+            idf = np.log1p((documents - frequencies + 0.5) / (frequencies + 0.5))
+            max_idf = np.log1p((documents - 0.5) / 1.5) if documents else 1.0
+
+            # Longueurs inconnues (CV non indexe): longueur moyenne, sans normalisation
+            average = average if average > 0 else 1.0
+            lengths = np.where(known, lengths, average)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / average)
+
+            counts = self.counts.astype(np.float64)
+            saturated = counts * (BM25_K1 + 1) / (counts + norm[:, None])
+            self._relevance = saturated / (BM25_K1 + 1) * (idf / max_idf)
+        return self._relevance
+
+    @property
+    def contributions(self) -> np.ndarray:
+        """Part de chaque mot-cle dans le score, par poids unitaire (presence ou pertinence BM25)"""
+        return self.relevance if self.scoring == 'bm25' else self.presence
+
+    def points(self, weights: Dict[str, float]) -> np.ndarray:
+        """Points apportes par chaque mot-cle (colonnes) au score de chaque CV (lignes)"""
+        return self.contributions * self.weight_vector(weights)
+
+    def weight_vector(self, weights: Dict[str, float]) -> np.ndarray:
+        """Aligne les poids sur les colonnes (0 pour un mot-cle sans poids)"""
+        unknown = [keyword for keyword in weights if keyword not in self._keyword_index]
+        if unknown:
+            raise KeyError(f"Mots-cles absents de l'analyse: {', '.join(unknown)}")
+        vector = np.zeros(len(self.keywords), dtype=np.float64)
+        for keyword, weight in weights.items():
+            vector[self._keyword_index[keyword]] = float(weight)
+        return vector
+
+    def rescore(self, weights: Dict[str, float]) -> np.ndarray:
+        """Scores de tous les CVs pour de nouveaux poids (produit matrice-vecteur)"""
+        return self.contributions @ self.weight_vector(weights)
+
+    def score_many(self, weight_sets: List[Dict[str, float]]) -> np.ndarray:
+        """Scores de tous les CVs pour plusieurs jeux de poids: matrice CV x jeu, en un seul produit"""
+        weights = np.zeros((len(self.keywords), len(weight_sets)), dtype=np.float64)
+        for column, weight_set in enumerate(weight_sets):
+            weights[:, column] = self.weight_vector(weight_set)
+        return self.contributions @ weights
+
+    def select(self, keywords: List[str]) -> "KeywordCountMatrix":
+        """Sous-matrice limitee a certains mots-cles (par exemple ceux d'une offre parmi plusieurs)"""
+        unknown = [keyword for keyword in keywords if keyword not in self._keyword_index]
+        if unknown:
+            raise KeyError(f"Mots-cles absents de l'analyse: {', '.join(unknown)}")
+        columns = [self._keyword_index[keyword] for keyword in keywords]
+        return KeywordCountMatrix(self.filenames, keywords, self.counts[:, columns],
+                                  scoring=self.scoring, lengths=self.lengths, corpus=self.corpus)
+
+    def rank(self, weights: Dict[str, float]) -> Dict[str, np.ndarray]:
+        """Scores et ordre de classement (decroissant, stable sur l'ordre des lignes)"""
+        scores = self.rescore(weights)
+        order = np.argsort(-scores, kind='stable')
+        return {'scores': scores, 'order': order}
+
+    def save(self, path: Path) -> None:
+        """Sauvegarde compacte: coordonnees des valeurs non nulles si la matrice est creuse"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        filenames = np.array(self.filenames, dtype=str)
+        keywords = np.array(self.keywords, dtype=str)
+        density = np.count_nonzero(self.counts) / self.counts.size if self.counts.size else 0.0
+        extra = {}
+        if self.scoring != 'binary':
+            extra['scoring'] = np.array(self.scoring)
+        if self.lengths is not None:
+            extra['lengths'] = self.lengths
+        if self.corpus is not None:
+            extra['corpus_documents'] = np.int64(self.corpus.documents)
+            extra['corpus_average_length'] = np.float64(self.corpus.average_length)
+            extra['corpus_frequencies'] = np.array([self.corpus.frequencies.get(keyword, 0)
+                                                    for keyword in self.keywords], dtype=np.int64)
+        with open(path, 'wb') as file:
+            if density < SPARSE_DENSITY_THRESHOLD:
+                rows, cols = np.nonzero(self.counts)
+                np.savez_compressed(
+                    file, filenames=filenames, keywords=keywords, shape=np.array(self.counts.shape),
+                    rows=rows.astype(np.int32), cols=cols.astype(np.int32),
+                    values=self.counts[rows, cols], **extra
+                )
+            else:
+                np.savez_compressed(file, filenames=filenames, keywords=keywords, counts=self.counts, **extra)
+
+    @classmethod
+    def load(cls, path: Path) -> "KeywordCountMatrix":
+        """Charge une matrice sauvegardee (dense ou creuse)"""
+        with np.load(path) as data:
+            filenames = data['filenames'].tolist()
+            keywords = data['keywords'].tolist()
+            if 'counts' in data:
+                counts = data['counts']
+            else:
+                counts = np.zeros(tuple(data['shape']), dtype=np.int32)
+                counts[data['rows'], data['cols']] = data['values']
+            scoring = str(data['scoring']) if 'scoring' in data else 'binary'
+            lengths = data['lengths'] if 'lengths' in data else None
+            corpus = None
+            if 'corpus_documents' in data:
+                corpus = CorpusStatistics(
+                    documents=int(data['corpus_documents']),
+                    average_length=float(data['corpus_average_length']),
+                    frequencies=dict(zip(keywords, data['corpus_frequencies'].tolist()))
+                )
+        return cls(filenames, keywords, counts, scoring=scoring, lengths=lengths, corpus=corpus)
+
+
+_matrix_cache: "OrderedDict[int, KeywordCountMatrix]" = OrderedDict()
+
+
+def matrix_path(analysis_id: int) -> Path:
+    return MATRICES_DIR / f"analysis_{analysis_id}.npz"
+
+
+def save_count_matrix(analysis_id: int, matrix: KeywordCountMatrix) -> None:
+    """Persiste la matrice d'une analyse et la garde en memoire"""
+    matrix.save(matrix_path(analysis_id))
+    _remember(analysis_id, matrix)
+
+
+def load_count_matrix(analysis_id: int) -> Optional[KeywordCountMatrix]:
+    """Charge la matrice d'une analyse (cache LRU en memoire), None si absente"""
+    if analysis_id in _matrix_cache:
+        _matrix_cache.move_to_end(analysis_id)
+        return _matrix_cache[analysis_id]
+    path = matrix_path(analysis_id)
+    if not path.exists():
+        return None
+    matrix = KeywordCountMatrix.load(path)
+    _remember(analysis_id, matrix)
+    return matrix
+
+
+def delete_count_matrix(analysis_id: int) -> None:
+    """Supprime la matrice d'une analyse supprimee"""
+    _matrix_cache.pop(analysis_id, None)
+    path = matrix_path(analysis_id)
+    if path.exists():
+        path.unlink()
+
+
+def _remember(analysis_id: int, matrix: KeywordCountMatrix) -> None:
+    _matrix_cache[analysis_id] = matrix
+    _matrix_cache.move_to_end(analysis_id)
+    while len(_matrix_cache) > _MATRIX_CACHE_SIZE:
+        _matrix_cache.popitem(last=False)
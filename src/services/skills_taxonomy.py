@@ -0,0 +1,265 @@
+"""
+Taxonomie des competences: termes reconnus et synonymes ("k8s" -> "Kubernetes").
+Chargee depuis un fichier externe (JSON ou CSV, jusqu'a des dizaines de milliers de
+termes) ou, a defaut, construite a partir de la liste integree TECH_KEYWORDS.
+Partagee par JobOfferParser (detection des requirements) et CVAnalyzer (synonymes
+des mots-cles). L'automate de la taxonomie est mis en cache sur disque (tableaux numpy,
+un seul fichier pour la taxonomie courante): le reconstruire a chaque demarrage serait
+couteux pour une grande taxonomie.
+"""
+import csv
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+from ..database.database import data_dir
+from .keyword_matcher import KeywordMatcher
+
+
+# Fichier de taxonomie (JSON: {"Kubernetes": ["k8s", ...]}; CSV: nom, synonymes ou format ESCO)
+SKILLS_TAXONOMY_PATH = Path(os.environ.get("CV_SKILLS_TAXONOMY", str(data_dir / "skills_taxonomy.json")))
+
+TAXONOMY_CACHE_DIR = data_dir / "taxonomy"
+
+# Version du format de l'automate en cache: a incrementer si KeywordMatcher change
+_MATCHER_CACHE_VERSION = "2"
+
+
+# Liste des mots-cles techniques a detecter
+TECH_KEYWORDS = {
+    # Langages de programmation
+    "python", "javascript", "java", "c++", "c#", "csharp", "go", "golang",
+    "rust", "php", "ruby", "swift", "kotlin", "scala", "typescript",
+    "perl", "matlab", "bash", "shell", "powershell",
+
+    # Frontend
+    "react", "reactjs", "vue", "vuejs", "angular", "angularjs",
+    "html", "html5", "css", "css3", "sass", "scss", "less",
+    "webpack", "vite", "nextjs", "next.js", "nuxt", "gatsby",
+    "tailwind", "bootstrap", "material-ui", "mui",
+
+    # Backend
+    "node", "nodejs", "node.js", "express", "expressjs",
+    "django", "flask", "fastapi", "spring", "springboot",
+    "laravel", "symfony", "rails", "ruby on rails",
+    "asp.net", "dotnet", ".net",
+
+    # Base de donnees
+    "sql", "mysql", "postgresql", "postgres", "mongodb", "mongo",
+    "redis", "elasticsearch", "oracle", "sqlite", "mariadb",
+    "dynamodb", "cassandra", "neo4j", "graphql",
+
+    # Cloud & DevOps
+    "aws", "amazon web services", "azure", "gcp", "google cloud",
+    "docker", "kubernetes", "k8s", "jenkins", "gitlab", "github",
+    "terraform", "ansible", "puppet", "chef",
+    "ci/cd", "cicd", "devops", "sre",
+
+    # Data & ML
+    "machine learning", "deep learning",
+    "tensorflow", "pytorch", "keras", "scikit-learn", "sklearn",
+    "pandas", "numpy", "spark", "hadoop", "airflow",
+    "data science", "data engineering", "etl",
+    "tableau", "power bi", "looker",
+
+    # Methodologies & pratiques
+    "agile", "scrum", "kanban", "jira",
+    "rest api", "restful", "soap", "microservices",
+    "git", "svn",
+    "tdd", "bdd", "unit testing",
+
+    # Securite
+    "cybersecurity", "owasp", "penetration testing",
+    "oauth", "jwt",
+
+    # Mobile
+    "android", "ios", "react native", "flutter", "xamarin",
+
+    # Autres
+    "linux", "unix", "windows server",
+    "nginx", "apache"
+}
+
+# Synonymes regroupes sous un meme nom
+_KEYWORD_NORMALIZATIONS = {
+    "reactjs": "React",
+    "vuejs": "Vue",
+    "angularjs": "Angular",
+    "nodejs": "Node.js",
+    "node.js": "Node.js",
+    "node": "Node.js",
+    "expressjs": "Express",
+    "golang": "Go",
+    "csharp": "C#",
+    "c#": "C#",
+    "postgres": "PostgreSQL",
+    "postgresql": "PostgreSQL",
+    "mongo": "MongoDB",
+    "mongodb": "MongoDB",
+    "k8s": "Kubernetes",
+    "kubernetes": "Kubernetes",
+    "amazon web services": "AWS",
+    "aws": "AWS",
+    "google cloud": "GCP",
+    "gcp": "GCP",
+    "cicd": "CI/CD",
+    "ci/cd": "CI/CD",
+    "ml": "Machine Learning",
+    "machine learning": "Machine Learning",
+    "dl": "Deep Learning",
+    "deep learning": "Deep Learning",
+    "sklearn": "Scikit-learn",
+    "scikit-learn": "Scikit-learn",
+    "next.js": "Next.js",
+    "nextjs": "Next.js",
+    "ruby on rails": "Rails",
+    "dotnet": ".NET",
+    ".net": ".NET",
+    "asp.net": ".NET",
+}
+
+
+def normalize_skill(term: str) -> str:
+    """Nom d'une competence de la liste integree (synonymes regroupes, sinon premiere lettre en majuscule)"""
+    lower = term.lower()
+    if lower in _KEYWORD_NORMALIZATIONS:
+        return _KEYWORD_NORMALIZATIONS[lower]
+    return term.capitalize()
+
+
+class SkillsTaxonomy:
+    """
+    Termes de la taxonomie (en minuscules, dans l'ordre de chargement) et competence
+    de chaque terme. Le nom d'une competence est lui-meme un de ses termes.
+    """
+
+    def __init__(self, skill_of_term: Dict[str, str]):
+        self._skill_of_term: Dict[str, str] = {}
+        self._terms_of_skill: Dict[str, List[str]] = {}
+        for term, skill in skill_of_term.items():
+            term = term.strip().lower()
+            if not term or term in self._skill_of_term:
+                continue
+            self._skill_of_term[term] = skill
+            self._terms_of_skill.setdefault(skill, []).append(term)
+        self.terms: List[str] = list(self._skill_of_term)
+        self.fingerprint = hashlib.sha256(
+            json.dumps(list(self._skill_of_term.items()), ensure_ascii=False).encode('utf-8')
+        ).hexdigest()[:16]
+        self._matcher: Optional[KeywordMatcher] = None
+
+    @classmethod
+    def from_skills(cls, skills: Dict[str, Iterable[str]]) -> "SkillsTaxonomy":
+        """Construit la taxonomie a partir de {competence: synonymes}"""
+        skill_of_term = {}
+        for skill, synonyms in skills.items():
+            for term in (skill, *synonyms):
+                skill_of_term.setdefault(term.strip().lower(), skill)
+        return cls(skill_of_term)
+
+    @classmethod
+    def builtin(cls) -> "SkillsTaxonomy":
+        """Taxonomie integree: TECH_KEYWORDS, triee (ordre et empreinte stables d'un demarrage a l'autre)"""
+        return cls({term: normalize_skill(term) for term in sorted(TECH_KEYWORDS)})
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "SkillsTaxonomy":
+        """
+        Charge un fichier de taxonomie.
+        JSON: {"Kubernetes": ["k8s", "kube"], ...}.
+        CSV avec en-tete ESCO (preferredLabel, altLabels: synonymes separes par des retours
+        a la ligne), ou sans en-tete: nom de la competence puis synonymes, une ligne par competence.
+        """
+        path = Path(path)
+        if path.suffix.lower() == '.json':
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+            if not isinstance(data, dict):
+                raise ValueError("Taxonomie JSON attendue sous la forme {competence: [synonymes]}")
+            return cls.from_skills({skill: synonyms or [] for skill, synonyms in data.items()})
+
+        skills: Dict[str, List[str]] = {}
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = list(csv.reader(file))
+        if rows and 'preferredLabel' in rows[0]:
+            header = rows[0]
+            name_column = header.index('preferredLabel')
+            alt_column = header.index('altLabels') if 'altLabels' in header else None
+            for row in rows[1:]:
+                if len(row) <= name_column or not row[name_column].strip():
+                    continue
+                alternatives = row[alt_column].splitlines() if alt_column is not None and alt_column < len(row) else []
+                skills.setdefault(row[name_column].strip(), []).extend(alternatives)
+        else:
+            for row in rows:
+                if row and row[0].strip():
+                    skills.setdefault(row[0].strip(), []).extend(row[1:])
+        return cls.from_skills(skills)
+
+    def skill(self, term: str) -> Optional[str]:
+        """Competence a laquelle appartient un terme (None si inconnu)"""
+        return self._skill_of_term.get(term.strip().lower())
+
+    def synonyms(self, keyword: str) -> List[str]:
+        """Autres termes de la competence d'un mot-cle (vide si le mot-cle est inconnu)"""
+        skill = self.skill(keyword)
+        if skill is None:
+            return []
+        lower = keyword.strip().lower()
+        return [term for term in self._terms_of_skill[skill] if term != lower]
+
+    @property
+    def matcher(self) -> KeywordMatcher:
+        """
+        Automate de tous les termes, sensible a la casse (a appliquer au texte en minuscules).
+        Charge depuis le cache disque s'il a deja ete construit pour ces memes termes.
+        """
+        if self._matcher is None:
+            self._matcher = self._load_matcher()
+        return self._matcher
+
+    def _load_matcher(self) -> KeywordMatcher:
+        path = TAXONOMY_CACHE_DIR / f"matcher_{_MATCHER_CACHE_VERSION}_{self.fingerprint}.npz"
+        try:
+            matcher = KeywordMatcher.load(path)
+            if matcher.keywords == self.terms and not matcher.ignore_case:
+                return matcher
+        except (OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile):
+            pass
+
+        matcher = KeywordMatcher(self.terms, ignore_case=False)
+        try:
+            TAXONOMY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            # Ecriture atomique: plusieurs processus peuvent construire l'automate en meme temps
+            with tempfile.NamedTemporaryFile(dir=TAXONOMY_CACHE_DIR, suffix='.tmp', delete=False) as file:
+                temp_path = Path(file.name)
+            try:
+                matcher.save(temp_path)
+                os.replace(temp_path, path)
+            finally:
+                temp_path.unlink(missing_ok=True)
+            # Seul l'automate de la taxonomie courante est garde (anciennes versions et empreintes)
+            for stale in TAXONOMY_CACHE_DIR.glob('matcher_*'):
+                if stale != path:
+                    stale.unlink(missing_ok=True)
+        except OSError:
+            pass
+        return matcher
+
+
+_taxonomy: Optional[SkillsTaxonomy] = None
+
+
+def get_taxonomy() -> SkillsTaxonomy:
+    """Retourne la taxonomie du processus courant (fichier externe s'il existe, sinon la liste integree)"""
+    global _taxonomy
+    if _taxonomy is None:
+        if SKILLS_TAXONOMY_PATH.is_file():
+            _taxonomy = SkillsTaxonomy.load(SKILLS_TAXONOMY_PATH)
+        else:
+            _taxonomy = SkillsTaxonomy.builtin()
+    return _taxonomy
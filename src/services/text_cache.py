@@ -0,0 +1,408 @@
+"""
+Cache persistant du texte extrait des PDF, adresse par le contenu.
+Cle = empreinte SHA-256 du fichier + version de l'extracteur: un fichier renomme
+ou deplace est retrouve, un fichier modifie est re-extrait.
+Stockage SQLite (a cote de cv_analyzer.db) avec eviction LRU bornee en taille: la taille
+totale est tenue a jour par des triggers dans une table a une ligne, et les dates d'acces
+des lectures sont ecrites par lots avec l'ecriture suivante.
+Le texte nettoye puis normalise (voir text_normalization) est garde dans la meme entree.
+La meme base garde la quarantaine: les fichiers qui ont bloque ou fait exploser
+l'extraction, ignores lors des analyses suivantes, et les signatures MinHash
+servant a detecter les quasi-doublons (voir dedup.py).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from ..database.database import data_dir
+
+
+TEXT_CACHE_PATH = data_dir / "text_cache.db"
+
+# Taille maximale du cache (0 = cache desactive)
+TEXT_CACHE_MAX_BYTES = int(os.environ.get("CV_TEXT_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# Nombre d'acces en lecture gardes en memoire avant d'etre ecrits (ordre LRU)
+_TOUCH_BATCH_SIZE = 256
+
+
+def file_content_hash(path: Union[str, Path]) -> str:
+    """Calcule l'empreinte SHA-256 du contenu d'un fichier"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TextCache:
+    """Stockage SQLite du texte brut (par page), nettoye et normalise de chaque document"""
+
+    def __init__(self, path: Union[str, Path] = TEXT_CACHE_PATH, max_bytes: int = TEXT_CACHE_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # Acces en lecture pas encore ecrits: (empreinte, version de l'extracteur) -> date
+        self._touched: Dict[Tuple[str, str], float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """Ouvre la base a la premiere utilisation (une connexion par processus)"""
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS extracted_texts (
+                    content_hash TEXT NOT NULL,
+                    extractor_version TEXT NOT NULL,
+                    raw_pages TEXT NOT NULL,
+                    cleaned_text TEXT,
+                    cleaning_version TEXT,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (content_hash, extractor_version)
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_extracted_texts_access ON extracted_texts (last_access)"
+            )
+            # Colonnes ajoutees apres la creation de la table (bases existantes)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(extracted_texts)")}
+            for column in ('normalized_text', 'normalization_version', 'offset_map'):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE extracted_texts ADD COLUMN {column} TEXT")
+            conn.commit()
+            # Taille totale des entrees, initialisee une fois puis tenue a jour par les triggers
+            # (dans la meme transaction que chaque ecriture, quel que soit le processus)
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_size (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    total INTEGER NOT NULL
+                )
+            """)
+            conn.execute(
+                "INSERT OR IGNORE INTO cache_size (id, total) SELECT 0, COALESCE(SUM(size), 0) FROM extracted_texts"
+            )
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS extracted_texts_size_insert AFTER INSERT ON extracted_texts
+                BEGIN UPDATE cache_size SET total = total + NEW.size WHERE id = 0; END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS extracted_texts_size_update AFTER UPDATE OF size ON extracted_texts
+                BEGIN UPDATE cache_size SET total = total + NEW.size - OLD.size WHERE id = 0; END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS extracted_texts_size_delete AFTER DELETE ON extracted_texts
+                BEGIN UPDATE cache_size SET total = total - OLD.size WHERE id = 0; END
+            """)
+            conn.commit()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS quarantine (
+                    content_hash TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    reason TEXT NOT NULL,
+                    error TEXT,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS minhash_signatures (
+                    content_hash TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    signature BLOB NOT NULL,
+                    PRIMARY KEY (content_hash, version)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS term_vectors (
+                    content_hash TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (content_hash, version)
+                )
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_pages(self, content_hash: str, extractor_version: str) -> Optional[List[str]]:
+        """Retourne le texte brut par page, ou None si absent du cache"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT raw_pages FROM extracted_texts WHERE content_hash = ? AND extractor_version = ?",
+                (content_hash, extractor_version)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touch(conn, content_hash, extractor_version)
+            return json.loads(row[0])
+
+    def put_pages(self, content_hash: str, extractor_version: str, pages: List[str]) -> None:
+        """Enregistre le texte brut par page d'un document"""
+        if not self.enabled:
+            return
+        raw_pages = json.dumps(pages, ensure_ascii=False)
+        with self._lock:
+            conn = self._connection()
+            # Upsert plutot que REPLACE: la suppression d'un REPLACE ne declenche pas les triggers
+            conn.execute(
+                """INSERT INTO extracted_texts
+                   (content_hash, extractor_version, raw_pages, size, last_access)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (content_hash, extractor_version) DO UPDATE SET
+                       raw_pages = excluded.raw_pages, cleaned_text = NULL, cleaning_version = NULL,
+                       normalized_text = NULL, normalization_version = NULL, offset_map = NULL,
+                       size = excluded.size, last_access = excluded.last_access""",
+                (content_hash, extractor_version, raw_pages, len(raw_pages), time.time())
+            )
+            self._touched.pop((content_hash, extractor_version), None)
+            self._evict(conn)
+            conn.commit()
+
+    def get_cleaned(self, content_hash: str, extractor_version: str, cleaning_version: str) -> Optional[str]:
+        """Retourne le texte nettoye s'il a ete produit par la meme version du nettoyage"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                """SELECT cleaned_text FROM extracted_texts
+                   WHERE content_hash = ? AND extractor_version = ? AND cleaning_version = ?""",
+                (content_hash, extractor_version, cleaning_version)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touch(conn, content_hash, extractor_version)
+            return row[0]
+
+    def put_cleaned(self, content_hash: str, extractor_version: str,
+                    cleaning_version: str, cleaned_text: str) -> None:
+        """Ajoute le texte nettoye a une entree existante"""
+        if not self.enabled:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                """UPDATE extracted_texts
+                   SET cleaned_text = ?, cleaning_version = ?, normalized_text = NULL,
+                       normalization_version = NULL, offset_map = NULL,
+                       size = length(raw_pages) + ?, last_access = ?
+                   WHERE content_hash = ? AND extractor_version = ?""",
+                (cleaned_text, cleaning_version, len(cleaned_text), time.time(),
+                 content_hash, extractor_version)
+            )
+            self._touched.pop((content_hash, extractor_version), None)
+            self._evict(conn)
+            conn.commit()
+
+    def get_normalized(self, content_hash: str, extractor_version: str, cleaning_version: str,
+                       normalization_version: str, with_offsets: bool = False
+                       ) -> Optional[Union[str, Tuple[str, List[List[int]]]]]:
+        """
+        Retourne le texte normalise (et avec with_offsets, la table des positions vers le
+        texte nettoye) s'il a ete produit par les memes versions du nettoyage et de la normalisation.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                """SELECT normalized_text, offset_map FROM extracted_texts
+                   WHERE content_hash = ? AND extractor_version = ? AND cleaning_version = ?
+                     AND normalization_version = ?""",
+                (content_hash, extractor_version, cleaning_version, normalization_version)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touch(conn, content_hash, extractor_version)
+        if with_offsets:
+            return row[0], json.loads(row[1])
+        return row[0]
+
+    def put_normalized(self, content_hash: str, extractor_version: str, cleaning_version: str,
+                       normalization_version: str, normalized_text: str, offsets: List[List[int]]) -> None:
+        """Ajoute le texte normalise a une entree dont le texte nettoye est deja en cache"""
+        if not self.enabled:
+            return
+        offset_map = json.dumps(offsets)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                """UPDATE extracted_texts
+                   SET normalized_text = ?, normalization_version = ?, offset_map = ?,
+                       size = length(raw_pages) + length(cleaned_text) + ? + ?, last_access = ?
+                   WHERE content_hash = ? AND extractor_version = ? AND cleaning_version = ?""",
+                (normalized_text, normalization_version, offset_map, len(normalized_text), len(offset_map),
+                 time.time(), content_hash, extractor_version, cleaning_version)
+            )
+            self._touched.pop((content_hash, extractor_version), None)
+            self._evict(conn)
+            conn.commit()
+
+    def get_signatures(self, content_hashes: List[str], version: str) -> Dict[str, bytes]:
+        """
+        Retourne les signatures connues pour ces contenus. Petites, elles sont gardees
+        hors de la limite de taille (comme la quarantaine).
+        """
+        signatures = {}
+        unique = list(dict.fromkeys(content_hashes))
+        with self._lock:
+            conn = self._connection()
+            # Requetes par lots (limite du nombre de parametres SQLite)
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ', '.join('?' * len(batch))
+                for content_hash, signature in conn.execute(
+                    f"""SELECT content_hash, signature FROM minhash_signatures
+                        WHERE version = ? AND content_hash IN ({placeholders})""",
+                    (version, *batch)
+                ):
+                    signatures[content_hash] = signature
+        return signatures
+
+    def put_signature(self, content_hash: str, version: str, signature: bytes) -> None:
+        """Enregistre la signature MinHash d'un contenu"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO minhash_signatures (content_hash, version, signature) VALUES (?, ?, ?)",
+                (content_hash, version, signature)
+            )
+            conn.commit()
+
+    def get_term_vectors(self, content_hashes: List[str], version: str) -> Dict[str, bytes]:
+        """Retourne les vecteurs de termes (TF-IDF) connus pour ces contenus, hors limite de taille"""
+        vectors = {}
+        unique = list(dict.fromkeys(content_hashes))
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ', '.join('?' * len(batch))
+                for content_hash, vector in conn.execute(
+                    f"""SELECT content_hash, vector FROM term_vectors
+                        WHERE version = ? AND content_hash IN ({placeholders})""",
+                    (version, *batch)
+                ):
+                    vectors[content_hash] = vector
+        return vectors
+
+    def put_term_vector(self, content_hash: str, version: str, vector: bytes) -> None:
+        """Enregistre le vecteur de termes d'un contenu"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO term_vectors (content_hash, version, vector) VALUES (?, ?, ?)",
+                (content_hash, version, vector)
+            )
+            conn.commit()
+
+    def get_quarantine(self, content_hash: str) -> Optional[Dict]:
+        """Retourne l'entree de quarantaine d'un contenu, ou None (independant de l'eviction)"""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT filename, reason, error, created_at FROM quarantine WHERE content_hash = ?",
+                (content_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'content_hash': content_hash, 'filename': row[0], 'reason': row[1],
+                'error': row[2], 'created_at': row[3]}
+
+    def add_quarantine(self, content_hash: str, filename: str, reason: str, error: str) -> None:
+        """Met un contenu en quarantaine"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                """INSERT OR REPLACE INTO quarantine (content_hash, filename, reason, error, created_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (content_hash, filename, reason, error, time.time())
+            )
+            conn.commit()
+
+    def list_quarantine(self) -> List[Dict]:
+        """Liste les contenus en quarantaine, du plus recent au plus ancien"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT content_hash, filename, reason, error, created_at FROM quarantine ORDER BY created_at DESC"
+            ).fetchall()
+        return [
+            {'content_hash': row[0], 'filename': row[1], 'reason': row[2], 'error': row[3], 'created_at': row[4]}
+            for row in rows
+        ]
+
+    def remove_quarantine(self, content_hash: str) -> bool:
+        """Sort un contenu de quarantaine (il sera de nouveau extrait); False s'il n'y etait pas"""
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute("DELETE FROM quarantine WHERE content_hash = ?", (content_hash,))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def _touch(self, conn: sqlite3.Connection, content_hash: str, extractor_version: str) -> None:
+        """Note la date du dernier acces (ordre LRU), ecrite par lots"""
+        self._touched[(content_hash, extractor_version)] = time.time()
+        if len(self._touched) >= _TOUCH_BATCH_SIZE:
+            self._flush_touches(conn)
+            conn.commit()
+
+    def _flush_touches(self, conn: sqlite3.Connection) -> None:
+        """Ecrit les dates d'acces en attente (sans valider la transaction)"""
+        if not self._touched:
+            return
+        conn.executemany(
+            "UPDATE extracted_texts SET last_access = ? WHERE content_hash = ? AND extractor_version = ?",
+            [(accessed, content_hash, extractor_version)
+             for (content_hash, extractor_version), accessed in self._touched.items()]
+        )
+        self._touched.clear()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """
+        Supprime les entrees les moins recemment utilisees au-dela de la taille maximale
+        (dans la transaction de l'ecriture qui l'appelle, avec les lectures en attente)
+        """
+        self._flush_touches(conn)
+        total = conn.execute("SELECT total FROM cache_size WHERE id = 0").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        to_free = total - self.max_bytes
+        victims = []
+        for content_hash, extractor_version, size in conn.execute(
+            "SELECT content_hash, extractor_version, size FROM extracted_texts ORDER BY last_access"
+        ):
+            victims.append((content_hash, extractor_version))
+            to_free -= size
+            if to_free <= 0:
+                break
+        conn.executemany(
+            "DELETE FROM extracted_texts WHERE content_hash = ? AND extractor_version = ?",
+            victims
+        )
+
+
+_text_cache: Optional[TextCache] = None
+
+
+def get_text_cache() -> TextCache:
+    """Retourne le cache partage du processus courant"""
+    global _text_cache
+    if _text_cache is None:
+        _text_cache = TextCache()
+    return _text_cache
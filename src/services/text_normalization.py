@@ -0,0 +1,92 @@
+"""
+Normalisation du texte pour la recherche de mots-cles: decomposition Unicode NFKD,
+suppression des accents et casefold ("DÉVELOPPEUR", "Développeur" -> "developpeur").
+Appliquee une fois par document (resultat mis en cache avec le texte extrait) et
+de la meme facon aux mots-cles: la recherche se fait ensuite sans ignorer la casse.
+Une table de correspondance des positions permet de retrouver le texte d'origine
+(extraits autour des occurrences).
+"""
+import re
+import unicodedata
+from bisect import bisect_right
+from typing import List, Tuple
+
+# Version de la normalisation: a incrementer si normalize_text change (invalide le cache)
+NORMALIZATION_VERSION = "1"
+
+
+def _fold_char(ch: str) -> str:
+    """Forme normalisee d'un caractere (peut etre vide ou faire plusieurs caracteres)"""
+    # NFKD avant et apres casefold: "℃" -> "°C" -> "°c", "İ" -> "i" + point combinant
+    decomposed = unicodedata.normalize('NFKD', unicodedata.normalize('NFKD', ch).casefold())
+    return ''.join(c for c in decomposed if unicodedata.category(c) != 'Mn')
+
+
+class _FoldTable(dict):
+    """Table pour str.translate, remplie a la premiere rencontre de chaque caractere"""
+
+    def __missing__(self, code: int) -> str:
+        folded = _fold_char(chr(code))
+        self[code] = folded
+        return folded
+
+
+_FOLD_TABLE = _FoldTable()
+
+
+def normalize_text(text: str) -> str:
+    """Texte sans accents et en minuscules (casefold)"""
+    if text.isascii():
+        # Pour l'ASCII, NFKD ne change rien et casefold equivaut a lower()
+        return text.lower()
+    return text.translate(_FOLD_TABLE)
+
+
+def normalize_with_offsets(text: str) -> Tuple[str, List[List[int]]]:
+    """
+    Normalise le texte et renvoie la table des positions: liste de points [position
+    normalisee, position d'origine] a partir desquels la correspondance est lineaire.
+    Liste vide si chaque caractere donne exactement un caractere (cas le plus courant).
+    """
+    normalized = normalize_text(text)
+    if text.isascii():
+        return normalized, []
+
+    # Caracteres qui disparaissent (accents combinants) ou se developpent (ligatures, "ß")
+    irregular = [ch for ch in set(text) if len(_FOLD_TABLE[ord(ch)]) != 1]
+    if not irregular:
+        return normalized, []
+
+    offsets: List[List[int]] = []
+    delta = 0  # position normalisee - position d'origine
+    pattern = re.compile('[' + ''.join(re.escape(ch) for ch in irregular) + ']')
+    for match in pattern.finditer(text):
+        index = match.start()
+        length = len(_FOLD_TABLE[ord(match.group())])
+        start = index + delta
+        # Chaque caractere produit renvoie au caractere d'origine
+        for position in range(start, start + length):
+            offsets.append([position, index])
+        delta += length - 1
+        # Reprise lineaire apres ce caractere
+        offsets.append([index + 1 + delta, index + 1])
+    return normalized, offsets
+
+
+def original_index(offsets: List[List[int]], index: int) -> int:
+    """Position dans le texte d'origine d'une position du texte normalise"""
+    if not offsets:
+        return index
+    point = bisect_right(offsets, [index, float('inf')]) - 1
+    if point < 0:
+        return index
+    normalized_start, original_start = offsets[point]
+    return original_start + (index - normalized_start)
+
+
+def original_span(offsets: List[List[int]], start: int, end: int) -> Tuple[int, int]:
+    """Intervalle [debut, fin) dans le texte d'origine d'une occurrence trouvee dans le texte normalise"""
+    if end <= start:
+        position = original_index(offsets, start)
+        return position, position
+    return original_index(offsets, start), original_index(offsets, end - 1) + 1
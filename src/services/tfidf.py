@@ -0,0 +1,103 @@
+"""
+Similarite TF-IDF entre les CVs et le texte d'une offre d'emploi, en local (sans reseau).
+Les mots du texte normalise sont haches dans un espace de taille fixe (hashing trick):
+pas de vocabulaire a construire ni a stocker. Le vecteur d'occurrences d'un CV est mis
+en cache par empreinte de contenu; l'IDF est calcule sur les CVs classes, puis tous
+les CVs sont compares a l'offre en un seul produit matrice creuse x vecteur (cosinus).
+"""
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .cv_analyzer import cached_normalized_text
+from .cv_index import split_words
+from .text_cache import get_text_cache
+from .text_normalization import normalize_text
+
+# Nombre de dimensions de l'espace de hachage (puissance de 2)
+TFIDF_FEATURES = 2 ** 18
+
+# Version des vecteurs: a incrementer si leur calcul change (invalide le cache)
+TFIDF_VERSION = f"1-{TFIDF_FEATURES}"
+
+# Vecteur creux: indices tries (int32) et poids TF (float32)
+TermVector = Tuple[np.ndarray, np.ndarray]
+
+
+def term_vector(normalized_text: str) -> TermVector:
+    """Vecteur TF (1 + log des occurrences) des mots d'un texte normalise"""
+    tokens = split_words(normalized_text)
+    if not tokens:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    # Hash stable d'un processus a l'autre (pas de hash() Python): les vecteurs sont mis en cache
+    hashed = np.fromiter((zlib.crc32(token.encode('utf-8')) & (TFIDF_FEATURES - 1) for token in tokens),
+                         dtype=np.int32, count=len(tokens))
+    indices, counts = np.unique(hashed, return_counts=True)
+    return indices, (1 + np.log(counts)).astype(np.float32)
+
+
+def vector_to_bytes(vector: TermVector) -> bytes:
+    indices, values = vector
+    return indices.astype('<i4').tobytes() + values.astype('<f4').tobytes()
+
+
+def vector_from_bytes(data: bytes) -> TermVector:
+    size = len(data) // 8
+    return (np.frombuffer(data, dtype='<i4', count=size).astype(np.int32),
+            np.frombuffer(data, dtype='<f4', offset=size * 4).astype(np.float32))
+
+
+def cv_term_vectors(content_hashes: Iterable[str]) -> Dict[str, TermVector]:
+    """
+    Vecteurs des CVs, depuis le cache ou calcules a partir de leur texte normalise en cache
+    (une fois par contenu). Les CVs dont le texte n'est plus en cache sont absents.
+    """
+    content_hashes = list(dict.fromkeys(content_hashes))
+    cache = get_text_cache()
+    vectors = {content_hash: vector_from_bytes(data)
+               for content_hash, data in cache.get_term_vectors(content_hashes, TFIDF_VERSION).items()}
+    for content_hash in content_hashes:
+        if content_hash in vectors:
+            continue
+        text = cached_normalized_text(content_hash)
+        if text is None:
+            continue
+        vector = term_vector(text)
+        cache.put_term_vector(content_hash, TFIDF_VERSION, vector_to_bytes(vector))
+        vectors[content_hash] = vector
+    return vectors
+
+
+def similarity_scores(query_text: str, vectors: List[Optional[TermVector]]) -> np.ndarray:
+    """
+    Cosinus TF-IDF (0 a 1) entre un texte (l'offre) et chaque vecteur de CV (None = 0).
+    IDF lisse calcule sur ces CVs: log((1 + n) / (1 + df)) + 1.
+    """
+    rows = len(vectors)
+    present = [vector if vector is not None else (np.zeros(0, np.int32), np.zeros(0, np.float32))
+               for vector in vectors]
+    lengths = np.array([len(indices) for indices, _ in present], dtype=np.int64)
+    if rows == 0:
+        return np.zeros(0)
+    indices = np.concatenate([indices for indices, _ in present])
+    values = np.concatenate([values for _, values in present]).astype(np.float64)
+    row_ids = np.repeat(np.arange(rows), lengths)
+
+    # Chaque CV compte une fois par dimension (indices uniques par CV)
+    document_frequency = np.bincount(indices, minlength=TFIDF_FEATURES)
+    idf = np.log((1 + rows) / (1 + document_frequency)) + 1
+    weighted = values * idf[indices]
+    norms = np.sqrt(np.bincount(row_ids, weights=weighted ** 2, minlength=rows))
+
+    query_indices, query_values = term_vector(normalize_text(query_text))
+    query = np.zeros(TFIDF_FEATURES)
+    query[query_indices] = query_values * idf[query_indices]
+    query_norm = np.linalg.norm(query)
+    if query_norm == 0:
+        return np.zeros(rows)
+    query /= query_norm
+
+    # Produit matrice creuse (lignes = CVs) x vecteur de l'offre
+    dots = np.bincount(row_ids, weights=weighted * query[indices], minlength=rows)
+    return np.divide(dots, norms, out=np.zeros(rows), where=norms > 0)
@@ -0,0 +1,272 @@
+"""
+Reception en flux des CVs envoyes par les recruteurs (multipart: PDF multiples ou archive .zip).
+Chaque PDF est ecrit sur disque par morceaux des qu'il arrive, puis transmis a l'analyse
+sans attendre la fin de l'envoi. La memoire utilisee reste bornee quelle que soit la
+taille de l'envoi: seuls des morceaux du corps de la requete transitent en memoire.
+"""
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import uuid
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import Iterator, List, Optional, Set
+
+from multipart.multipart import MultipartParser, parse_options_header
+
+from ..database.database import data_dir
+from .corpus_discovery import DiscoveredFile
+
+
+UPLOADS_DIR = data_dir / "uploads"
+
+# Taille maximale d'un PDF recu ou extrait d'une archive (Mo)
+UPLOAD_MAX_FILE_BYTES = int(os.environ.get("CV_UPLOAD_MAX_FILE_MB", "100")) * 1024 * 1024
+
+# Taille maximale decompressee d'une archive (protection contre les bombes zip, Mo)
+UPLOAD_MAX_ARCHIVE_BYTES = int(os.environ.get("CV_UPLOAD_MAX_ARCHIVE_MB", "4096")) * 1024 * 1024
+
+# Une archive recue est gardee en memoire jusqu'a cette taille, puis deversee sur disque
+_ZIP_SPOOL_BYTES = 1024 * 1024
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def new_upload_dir() -> Path:
+    """Cree le dossier qui recevra les CVs d'un envoi"""
+    path = UPLOADS_DIR / uuid.uuid4().hex
+    path.mkdir(parents=True)
+    return path
+
+
+def is_upload_dir(folder_path: Optional[str]) -> bool:
+    """Indique si un dossier d'analyse a ete cree par un envoi (et peut donc etre supprime avec elle)"""
+    if not folder_path:
+        return False
+    try:
+        return Path(folder_path).resolve().parent == UPLOADS_DIR.resolve()
+    except OSError:
+        return False
+
+
+def safe_relative_path(name: str) -> Optional[str]:
+    """
+    Chemin relatif sur (separateur '/') a partir d'un nom de fichier envoye par le client
+    ou d'un membre d'archive: pas de chemin absolu, de lecteur ni de '..'.
+    """
+    parts = [part for part in PurePosixPath(name.replace('\\', '/')).parts
+             if part not in ('', '.', '/') and ':' not in part]
+    if not parts or '..' in parts:
+        return None
+    return '/'.join(parts)
+
+
+class UploadTooLarge(ValueError):
+    """Fichier ou archive au-dela des limites de taille"""
+
+
+class UploadReceiver:
+    """
+    Analyse en flux un corps multipart/form-data. Chaque fichier recu est ecrit
+    dans upload_dir; les PDF termines et les archives recues sont places dans
+    `ready` pour etre consommes par le thread d'analyse (voir iter_uploaded_files).
+    """
+
+    def __init__(self, content_type: str, upload_dir: Path):
+        mime, options = parse_options_header(content_type)
+        boundary = options.get(b'boundary')
+        if mime != b'multipart/form-data' or not boundary:
+            raise ValueError("Envoi attendu au format multipart/form-data")
+
+        self.upload_dir = upload_dir
+        self.ready: "queue.Queue" = queue.Queue()
+        self.skipped: List[dict] = []
+        # Noms deja attribues (la reception et l'extraction des archives tournent dans deux threads)
+        self._names: Set[str] = set()
+        self._names_lock = threading.Lock()
+        self._header_field = b''
+        self._header_value = b''
+        self._headers = {}
+        self._target = None
+        self._target_name = None
+        self._target_size = 0
+        self._kind = None
+        self._parser = MultipartParser(boundary, callbacks={
+            'on_part_begin': self._on_part_begin,
+            'on_header_field': self._on_header_field,
+            'on_header_value': self._on_header_value,
+            'on_header_end': self._on_header_end,
+            'on_headers_finished': self._on_headers_finished,
+            'on_part_data': self._on_part_data,
+            'on_part_end': self._on_part_end,
+        })
+
+    def feed(self, chunk: bytes) -> None:
+        """Transmet un morceau du corps de la requete"""
+        self._parser.write(chunk)
+
+    def finish(self) -> None:
+        """Fin de l'envoi: signale au thread d'analyse qu'il n'y aura plus de fichier"""
+        self._parser.finalize()
+        self.ready.put(None)
+
+    def abort(self) -> None:
+        """Envoi interrompu: ferme le fichier en cours et arrete l'analyse"""
+        if self._target is not None:
+            self._target.close()
+            self._target = None
+        self.ready.put(None)
+
+    def unique_name(self, relative_path: str) -> str:
+        """Evite d'ecraser un fichier du meme nom deja recu"""
+        candidate = relative_path
+        stem, suffix = os.path.splitext(relative_path)
+        counter = 2
+        with self._names_lock:
+            while candidate.lower() in self._names:
+                candidate = f"{stem} ({counter}){suffix}"
+                counter += 1
+            self._names.add(candidate.lower())
+        return candidate
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b''
+        self._header_value = b''
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b'content-disposition', b''))
+        raw_name = options.get(b'filename')
+        self._kind = None
+        if raw_name is None:
+            # Champ de formulaire ordinaire: ignore
+            return
+
+        name = safe_relative_path(raw_name.decode('utf-8', 'replace'))
+        lower = (name or '').lower()
+        if lower.endswith('.pdf'):
+            self._kind = 'pdf'
+            self._target_name = self.unique_name(name)
+            path = self.upload_dir / self._target_name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._target = open(path, 'wb')
+        elif lower.endswith('.zip'):
+            self._kind = 'zip'
+            self._target_name = name
+            self._target = tempfile.SpooledTemporaryFile(max_size=_ZIP_SPOOL_BYTES, dir=self.upload_dir)
+        else:
+            self.skipped.append({'filename': raw_name.decode('utf-8', 'replace'),
+                                 'error': "Format non pris en charge (PDF ou ZIP)"})
+        self._target_size = 0
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._target is None:
+            return
+        self._target_size += end - start
+        limit = UPLOAD_MAX_ARCHIVE_BYTES if self._kind == 'zip' else UPLOAD_MAX_FILE_BYTES
+        if self._target_size > limit:
+            raise UploadTooLarge(f"{self._target_name}: fichier trop volumineux")
+        self._target.write(data[start:end])
+
+    def _on_part_end(self) -> None:
+        if self._target is None:
+            return
+        if self._kind == 'pdf':
+            self._target.close()
+            path = self.upload_dir / self._target_name
+            stat = path.stat()
+            self.ready.put(DiscoveredFile(path, self._target_name, stat.st_size, stat.st_mtime))
+        else:
+            # L'archive reste ouverte: elle est lue (membre par membre) par le thread d'analyse
+            self._target.seek(0)
+            self.ready.put((self._target_name, self._target))
+        self._target = None
+
+
+def iter_uploaded_files(receiver: UploadReceiver) -> Iterator[DiscoveredFile]:
+    """
+    Produit les PDF recus au fur et a mesure de l'envoi (bloque en attendant le suivant).
+    Les archives sont ouvertes ici, hors de la boucle de reception: chaque PDF qu'elles
+    contiennent est extrait par morceaux puis produit aussitot.
+    """
+    while True:
+        item = receiver.ready.get()
+        if item is None:
+            return
+        if isinstance(item, DiscoveredFile):
+            yield item
+            continue
+
+        archive_name, spooled = item
+        try:
+            yield from _extract_archive(receiver, archive_name, spooled)
+        finally:
+            spooled.close()
+
+
+def _extract_archive(receiver: UploadReceiver, archive_name: str, spooled) -> Iterator[DiscoveredFile]:
+    """Extrait les PDF d'une archive recue, en bornant la taille decompressee"""
+    try:
+        archive = zipfile.ZipFile(spooled)
+    except zipfile.BadZipFile:
+        receiver.skipped.append({'filename': archive_name, 'error': "Archive ZIP invalide"})
+        return
+
+    with archive:
+        extracted_total = 0
+        for member in archive.infolist():
+            if member.is_dir():
+                continue
+            name = safe_relative_path(member.filename)
+            if name is None or not name.lower().endswith('.pdf'):
+                continue
+            if extracted_total >= UPLOAD_MAX_ARCHIVE_BYTES:
+                receiver.skipped.append({'filename': archive_name,
+                                         'error': "Archive trop volumineuse une fois decompressee"})
+                return
+
+            target_name = receiver.unique_name(name)
+            path = receiver.upload_dir / target_name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # La taille annoncee dans l'archive n'est pas fiable: on compte les octets ecrits
+            limit = min(UPLOAD_MAX_FILE_BYTES, UPLOAD_MAX_ARCHIVE_BYTES - extracted_total)
+            written = 0
+            too_large = False
+            try:
+                with archive.open(member) as source, open(path, 'wb') as target:
+                    for chunk in iter(lambda: source.read(_COPY_CHUNK_SIZE), b''):
+                        written += len(chunk)
+                        if written > limit:
+                            too_large = True
+                            break
+                        target.write(chunk)
+            except (zipfile.BadZipFile, RuntimeError, OSError) as e:
+                # Membre corrompu ou chiffre
+                path.unlink(missing_ok=True)
+                receiver.skipped.append({'filename': target_name, 'error': str(e)})
+                continue
+            extracted_total += written
+            if too_large:
+                path.unlink(missing_ok=True)
+                receiver.skipped.append({'filename': target_name, 'error': "Fichier trop volumineux"})
+                continue
+
+            stat = path.stat()
+            yield DiscoveredFile(path, target_name, stat.st_size, stat.st_mtime)
+
+
+def remove_upload_dir(folder_path: str) -> None:
+    """Supprime les fichiers d'un envoi"""
+    if is_upload_dir(folder_path):
+        shutil.rmtree(folder_path, ignore_errors=True)
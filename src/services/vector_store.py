@@ -0,0 +1,222 @@
+"""
+Stockage des vecteurs (embeddings) des CVs, adresse par le contenu.
+Une matrice en ajout seul par modele, lue par projection memoire (memmap): une ligne
+par empreinte de contenu, jamais recalculee. Les vecteurs sont normalises (L2) a
+l'ajout, la similarite cosinus avec un vecteur est donc un simple produit scalaire,
+calcule pour tous les CVs demandes en une operation vectorisee (par blocs).
+En int8, chaque ligne est quantifiee avec son propre facteur d'echelle (4x moins de place).
+"""
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from ..database.database import data_dir
+
+
+VECTOR_STORE_DIR = data_dir / "embeddings"
+
+# Type des vecteurs stockes: float32 (exact) ou int8 (quantifie)
+VECTOR_DTYPE = os.environ.get("CV_EMBEDDING_DTYPE", "float32")
+VECTOR_DTYPES = ('float32', 'int8')
+
+# Nombre de lignes lues a la fois pour le produit scalaire (borne la memoire en int8)
+_BLOCK_ROWS = 16384
+
+
+class VectorStore:
+    """
+    Matrice de vecteurs en ajout seul: vectors.bin (lignes), scales.bin (echelles int8),
+    keys.txt (une empreinte par ligne, ecrite apres la ligne: une ligne sans cle est ignoree).
+    """
+
+    def __init__(self, directory: Union[str, Path], dtype: str = VECTOR_DTYPE):
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Type de vecteur inconnu: {dtype}")
+        self.directory = Path(directory)
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._rows: Optional[Dict[str, int]] = None
+        self._keys: List[str] = []
+        self._dim: Optional[int] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.directory / "meta.json"
+
+    def _load(self) -> Dict[str, int]:
+        """Lit les cles et la dimension a la premiere utilisation"""
+        if self._rows is None:
+            self._rows = {}
+            if self._meta_path.exists():
+                meta = json.loads(self._meta_path.read_text())
+                if meta['dtype'] != self.dtype:
+                    raise ValueError(f"Vecteurs stockes en {meta['dtype']}, pas en {self.dtype}")
+                self._dim = meta['dim']
+                keys_path = self.directory / "keys.txt"
+                if keys_path.exists():
+                    self._keys = keys_path.read_text().splitlines()
+                    self._rows = {key: row for row, key in enumerate(self._keys)}
+        return self._rows
+
+    @property
+    def dim(self) -> Optional[int]:
+        with self._lock:
+            self._load()
+            return self._dim
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
+
+    def __contains__(self, content_hash: str) -> bool:
+        with self._lock:
+            return content_hash in self._load()
+
+    def missing(self, content_hashes: Iterable[str]) -> List[str]:
+        """Empreintes (sans doublon, dans l'ordre) qui n'ont pas encore de vecteur"""
+        with self._lock:
+            rows = self._load()
+            return [h for h in dict.fromkeys(content_hashes) if h not in rows]
+
+    def add(self, vectors: Dict[str, np.ndarray]) -> None:
+        """Ajoute les vecteurs des empreintes absentes (les vecteurs deja stockes sont gardes)"""
+        with self._lock:
+            rows = self._load()
+            vectors = {key: vector for key, vector in vectors.items() if key not in rows}
+            if not vectors:
+                return
+            matrix = np.asarray(list(vectors.values()), dtype=np.float32)
+            if self._dim is None:
+                self._dim = matrix.shape[1]
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._meta_path.write_text(json.dumps({'dim': self._dim, 'dtype': self.dtype}))
+            if matrix.shape[1] != self._dim:
+                raise ValueError(f"Vecteurs de dimension {matrix.shape[1]}, {self._dim} attendue")
+
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+            start = len(rows)
+            if self.dtype == 'int8':
+                scales = np.abs(matrix).max(axis=1) / 127
+                quantized = np.round(np.divide(matrix, scales[:, None], out=np.zeros_like(matrix),
+                                               where=scales[:, None] > 0)).astype(np.int8)
+                self._write("scales.bin", start * 4, scales.astype('<f4').tobytes())
+                self._write("vectors.bin", start * self._dim, quantized.tobytes())
+            else:
+                self._write("vectors.bin", start * self._dim * 4, matrix.astype('<f4').tobytes())
+
+            # Cles ecrites en dernier: les lignes sont completes quand elles deviennent visibles
+            with open(self.directory / "keys.txt", 'a') as keys:
+                keys.write("".join(f"{key}\n" for key in vectors))
+            for row, key in enumerate(vectors, start):
+                rows[key] = row
+            self._keys.extend(vectors)
+            self._matrix = None
+            self._scales = None
+
+    def _write(self, name: str, offset: int, data: bytes) -> None:
+        """Ecrit des lignes a leur position (ecrase les restes d'un ajout interrompu)"""
+        path = self.directory / name
+        with open(path, 'r+b' if path.exists() else 'wb') as file:
+            file.seek(offset)
+            file.write(data)
+            file.truncate()
+
+    def _views(self):
+        """Matrice (et echelles) projetees en memoire, rouvertes apres un ajout"""
+        if self._matrix is None:
+            count = len(self._rows)
+            if count == 0:
+                return None, None
+            if self.dtype == 'int8':
+                self._matrix = np.memmap(self.directory / "vectors.bin", dtype=np.int8, mode='r',
+                                         shape=(count, self._dim))
+                self._scales = np.memmap(self.directory / "scales.bin", dtype='<f4', mode='r', shape=(count,))
+            else:
+                self._matrix = np.memmap(self.directory / "vectors.bin", dtype='<f4', mode='r',
+                                         shape=(count, self._dim))
+        return self._matrix, self._scales
+
+    def keys_at(self, rows: Iterable[int]) -> List[str]:
+        """Empreintes des lignes donnees"""
+        with self._lock:
+            self._load()
+            return [self._keys[row] for row in rows]
+
+    def read_rows(self, rows: Union[np.ndarray, slice]) -> np.ndarray:
+        """Vecteurs normalises (float32) de lignes de la matrice"""
+        with self._lock:
+            self._load()
+            matrix, scales = self._views()
+            if matrix is None:
+                return np.zeros((0, self._dim or 0), dtype=np.float32)
+            result = np.array(matrix[rows], dtype=np.float32)
+            if scales is not None:
+                result *= scales[rows][:, None]
+            return result
+
+    def vectors(self, content_hashes: List[str]) -> np.ndarray:
+        """Vecteurs normalises (float32) des empreintes, zero pour les absentes"""
+        with self._lock:
+            rows = self._load()
+            found = [(i, rows[h]) for i, h in enumerate(content_hashes) if h in rows]
+        result = np.zeros((len(content_hashes), self.dim or 0), dtype=np.float32)
+        if found:
+            targets, sources = map(np.array, zip(*found))
+            result[targets] = self.read_rows(sources)
+        return result
+
+    def similarities(self, query: np.ndarray, content_hashes: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Cosinus entre un vecteur et les vecteurs des empreintes (toutes si None),
+        0 pour les empreintes sans vecteur.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        with self._lock:
+            rows = self._load()
+            matrix, scales = self._views()
+            if content_hashes is None:
+                selected = np.arange(len(rows))
+                present = np.ones(len(rows), dtype=bool)
+            else:
+                selected = np.array([rows.get(h, -1) for h in content_hashes], dtype=np.int64)
+                present = selected >= 0
+            scores = np.zeros(len(selected), dtype=np.float32)
+            if matrix is None or norm == 0 or not present.any():
+                return scores
+            if query.shape[0] != self._dim:
+                raise ValueError(f"Vecteur de dimension {query.shape[0]}, {self._dim} attendue")
+            query = query / norm
+            positions = np.flatnonzero(present)
+            sources = selected[positions]
+            # Lecture de tout le bloc contigu quand toutes les lignes sont demandees
+            contiguous = content_hashes is None
+            for start in range(0, len(sources), _BLOCK_ROWS):
+                block = slice(start, start + _BLOCK_ROWS)
+                rows_block = matrix[start:start + _BLOCK_ROWS] if contiguous else matrix[sources[block]]
+                dots = np.asarray(rows_block, dtype=np.float32) @ query
+                if scales is not None:
+                    dots *= scales[start:start + _BLOCK_ROWS] if contiguous else scales[sources[block]]
+                scores[positions[block]] = dots
+            return scores
+
+
+_vector_stores: Dict[str, VectorStore] = {}
+_vector_stores_lock = threading.Lock()
+
+
+def get_vector_store(model: str) -> VectorStore:
+    """Retourne la matrice de vecteurs d'un modele d'embedding (une par modele et par type)"""
+    directory = VECTOR_STORE_DIR / f"{re.sub(r'[^A-Za-z0-9._-]+', '_', model)}-{VECTOR_DTYPE}"
+    with _vector_stores_lock:
+        if model not in _vector_stores:
+            _vector_stores[model] = VectorStore(directory)
+        return _vector_stores[model]